@@ -0,0 +1,182 @@
+"""ETL throughput benchmark on the synthetic data.
+
+Usage (from the 'etl' directory):
+    python -m benchmarks.run                               # 10k, 100k, 1M films, in-memory stand-ins
+    python -m benchmarks.run --films 10000 --columnar
+    python -m benchmarks.run --films 1000000 --main-only        # one pass per document, without the fan-out
+    python -m benchmarks.run --films 100000 --backend containers --truncate
+
+Every scale runs in a separate interpreter, so peak RSS of one scale does not leak into the next.
+"""
+import argparse
+import json
+import logging
+import resource
+import subprocess
+import sys
+import time
+from typing import Any, Optional
+
+import psycopg2
+from prometheus_client import REGISTRY
+
+from benchmarks.stand_ins import MemoryStorage, memory_process
+from benchmarks.synthetic import SyntheticContent
+from etl_libs.processes.base import BaseETLProcess
+from etl_libs.processes.filmwork import FilmworkETLProcess
+from etl_libs.processes.genre import GenreETLProcess
+from etl_libs.processes.person import PersonETLProcess
+from etl_libs.storage import State
+from etl_libs.transformers.pool import TransformPool
+
+logger = logging.getLogger(__name__)
+
+PROCESSES = (GenreETLProcess, FilmworkETLProcess, PersonETLProcess)
+STAGES = ("extract", "transform", "load", "state")
+
+
+def peak_rss_mb() -> float:
+    """Returns the peak resident set size of the interpreter in megabytes (ru_maxrss is in kilobytes on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def sample(name: str, process: BaseETLProcess, **labels: str) -> float:
+    """Sums the metric of the process over its tables (see etl_libs.metrics)."""
+    return sum(
+        REGISTRY.get_sample_value(name, {"process": process.MAIN_TABLE, "table": table, **labels}) or 0.0
+        for table in process.TABLES
+    )
+
+
+def build_processes(args: argparse.Namespace, content: SyntheticContent,
+                    transform_pool: Optional[TransformPool]) -> list[BaseETLProcess]:
+    process_options = {"transform_pool": transform_pool, "columnar": args.columnar}
+    if args.backend == "memory":
+        return [memory_process(process, content, **process_options) for process in PROCESSES]
+
+    from etl_libs.config import get_settings
+    from main import get_es_dsn, get_pg_dsn
+
+    settings = get_settings()
+    connection = psycopg2.connect(**get_pg_dsn(settings))
+    try:
+        content.copy_to_postgres(connection)
+    finally:
+        connection.close()
+    processes = []
+    for process_class in PROCESSES:
+        process = process_class(pg_dsn=get_pg_dsn(settings), es_dsn=get_es_dsn(settings), **process_options)
+        process.state = State(storage=MemoryStorage())
+        processes.append(process)
+    return processes
+
+
+def run_scale(args: argparse.Namespace, films: int) -> list[dict[str, Any]]:
+    """Generates the data of the scale and runs every process from the empty state until it drains.
+
+    Returns:
+        A list of the dicts of results, one per process.
+    """
+    started = time.perf_counter()
+    content = SyntheticContent(
+        films=films,
+        persons=max(int(films * args.persons_per_film), 1),
+        genres=args.genres,
+        cast_size=args.cast_size,
+        genres_per_film=args.genres_per_film,
+        genre_skew=args.genre_skew,
+        seed=args.seed,
+    )
+    logger.warning("Scale %s: данные сгенерированы за %.1f с, RSS %.0f MB",
+                   films, time.perf_counter() - started, peak_rss_mb())
+
+    transform_pool = TransformPool(args.transform_workers) if args.transform_workers > 0 else None
+    results = []
+    try:
+        for process in build_processes(args, content, transform_pool):
+            if args.main_only:
+                process.TABLES = (process.MAIN_TABLE,)
+            started = time.perf_counter()
+            rows = process.run()
+            elapsed = time.perf_counter() - started
+            docs = sample("etl_docs_indexed_total", process)
+            results.append({
+                "films": films,
+                "process": process.MAIN_TABLE,
+                "seconds": elapsed,
+                "rows": rows,
+                "docs": docs,
+                "rows_per_second": rows / elapsed if elapsed else 0.0,
+                "docs_per_second": docs / elapsed if elapsed else 0.0,
+                "bulk_failures": sample("etl_bulk_failures_total", process),
+                "peak_rss_mb": peak_rss_mb(),
+                "stages": {stage: sample("etl_stage_seconds_sum", process, stage=stage) for stage in STAGES},
+            })
+    finally:
+        if transform_pool is not None:
+            transform_pool.close()
+    return results
+
+
+def run_isolated(films: int) -> list[dict[str, Any]]:
+    """Runs the scale in a separate interpreter with the same arguments and reads its JSON results."""
+    command = [sys.executable, "-m", "benchmarks.run", *sys.argv[1:], "--films", str(films), "--emit-json"]
+    completed = subprocess.run(command, stdout=subprocess.PIPE, check=True)
+    return json.loads(completed.stdout.decode().splitlines()[-1])
+
+
+def print_report(results: list[dict[str, Any]]) -> None:
+    header = f"{'films':>9} {'process':>10} {'seconds':>9} {'rows/s':>10} {'docs/s':>10} {'peak MB':>8} " + \
+             " ".join(f"{stage:>9}" for stage in STAGES)
+    print(header)
+    for result in results:
+        print(f"{result['films']:>9} {result['process']:>10} {result['seconds']:>9.2f} "
+              f"{result['rows_per_second']:>10.0f} {result['docs_per_second']:>10.0f} {result['peak_rss_mb']:>8.0f} " +
+              " ".join(f"{result['stages'][stage]:>9.2f}" for stage in STAGES))
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Бенчмарк ETL на синтетических данных")
+    parser.add_argument("--films", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--persons-per-film", type=float, default=0.5, help="Количество персон на фильм")
+    parser.add_argument("--genres", type=int, default=30)
+    parser.add_argument("--cast-size", type=int, default=10, help="Средний размер состава фильма")
+    parser.add_argument("--genres-per-film", type=int, default=2)
+    parser.add_argument("--genre-skew", type=float, default=1.0, help="Показатель распределения Ципфа для жанров")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--backend", choices=("memory", "containers"), default="memory",
+                        help="memory: заглушки экстрактора и загрузчика; containers: Postgres и ES из .env")
+    parser.add_argument("--truncate", action="store_true",
+                        help="Разрешить очистку таблиц content перед загрузкой данных (для --backend containers)")
+    parser.add_argument("--main-only", action="store_true",
+                        help="Обрабатывать только основную таблицу процесса, без fan-out по связанным таблицам")
+    parser.add_argument("--transform-workers", type=int, default=0)
+    parser.add_argument("--columnar", action="store_true")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--json", help="Сохранить результаты в JSON (базовая линия для сравнения)")
+    parser.add_argument("--emit-json", action="store_true", help=argparse.SUPPRESS)
+    return parser
+
+
+def main():
+    args = get_parser().parse_args()
+    logging.basicConfig(level=args.log_level, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    if args.backend == "containers" and not args.truncate:
+        raise SystemExit("--backend containers очищает таблицы content, подтвердите флагом --truncate")
+
+    if args.emit_json:
+        print(json.dumps(run_scale(args, args.films[-1])))
+        return
+
+    if len(args.films) == 1:
+        results = run_scale(args, args.films[0])
+    else:
+        results = [result for films in args.films for result in run_isolated(films)]
+    print_report(results)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
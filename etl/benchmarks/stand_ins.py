@@ -0,0 +1,135 @@
+import json
+import logging
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Iterable, Optional
+
+from pydantic import BaseModel
+
+from benchmarks.synthetic import SyntheticContent
+from etl_libs.extractors.base import BaseExtractor
+from etl_libs.loaders.loader import ElasticsearchLoader
+from etl_libs.processes.base import BaseETLProcess
+from etl_libs.storage import BaseStorage, State
+
+if TYPE_CHECKING:
+    import pyarrow
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryStorage(BaseStorage):
+    """State storage in the dict. Every benchmark run starts from the empty state."""
+
+    def __init__(self):
+        self.state = {}
+
+    def save_state(self, state: dict) -> None:
+        self.state = dict(state)
+
+    def retrieve_state(self) -> dict:
+        return dict(self.state)
+
+
+class MemoryExtractor(BaseExtractor):
+    """Stand-in of the extractor, which answers the queries from the SyntheticContent.
+
+    It is mixed into the real extractor class by `bind`, so the process sees the same class interface.
+    Rows have the same keys as the rows of the real queries.
+    """
+
+    CONTENT: SyntheticContent
+    MAIN_TABLE: str
+
+    def __init__(self, dsn: Any = None, replica_dsns: Any = ()):
+        super().__init__(dsn)
+
+    @classmethod
+    def bind(cls, extractor_class: type[BaseExtractor], main_table: str,
+             content: SyntheticContent) -> type[BaseExtractor]:
+        return type(f"Memory{extractor_class.__name__}", (cls, extractor_class),
+                    {"CONTENT": content, "MAIN_TABLE": main_table})
+
+    def connect(self) -> None:
+        pass
+
+    def disconnect(self) -> None:
+        pass
+
+    def fetch_updated_records(self, table: str, last_modified: datetime, last_id: str) \
+            -> tuple[list[str], datetime, str]:
+        results = self.CONTENT.updated_records(table, last_modified, last_id, self.BATCH_SIZE)
+        if not results:
+            return [], last_modified, last_id
+        return [result["id"] for result in results], results[-1]["modified"], results[-1]["id"]
+
+    def fetch_mains_by_related_table(self, main_table: str, related_table: str, related_ids: list[str]) -> list[str]:
+        return self.CONTENT.mains(main_table, related_table, related_ids)
+
+    def fetch_ids_after(self, table: str, last_id: str, limit: int) -> list[str]:
+        return self.CONTENT.ids_after(table, last_id, limit)
+
+    def get_watermark(self, table: str) -> tuple[Optional[datetime], Optional[str]]:
+        return self.CONTENT.watermark(table)
+
+    def get_oldest_modified_date(self, table: str) -> Optional[datetime]:
+        return self.CONTENT.oldest_modified(table)
+
+    def fetch_by_ids(self, ids: list[str]) -> list[dict[str, Any]]:
+        return list(self.stream_by_ids(ids))
+
+    def stream_by_ids(self, ids: list[str]) -> Iterable[dict[str, Any]]:
+        return self.CONTENT.rows(self.MAIN_TABLE, ids)
+
+    def fetch_arrow_by_ids(self, ids: list[str]) -> 'pyarrow.RecordBatch':
+        rows = self.fetch_by_ids(ids)
+        columns = list(rows[0]) if rows else []
+        return self.rows_to_arrow(columns, [tuple(row.values()) for row in rows])
+
+
+class NullLoader(ElasticsearchLoader):
+    """Stand-in of the loader, which serializes the bulk body as the Elasticsearch client does, and drops it.
+
+    Counts documents and bytes of the bulk bodies.
+    """
+
+    def __init__(self, dsn: Any = None, cache: Any = None):
+        self.client = None
+        self.cache = None
+        self.docs = 0
+        self.bytes = 0
+
+    def close(self) -> None:
+        pass
+
+    def index_exists(self, index_name) -> bool:
+        return True
+
+    def load_to_elasticsearch(self, index: str, data: Iterable[BaseModel], min_version: Optional[int] = None) \
+            -> tuple[int, int]:
+        indexed = 0
+        for action in self.prepare_data(index, data, min_version):
+            source = action.pop("_source")
+            self.bytes += len(json.dumps(action)) + len(json.dumps(source, ensure_ascii=False)) + 2
+            indexed += 1
+        self.docs += indexed
+        return indexed, 0
+
+    def load_bulk_body(self, index: str, body: bytes, min_version: Optional[int] = None) -> tuple[int, int]:
+        if min_version is not None:
+            body = self.raise_versions(body, min_version)
+        indexed = body.count(b"\n") // 2
+        self.docs += indexed
+        self.bytes += len(body)
+        return indexed, 0
+
+
+def memory_process(process_class: type[BaseETLProcess], content: SyntheticContent,
+                   **process_options: Any) -> BaseETLProcess:
+    """Builds the process with MemoryExtractor, NullLoader and MemoryStorage instead of Postgres, ES and files."""
+    stand_in_class = type(process_class.__name__, (process_class,), {
+        "EXTRACTOR_CLASS": MemoryExtractor.bind(process_class.EXTRACTOR_CLASS, process_class.MAIN_TABLE, content),
+        "LOADER_CLASS": NullLoader,
+    })
+    process = stand_in_class(pg_dsn={}, es_dsn="", **process_options)
+    process.state = State(storage=MemoryStorage())
+    return process
@@ -0,0 +1,273 @@
+import io
+import logging
+import random
+import uuid
+from array import array
+from bisect import bisect_right
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+from typing import Any, Iterable, Iterator
+
+logger = logging.getLogger(__name__)
+
+
+class Csr:
+    """Compressed rows of ints: values of the row `i` are `values[offsets[i]:offsets[i + 1]]`.
+
+    Keeps millions of m2m links in flat arrays instead of the lists of tuples.
+    """
+
+    def __init__(self):
+        self.offsets = array("q", [0])
+        self.values = array("i")
+
+    def append(self, values: Iterable[int]) -> None:
+        self.values.extend(values)
+        self.offsets.append(len(self.values))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row: int) -> array:
+        return self.values[self.offsets[row]:self.offsets[row + 1]]
+
+    def transpose(self, rows: int) -> tuple['Csr', array]:
+        """Builds the reverse links by the counting sort.
+
+        Args:
+            rows: A count of the rows of the result.
+
+        Returns:
+            A tuple of the reverse Csr and an array of the positions of its values in self.values.
+        """
+        counts = array("q", bytes(8 * (rows + 1)))
+        for value in self.values:
+            counts[value + 1] += 1
+        reverse = Csr()
+        reverse.offsets = array("q", accumulate(counts))
+        reverse.values = array("i", bytes(4 * len(self.values)))
+        positions = array("i", bytes(4 * len(self.values)))
+        cursor = array("q", reverse.offsets[:-1])
+        for row in range(len(self)):
+            for position in range(self.offsets[row], self.offsets[row + 1]):
+                value = self.values[position]
+                reverse.values[cursor[value]] = row
+                positions[cursor[value]] = position
+                cursor[value] += 1
+        return reverse, positions
+
+
+class SyntheticContent:
+    """Seeded synthetic data of the 'content' schema.
+
+    The same params and seed always give the same data.
+    Rows of the i-th object have deterministic id and 'modified' (growing with i),
+    so the keyset pagination by '(modified, id)' walks objects in the order of their numbers.
+    Cast and genres of the films are generated once and kept in Csr arrays.
+
+    Genres popularity follows Zipf law with `genre_skew` exponent:
+    the more the skew, the more films a renaming of the top genre fans out to.
+    """
+
+    BASE_MODIFIED = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    # Номер таблицы - старшие биты синтетического UUID
+    KINDS = {"film_work": 1, "person": 2, "genre": 3, "person_film_work": 4, "genre_film_work": 5}
+    ROLES = ("actor", "writer", "director")
+    ROLE_WEIGHTS = (0.8, 0.1, 0.1)
+    ID_BITS = 96
+
+    def __init__(self, films: int, persons: int, genres: int = 30, cast_size: int = 10,
+                 genres_per_film: int = 2, genre_skew: float = 1.0, seed: int = 42):
+        """
+        Args:
+            films: A count of the film_works.
+            persons: A count of the persons.
+            genres: A count of the genres.
+            cast_size: An average count of the persons of the film.
+            genres_per_film: A max count of the genres of the film.
+            genre_skew: An exponent of the Zipf distribution of the genres.
+            seed: A seed of the generator.
+        """
+        self.sizes = {"film_work": films, "person": persons, "genre": genres}
+        rng = random.Random(seed)
+        genre_weights = list(accumulate(1 / (rank + 1) ** genre_skew for rank in range(genres)))
+        role_weights = list(accumulate(self.ROLE_WEIGHTS))
+
+        self.film_persons = Csr()
+        self.film_roles = bytearray()
+        self.film_genres = Csr()
+        for _ in range(films):
+            cast = rng.sample(range(persons), min(rng.randint(1, 2 * cast_size - 1), persons)) if persons else []
+            self.film_persons.append(cast)
+            self.film_roles.extend(rng.choices(range(len(self.ROLES)), cum_weights=role_weights, k=len(cast)))
+            chosen = rng.choices(range(genres), cum_weights=genre_weights, k=genres_per_film) if genres else []
+            self.film_genres.append(sorted(set(chosen)))
+        self.person_films, self.person_positions = self.film_persons.transpose(persons)
+        self.genre_films, _ = self.film_genres.transpose(genres)
+        logger.info("Synthetic. Сгенерировано: %s, связей person_film_work: %s, genre_film_work: %s",
+                    self.sizes, len(self.film_persons.values), len(self.film_genres.values))
+
+    @classmethod
+    def make_id(cls, table: str, number: int) -> str:
+        return str(uuid.UUID(int=(cls.KINDS[table] << cls.ID_BITS) | number))
+
+    @classmethod
+    def number_of(cls, object_id: str) -> int:
+        return uuid.UUID(object_id).int & ((1 << cls.ID_BITS) - 1)
+
+    @classmethod
+    def modified(cls, table: str, number: int) -> datetime:
+        return cls.BASE_MODIFIED + timedelta(milliseconds=number)
+
+    def oldest_modified(self, table: str) -> datetime | None:
+        return self.modified(table, 0) if self.sizes[table] else None
+
+    def updated_records(self, table: str, last_modified: datetime, last_id: str, limit: int) \
+            -> list[dict[str, Any]]:
+        """Emulates BaseExtractor.updated_records_query."""
+        start = bisect_right(range(self.sizes[table]), (last_modified, last_id),
+                             key=lambda number: (self.modified(table, number), self.make_id(table, number)))
+        return [
+            {"id": self.make_id(table, number), "modified": self.modified(table, number)}
+            for number in range(start, min(start + limit, self.sizes[table]))
+        ]
+
+    def watermark(self, table: str) -> tuple[datetime | None, str | None]:
+        """Emulates BaseExtractor.get_watermark."""
+        if not self.sizes[table]:
+            return None, None
+        return self.modified(table, self.sizes[table] - 1), self.make_id(table, self.sizes[table] - 1)
+
+    def ids_after(self, table: str, last_id: str, limit: int) -> list[str]:
+        """Emulates BaseExtractor.fetch_ids_after."""
+        start = bisect_right(range(self.sizes[table]), last_id, key=lambda number: self.make_id(table, number))
+        return [self.make_id(table, number) for number in range(start, min(start + limit, self.sizes[table]))]
+
+    def mains(self, main_table: str, related_table: str, related_ids: list[str]) -> list[str]:
+        """Emulates BaseExtractor.mains_by_related_table_query: distinct ids ordered by 'modified'."""
+        links = {
+            ("film_work", "genre"): self.genre_films,
+            ("film_work", "person"): self.person_films,
+            ("person", "film_work"): self.film_persons,
+            ("genre", "film_work"): self.film_genres,
+        }[main_table, related_table]
+        numbers = set()
+        for related_id in related_ids:
+            numbers.update(links[self.number_of(related_id)])
+        return [self.make_id(main_table, number) for number in sorted(numbers)]
+
+    def film_rows(self, film_ids: list[str]) -> Iterator[dict[str, Any]]:
+        """Emulates FilmworkExtractor.QUERY: LEFT JOINs of the cast and genres, ordered by 'fw_id'."""
+        for number in sorted(self.number_of(film_id) for film_id in film_ids):
+            modified = self.modified("film_work", number)
+            film = {
+                "fw_id": self.make_id("film_work", number),
+                "title": f"Film {number}",
+                "description": f"Synthetic film number {number}",
+                "rating": number * 37 % 100 / 10,
+                "type": "movie",
+                "created": modified,
+                "modified": modified,
+            }
+            offset = self.film_persons.offsets[number]
+            cast = [
+                {
+                    "role": self.ROLES[self.film_roles[offset + position]],
+                    "person_id": self.make_id("person", person),
+                    "full_name": f"Person {person}",
+                    "person_modified": self.modified("person", person),
+                    "person_link_created": modified,
+                }
+                for position, person in enumerate(self.film_persons[number])
+            ] or [{"role": None, "person_id": None, "full_name": None, "person_modified": None, "person_link_created": None}]
+            genres = [
+                {"genre_id": self.make_id("genre", genre), "genre_name": f"Genre {genre}",
+                 "genre_modified": self.modified("genre", genre), "genre_link_created": modified}
+                for genre in self.film_genres[number]
+            ] or [{"genre_id": None, "genre_name": None, "genre_modified": None, "genre_link_created": None}]
+            for person in cast:
+                for genre in genres:
+                    yield {**film, **person, **genre}
+
+    def person_rows(self, person_ids: list[str]) -> Iterator[dict[str, Any]]:
+        """Emulates PersonExtractor.QUERY."""
+        for person_id in person_ids:
+            number = self.number_of(person_id)
+            person = {"p_id": person_id, "full_name": f"Person {number}", "modified": self.modified("person", number)}
+            films = self.person_films[number]
+            positions = self.person_positions[self.person_films.offsets[number]:self.person_films.offsets[number + 1]]
+            if not films:
+                yield {**person, "role": None, "film_id": None}
+            for film, position in zip(films, positions):
+                yield {**person, "role": self.ROLES[self.film_roles[position]], "film_id": self.make_id("film_work", film)}
+
+    def genre_rows(self, genre_ids: list[str]) -> Iterator[dict[str, Any]]:
+        """Emulates GenreExtractor.QUERY."""
+        for genre_id in genre_ids:
+            number = self.number_of(genre_id)
+            yield {"id": genre_id, "name": f"Genre {number}", "description": None, "modified": self.modified("genre", number)}
+
+    def rows(self, main_table: str, ids: list[str]) -> Iterator[dict[str, Any]]:
+        return {"film_work": self.film_rows, "person": self.person_rows, "genre": self.genre_rows}[main_table](ids)
+
+    def copy_to_postgres(self, connection, chunk_rows: int = 100_000) -> None:
+        """Replaces the content of the 'content' tables by the synthetic data using COPY.
+
+        Args:
+            connection: An opened psycopg2 connection. Committed at the end.
+            chunk_rows: A count of the rows per one COPY.
+        """
+        tables = {
+            "film_work": ("id", "title", "description", "rating", "type", "created", "modified"),
+            "person": ("id", "full_name", "created", "modified"),
+            "genre": ("id", "name", "description", "created", "modified"),
+            "person_film_work": ("id", "person_id", "film_work_id", "role", "created"),
+            "genre_film_work": ("id", "genre_id", "film_work_id", "created"),
+        }
+        with connection.cursor() as cursor:
+            cursor.execute("TRUNCATE {};".format(", ".join(f"content.{table}" for table in tables)))
+            for table, columns in tables.items():
+                chunk = io.StringIO()
+                rows = 0
+                for row in self._table_rows(table):
+                    chunk.write("\t".join(r"\N" if value is None else str(value) for value in row) + "\n")
+                    rows += 1
+                    if rows % chunk_rows == 0:
+                        self._copy(cursor, table, columns, chunk)
+                        chunk = io.StringIO()
+                self._copy(cursor, table, columns, chunk)
+                logger.info("Synthetic. content.%s: загружено %s строк", table, rows)
+        connection.commit()
+
+    @staticmethod
+    def _copy(cursor, table: str, columns: tuple[str, ...], chunk: io.StringIO) -> None:
+        chunk.seek(0)
+        cursor.copy_expert(f"COPY content.{table} ({', '.join(columns)}) FROM STDIN", chunk)
+
+    def _table_rows(self, table: str) -> Iterator[tuple]:
+        if table == "film_work":
+            for number in range(self.sizes[table]):
+                modified = self.modified(table, number)
+                yield (self.make_id(table, number), f"Film {number}", f"Synthetic film number {number}",
+                       number * 37 % 100 / 10, "movie", modified, modified)
+        elif table == "person":
+            for number in range(self.sizes[table]):
+                modified = self.modified(table, number)
+                yield self.make_id(table, number), f"Person {number}", modified, modified
+        elif table == "genre":
+            for number in range(self.sizes[table]):
+                modified = self.modified(table, number)
+                yield self.make_id(table, number), f"Genre {number}", None, modified, modified
+        elif table == "person_film_work":
+            for film in range(len(self.film_persons)):
+                offset = self.film_persons.offsets[film]
+                for position, person in enumerate(self.film_persons[film]):
+                    yield (self.make_id(table, offset + position), self.make_id("person", person),
+                           self.make_id("film_work", film), self.ROLES[self.film_roles[offset + position]],
+                           self.modified("film_work", film))
+        else:
+            for film in range(len(self.film_genres)):
+                offset = self.film_genres.offsets[film]
+                for position, genre in enumerate(self.film_genres[film]):
+                    yield (self.make_id(table, offset + position), self.make_id("genre", genre),
+                           self.make_id("film_work", film), self.modified("film_work", film))
@@ -14082,6 +14082,41 @@ CREATE UNIQUE INDEX film_work_genre_idx ON content.genre_film_work USING btree (
 CREATE UNIQUE INDEX film_work_person_idx ON content.person_film_work USING btree (film_work_id, person_id, role);
 
 
+--
+-- Name: film_work_modified_id_idx; Type: INDEX; Schema: content; Owner: app
+--
+
+CREATE INDEX film_work_modified_id_idx ON content.film_work USING btree (modified, id);
+
+
+--
+-- Name: genre_modified_id_idx; Type: INDEX; Schema: content; Owner: app
+--
+
+CREATE INDEX genre_modified_id_idx ON content.genre USING btree (modified, id);
+
+
+--
+-- Name: person_modified_id_idx; Type: INDEX; Schema: content; Owner: app
+--
+
+CREATE INDEX person_modified_id_idx ON content.person USING btree (modified, id);
+
+
+--
+-- Name: genre_film_work_genre_idx; Type: INDEX; Schema: content; Owner: app
+--
+
+CREATE INDEX genre_film_work_genre_idx ON content.genre_film_work USING btree (genre_id, film_work_id);
+
+
+--
+-- Name: person_film_work_person_idx; Type: INDEX; Schema: content; Owner: app
+--
+
+CREATE INDEX person_film_work_person_idx ON content.person_film_work USING btree (person_id, film_work_id);
+
+
 --
 -- Name: genre_name_4b473646_like; Type: INDEX; Schema: content; Owner: app
 --
@@ -16,6 +16,8 @@ class PostgresSettings(BaseSettings):
     password: str
     host: str
     port: int
+    # Реплики для чтения в формате "host:port", с теми же db/user/password
+    replica_hosts: list[str] = []
 
     model_config = SettingsConfigDict(env_prefix='PG_', env_file=ENV_FILE, env_file_encoding='utf-8')
 
@@ -28,6 +30,13 @@ class ElasticSettings(BaseSettings):
     model_config = SettingsConfigDict(env_prefix='ES_', env_file=ENV_FILE, env_file_encoding='utf-8')
 
 
+class RedisSettings(BaseSettings):
+    host: str
+    port: int
+
+    model_config = SettingsConfigDict(env_prefix='REDIS_', env_file=ENV_FILE, env_file_encoding='utf-8')
+
+
 class LoggerSettings(BaseSettings):
     path: str
     level: str
@@ -40,6 +49,26 @@ class Settings(BaseSettings):
     postgres: PostgresSettings = PostgresSettings()
     elastic: ElasticSettings = ElasticSettings()
     logger: LoggerSettings = LoggerSettings()
+    redis: RedisSettings = RedisSettings()
     interval: int
+    max_interval: int = 300
+    idle_cycles_before_backoff: int = 3
+    transform_workers: int = 0
+    columnar_transform: bool = False
+    columnar_validate: bool = False
+    bulk_lane_share: float = 0.2
+    metrics_port: int = 9100
+    profile_dir: str = ""
+    profile_slowest: int = 5
+    profile_sample_rate: float = 1.0
+    refresh_suspend_threshold: int = 0
+    refresh_suspended_interval: str = "-1"
+    cache_write_through: bool = False
+    cache_publish_changes: bool = False
+    cache_bump_generations: bool = False
+    # Общие с API настройки кэша
+    cache_detail_expire_in_seconds: int = 300
+    cache_invalidation_channel: str = "cache_invalidation"
+    cache_stale_while_revalidate: int = 0
 
     model_config = SettingsConfigDict(env_file=ENV_FILE, env_file_encoding='utf-8', extra='ignore')
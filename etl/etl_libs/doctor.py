@@ -0,0 +1,155 @@
+import logging
+from typing import Any, Iterable, Optional
+
+import psycopg2
+
+from etl_libs.extractors.base import BaseExtractor
+from etl_libs.processes.base import BaseETLProcess
+
+logger = logging.getLogger(__name__)
+
+
+class Doctor:
+    """Diagnostics of the queries, issued by the extractors.
+
+    Runs `EXPLAIN (ANALYZE, BUFFERS)` for every query shape of the ETL processes
+    and flags the plan nodes, which are not expected on the polling path.
+    Optionally creates the indexes, which keyset pagination and fan-out joins need.
+    """
+
+    FLAGGED_NODES = ("Seq Scan", "Sort")
+    ZERO_UUID = "00000000-0000-0000-0000-000000000000"
+    # (name, table, columns). Also listed in the dump.sql
+    INDEXES = (
+        ("film_work_modified_id_idx", "film_work", "modified, id"),
+        ("genre_modified_id_idx", "genre", "modified, id"),
+        ("person_modified_id_idx", "person", "modified, id"),
+        ("genre_film_work_genre_idx", "genre_film_work", "genre_id, film_work_id"),
+        ("person_film_work_person_idx", "person_film_work", "person_id, film_work_id"),
+    )
+
+    def __init__(self, pg_dsn: dict, processes: Iterable[type[BaseETLProcess]]):
+        self.pg_dsn = pg_dsn
+        self.processes = tuple(processes)
+
+    def sample_ids(self, extractor: BaseExtractor, table: str) -> list[str]:
+        """Returns the first batch of ids of the table, as on the first run of the ETL."""
+        oldest = extractor.get_oldest_modified_date(table)
+        ids, _, _ = extractor.fetch_updated_records(table, oldest, self.ZERO_UUID)
+        return ids
+
+    def query_shapes(self, process: type[BaseETLProcess], extractor: BaseExtractor) -> list[tuple[str, str, tuple]]:
+        """Builds every query the process issues with realistic params.
+
+        Args:
+            process: A class of the ETL process.
+            extractor: An extractor of the process.
+
+        Returns:
+            A list of tuples (title, query, params).
+        """
+        shapes = []
+        for table in process.TABLES:
+            oldest = extractor.get_oldest_modified_date(table)
+            shapes.append((
+                f"{process.MAIN_TABLE}: fetch_updated_records({table})",
+                extractor.updated_records_query(table),
+                (oldest, self.ZERO_UUID),
+            ))
+            if table != process.MAIN_TABLE:
+                related_ids = self.sample_ids(extractor, table)
+                if related_ids:
+                    shapes.append((
+                        f"{process.MAIN_TABLE}: fetch_mains_by_related_table({table})",
+                        extractor.mains_by_related_table_query(process.MAIN_TABLE, table),
+                        (tuple(related_ids),),
+                    ))
+        main_ids = self.sample_ids(extractor, process.MAIN_TABLE)
+        if main_ids:
+            shapes.append((f"{process.MAIN_TABLE}: fetch_by_ids", extractor.QUERY, (tuple(main_ids),)))
+        return shapes
+
+    @staticmethod
+    def explain(extractor: BaseExtractor, query: str, params: tuple) -> dict[str, Any]:
+        """Returns a JSON plan of the query, executed by `EXPLAIN (ANALYZE, BUFFERS)`."""
+        result = extractor.execute_query("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query, params)
+        return result[0][0][0]
+
+    @classmethod
+    def find_problems(cls, plan: dict[str, Any]) -> list[str]:
+        """Walks the plan tree and describes every flagged node."""
+        problems = []
+        nodes = [plan["Plan"]]
+        while nodes:
+            node = nodes.pop()
+            nodes.extend(node.get("Plans", []))
+            if node["Node Type"] not in cls.FLAGGED_NODES:
+                continue
+            if node["Node Type"] == "Seq Scan":
+                problems.append(f"Seq Scan on {node.get('Relation Name')} (rows={node.get('Actual Rows')})")
+            else:
+                problems.append(f"Sort by {node.get('Sort Key')} ({node.get('Sort Method')})")
+        return problems
+
+    def check(self) -> dict[str, list[str]]:
+        """Explains all the query shapes and logs the report.
+
+        Returns:
+            A dict of the query title to the list of problems.
+        """
+        report = {}
+        for process in self.processes:
+            extractor = process.EXTRACTOR_CLASS(self.pg_dsn)
+            try:
+                for title, query, params in self.query_shapes(process, extractor):
+                    plan = self.explain(extractor, query, params)
+                    report[title] = self.find_problems(plan)
+                    buffers = plan["Plan"].get("Shared Hit Blocks", 0) + plan["Plan"].get("Shared Read Blocks", 0)
+                    logger.info("Doctor. %s: %.2f ms, buffers=%s, %s", title, plan["Execution Time"], buffers,
+                                "; ".join(report[title]) or "OK")
+            finally:
+                extractor.disconnect()
+        return report
+
+    @staticmethod
+    def index_valid(cursor, name: str) -> Optional[bool]:
+        """Returns pg_index.indisvalid of the index in the 'content' schema, or None if there is no such index.
+
+        A failed or interrupted `CREATE INDEX CONCURRENTLY` leaves an invalid index: it is not used by queries,
+        but `IF NOT EXISTS` skips it.
+        """
+        cursor.execute("""
+            SELECT i.indisvalid
+            FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = 'content' AND c.relname = %s;
+        """, (name,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def create_indexes(self) -> None:
+        """Creates missing indexes concurrently and refreshes visibility map and statistics.
+
+        Invalid indexes (see index_valid) are dropped and created again.
+        `CREATE INDEX CONCURRENTLY` and `VACUUM` cannot run inside a transaction,
+        so a separate autocommit connection is used.
+        """
+        connection = psycopg2.connect(**self.pg_dsn)
+        connection.autocommit = True
+        try:
+            with connection.cursor() as cursor:
+                for name, table, columns in self.INDEXES:
+                    valid = self.index_valid(cursor, name)
+                    if valid:
+                        logger.info("Doctor. Индекс %s на content.%s (%s) уже существует", name, table, columns)
+                        continue
+                    if valid is not None:
+                        logger.warning("Doctor. Индекс %s невалиден (прерванное построение), пересоздаём", name)
+                        cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS content.{name};")
+                    cursor.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON content.{table} ({columns});")
+                    logger.info("Doctor. Индекс %s на content.%s (%s) создан", name, table, columns)
+                for table in sorted({table for _, table, _ in self.INDEXES}):
+                    cursor.execute(f"VACUUM (ANALYZE) content.{table};")
+        finally:
+            connection.close()
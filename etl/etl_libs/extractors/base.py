@@ -1,21 +1,44 @@
 import logging
 from abc import ABC, abstractmethod
 from datetime import datetime
-from typing import Optional, Union, Iterable
+from typing import TYPE_CHECKING, Generator, Iterable, Optional, Sequence, Union
 
 import backoff
 import psycopg2
 from psycopg2.extensions import connection as _connection, cursor as _cursor
 from psycopg2.extras import DictCursor
 
+if TYPE_CHECKING:
+    import pyarrow
+
 logger = logging.getLogger(__name__)
 
 
 class BaseExtractor(ABC):
-    def __init__(self, dsn: dict[str, Union[str, int]]):
+    """Base class of the Extractors.
+
+    Watermark queries (fetch_updated_records, get_oldest_modified_date) always run on the primary:
+    they must see the latest commits. Bulk reads by ids and fan-out queries run on the read replicas, if set.
+
+    Replication-lag guard: after every batch of the updated records the primary WAL position is saved
+    to self.read_lsn. A replica is used only if it has replayed WAL up to this position,
+    so it contains every commit the batch was based on. Otherwise, the query runs on the primary.
+    """
+
+    QUERY: str
+    BATCH_SIZE = 100
+    STREAM_ITERSIZE = 1000
+
+    def __init__(self, dsn: dict[str, Union[str, int]], replica_dsns: Sequence[dict[str, Union[str, int]]] = ()):
 
         self.dsn = dsn
         self.connection: Optional[_connection] = None
+        self.replica_dsns = list(replica_dsns)
+        self.replica_connections: dict[int, _connection] = {}
+        self.read_lsn: Optional[str] = None
+        # Реплики, проверенные на self.read_lsn: номер -> догнала ли
+        self.replicas_caught_up: dict[int, bool] = {}
+        self._next_replica = 0
 
     def connect(self) -> None:
         """Opens a connection with dsn and saves it to self.connection.
@@ -34,37 +57,154 @@ class BaseExtractor(ABC):
         if self.connection is not None and not self.connection.closed:
             self.connection.close()
             logger.info("Соединение с Postgres закрыто")
+        for connection in self.replica_connections.values():
+            if not connection.closed:
+                connection.close()
+        self.replica_connections.clear()
+
+    def connect_replica(self, number: int) -> _connection:
+        """Returns an opened connection with the replica by its number in self.replica_dsns."""
+        connection = self.replica_connections.get(number)
+        if connection is None or connection.closed:
+            connection = psycopg2.connect(**self.replica_dsns[number], cursor_factory=DictCursor)
+            self.replica_connections[number] = connection
+            logger.info("Соединение с репликой Postgres %s открыто", number)
+        return connection
 
-    def get_cursor(self) -> _cursor:
-        """Returns a cursor."""
+    def is_replica_caught_up(self, number: int) -> bool:
+        """Checks if the replica has replayed WAL up to self.read_lsn.
+
+        Result is cached until the next batch of updated records.
+        Unavailable replica is treated as lagging.
+        """
+        if number not in self.replicas_caught_up:
+            try:
+                connection = self.connect_replica(number)
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT pg_last_wal_replay_lsn() >= %s::pg_lsn AS caught_up;", (self.read_lsn,))
+                    self.replicas_caught_up[number] = bool(cursor.fetchone()["caught_up"])
+                connection.commit()
+            except psycopg2.Error as e:
+                logger.warning("Extractor. Реплика Postgres %s недоступна: %s", number, e)
+                self.replicas_caught_up[number] = False
+        return self.replicas_caught_up[number]
+
+    def get_read_connection(self) -> _connection:
+        """Returns a connection for the bulk reads.
+
+        Replicas are used round-robin. If no replica has caught up with self.read_lsn,
+        or no batch of updated records was fetched yet, returns the primary connection.
+        """
+        if self.replica_dsns and self.read_lsn is not None:
+            for shift in range(len(self.replica_dsns)):
+                number = (self._next_replica + shift) % len(self.replica_dsns)
+                connection = self.replica_connections.get(number)
+                if connection is not None and connection.closed:
+                    # Соединение потеряно: проверяем реплику заново
+                    self.replicas_caught_up.pop(number, None)
+                if self.is_replica_caught_up(number):
+                    self._next_replica = number + 1
+                    return self.replica_connections[number]
+            logger.info("Extractor. Реплики отстают от %s, запрос выполняется на основном сервере", self.read_lsn)
+        self.connect()
+        return self.connection
+
+    def get_cursor(self, replica: bool = False) -> _cursor:
+        """Returns a cursor.
+
+        Args:
+            replica: If True, the cursor is opened by the get_read_connection.
+        """
+        if replica:
+            return self.get_read_connection().cursor()
         self.connect()
         return self.connection.cursor()
 
     @backoff.on_exception(backoff.expo, psycopg2.Error, max_time=300, jitter=backoff.random_jitter)
-    def execute_query(self, query: str, params: Iterable = None) -> list:
+    def execute_query(self, query: str, params: Iterable = None, replica: bool = False) -> list:
         """Executes a query.
 
         Args:
             query: A SQL query with '%s' in the place for params.
             params: An Iterable. Will be pasted instead of %s in sql.
+            replica: If True, the query may be executed on the read replica.
 
         Returns:
             A list of sequences of chosen cursor_type.
         """
-        with self.get_cursor() as cursor:
+        with self.get_cursor(replica) as cursor:
             cursor.execute(query, params or ())
             return cursor.fetchall()
 
+    @backoff.on_exception(backoff.expo, psycopg2.Error, max_time=300, jitter=backoff.random_jitter)
+    def _open_stream(self, query: str, params: Iterable = None) -> _cursor:
+        """Opens a server-side (named) cursor and executes a query on it.
+
+        Args:
+            query: A SQL query with '%s' in the place for params.
+            params: An Iterable. Will be pasted instead of %s in sql.
+
+        Returns:
+            A named cursor with the executed query.
+        """
+        connection = self.get_read_connection()
+        cursor = connection.cursor(name=f"{self.__class__.__name__.lower()}_stream")
+        cursor.itersize = self.STREAM_ITERSIZE
+        cursor.execute(query, params or ())
+        return cursor
+
+    def stream_query(self, query: str, params: Iterable = None) -> Generator[dict, None, None]:
+        """Executes a query and yields its rows one by one.
+
+        Unlike execute_query, rows are not fetched all at once:
+        the server-side cursor transfers them in chunks of STREAM_ITERSIZE.
+        The query may be executed on the read replica.
+
+        Args:
+            query: A SQL query with '%s' in the place for params.
+            params: An Iterable. Will be pasted instead of %s in sql.
+
+        Returns:
+            A Generator of the sequences of chosen cursor_type.
+        """
+        cursor = self._open_stream(query, params)
+        try:
+            yield from cursor
+        finally:
+            cursor.close()
+            cursor.connection.commit()
+
+    def updated_records_query(self, table: str) -> str:
+        """Returns a keyset pagination query of the fetch_updated_records.
+
+        Row comparison '(modified, id) > (%s, %s)' is a single range
+        of the '(modified, id)' index, so the query is served by an index-only scan.
+
+        Args:
+            table: A string name of the fetched table.
+
+        Returns:
+            A SQL query with '%s' in the place for last_modified and last_id.
+        """
+        return """
+            SELECT id, modified
+            FROM content.{table}
+            WHERE (modified, id) > (%s, %s)
+            ORDER BY modified, id
+            LIMIT {batch_size};
+        """.format(table=table, batch_size=self.BATCH_SIZE)
+
     def fetch_updated_records(self, table: str, last_modified: datetime, last_id: str) \
             -> tuple[list[str], datetime, str]:
         """Fetches the oldest records from the table, which wasn't fetched.
 
         How?:
             Sorts all records by the modified date and returns the oldest.
-        Limited by batch size.
+        Limited by batch size (self.BATCH_SIZE).
         If count(records with equal last_modified) > (batch size),
         returns no more than batch size.
         On the next call will make slice from the last_fetched_id.
+        If replicas are set, saves the primary WAL position to self.read_lsn for the lag guard.
 
         Args:
             table: A string name of the fetched table.
@@ -77,30 +217,22 @@ class BaseExtractor(ABC):
             - A Datetime of modified from the newest of fetched records.
             - A string value of id from the newest of fetched records.
         """
-        query = """
-            SELECT id, modified
-            FROM content.{table}
-            WHERE (modified = '{last_modified}' AND id > '{last_id}')
-            OR modified > '{last_modified}'
-            ORDER BY modified, id
-            LIMIT 100;
-        """.format(
-            table=table,
-            last_modified=last_modified,
-            last_id=last_id
-        )
-        results = self.execute_query(query)
+        query = self.updated_records_query(table)
+        results = self.execute_query(query, params=(last_modified, last_id))
         logger.info("Extractor. Получено %s записей", len(results))
+        if results and self.replica_dsns:
+            self.read_lsn = self.execute_query("SELECT pg_current_wal_lsn() AS lsn;")[0]["lsn"]
+            self.replicas_caught_up.clear()
         try:
             last_record = results[-1]
             return [result["id"] for result in results], last_record["modified"], last_record["id"],
         except IndexError:
             return [], last_modified, last_id
 
-    def fetch_mains_by_related_table(self, main_table: str, related_table: str, related_ids: list[str]) -> list[str]:
-        """Fetch the uuids of objects from main_table, which connected to related_ids.
+    @staticmethod
+    def mains_by_related_table_query(main_table: str, related_table: str) -> str:
+        """Returns a fan-out query of the fetch_mains_by_related_table.
 
-        Uuids fetched from the m2m table by joining uuids of the related objects.
         The name of m2m table creates by both main_table and related_table.
 
         not_fw_table variable chooses one of the main_table and related_table not equal to 'film_work'.
@@ -109,13 +241,12 @@ class BaseExtractor(ABC):
         Args:
             main_table: A name of the table, which contains the ids of the fetched objects.
             related_table: A name of the table, which contains the ids of the related ids.
-            related_ids: A list of the objects ids extracted from the related_table.
 
         Returns:
-            A List of the main objects ids.
+            A SQL query with '%s' in the place for the tuple of related ids.
         """
         not_fw_table = main_table if not main_table == 'film_work' else related_table
-        query = """
+        return """
             SELECT DISTINCT t.id, t.modified
             FROM content.{main_table} t
             JOIN content.{not_fw_table}_film_work tfw on tfw.{main_table}_id = t.id
@@ -126,12 +257,66 @@ class BaseExtractor(ABC):
             not_fw_table=not_fw_table,
             related_table=related_table
         )
-        results = self.execute_query(query, params=(tuple(related_ids),))
+
+    def fetch_mains_by_related_table(self, main_table: str, related_table: str, related_ids: list[str]) -> list[str]:
+        """Fetch the uuids of objects from main_table, which connected to related_ids.
+
+        Uuids fetched from the m2m table by joining uuids of the related objects.
+        Query is built by the mains_by_related_table_query. It may be executed on the read replica.
+
+        Args:
+            main_table: A name of the table, which contains the ids of the fetched objects.
+            related_table: A name of the table, which contains the ids of the related ids.
+            related_ids: A list of the objects ids extracted from the related_table.
+
+        Returns:
+            A List of the main objects ids.
+        """
+        query = self.mains_by_related_table_query(main_table, related_table)
+        results = self.execute_query(query, params=(tuple(related_ids),), replica=True)
         logger.info(
             'Extractor %s: получены ID обновлённых записей из %s. Получено: %s->%s',
             main_table, related_table, len(related_ids), len(results))
         return [result["id"] for result in results]
 
+    def fetch_ids_after(self, table: str, last_id: str, limit: int) -> list[str]:
+        """Fetches the ids of the table in the order of the primary key, starting after the last_id.
+
+        Args:
+            table: A string name of the table.
+            last_id: A string uuid of the last fetched record.
+            limit: A max count of the ids.
+
+        Returns:
+            A list of the ids.
+        """
+        query = """
+            SELECT id
+            FROM content.{table}
+            WHERE id > %s
+            ORDER BY id
+            LIMIT {limit};
+        """.format(table=table, limit=limit)
+        return [result["id"] for result in self.execute_query(query, params=(last_id,))]
+
+    def get_watermark(self, table: str) -> tuple[Optional[datetime], Optional[str]]:
+        """Returns (modified, id) of the newest record of the table, as the state stores it after the last batch.
+
+        Args:
+            table: A string name of the table.
+
+        Returns:
+            A tuple of the datetime and the string uuid. (None, None) if the table is empty.
+        """
+        query = """
+            SELECT id, modified
+            FROM content.{}
+            ORDER BY modified DESC, id DESC
+            LIMIT 1;
+        """.format(table)
+        result = self.execute_query(query)
+        return (result[0]["modified"], result[0]["id"]) if result else (None, None)
+
     def get_oldest_modified_date(self, table: str) -> Optional[datetime]:
         """Returns the minimal modified value from the table.
 
@@ -149,6 +334,83 @@ class BaseExtractor(ABC):
         result = self.execute_query(query)[0]
         return result["oldest_modified"] if result else None
 
+    @backoff.on_exception(backoff.expo, psycopg2.Error, max_time=300, jitter=backoff.random_jitter)
+    def fetch_arrow_by_ids(self, ids: list[str]) -> 'pyarrow.RecordBatch':
+        """Fetches records by their ids by the self.QUERY into the Arrow record batch.
+
+        Rows are fetched as plain tuples (without DictRow) and transposed into columns.
+        The query may be executed on the read replica.
+        Requires optional 'pyarrow' package.
+
+        Args:
+            ids: list of the records ids.
+
+        Returns:
+            A pyarrow.RecordBatch with one column per field of the self.QUERY.
+        """
+        with self.get_read_connection().cursor(cursor_factory=_cursor) as cursor:
+            cursor.execute(self.QUERY, (tuple(ids),))
+            columns = [column.name for column in cursor.description]
+            types = [self.arrow_type(column.type_code) for column in cursor.description]
+            rows = cursor.fetchall()
+        logger.info("Extractor. Получено %s записей в Arrow batch", len(rows))
+        return self.rows_to_arrow(columns, rows, types)
+
+    @staticmethod
+    def arrow_type(type_code: int) -> Optional['pyarrow.DataType']:
+        """Returns the Arrow type of the Postgres column by its type code (OID of the pg_type), as psycopg2 reads it.
+
+        Returns None for the other types: they are inferred from the values.
+        """
+        import pyarrow
+
+        types = {
+            16: pyarrow.bool_(),  # bool
+            20: pyarrow.int64(),  # int8
+            21: pyarrow.int64(),  # int2
+            23: pyarrow.int64(),  # int4
+            25: pyarrow.string(),  # text
+            700: pyarrow.float64(),  # float4
+            701: pyarrow.float64(),  # float8
+            1042: pyarrow.string(),  # bpchar
+            1043: pyarrow.string(),  # varchar
+            1082: pyarrow.date32(),  # date
+            1114: pyarrow.timestamp("us"),  # timestamp
+            1184: pyarrow.timestamp("us", tz="UTC"),  # timestamptz
+            2950: pyarrow.string(),  # uuid, psycopg2 reads it as str
+        }
+        return types.get(type_code)
+
+    @staticmethod
+    def rows_to_arrow(columns: list[str], rows: list[tuple],
+                      types: Optional[Sequence[Optional['pyarrow.DataType']]] = None) -> 'pyarrow.RecordBatch':
+        """Transposes plain tuples into the Arrow record batch with one column per name of the columns.
+
+        Columns without a type are inferred from the values, so a column of only NULLs gets the 'null' type.
+        Types of the query (see arrow_type) keep the schema of the batch the same for any rows.
+        """
+        import pyarrow
+
+        types = types or [None] * len(columns)
+        values = zip(*rows) if rows else [[]] * len(columns)
+        arrays = [pyarrow.array(column, type=column_type) for column, column_type in zip(values, types)]
+        return pyarrow.RecordBatch.from_arrays(arrays, names=columns)
+
+    def stream_by_ids(self, ids: list[str]) -> Iterable[dict]:
+        """Returns records by their ids as an Iterable.
+
+        By default, it is just the result of the fetch_by_ids.
+        Extractors, which can produce a lot of rows per object, override it
+        to stream ordered rows from a server-side cursor.
+
+        Args:
+            ids: list of the records ids.
+
+        Returns:
+            Iterable of the records.
+        """
+        return self.fetch_by_ids(ids)
+
     @abstractmethod
     def fetch_by_ids(self, ids: list[str]):
         """Base method for the Extractors.
@@ -1,5 +1,5 @@
 import logging
-from typing import Any
+from typing import Any, Iterable
 
 from etl_libs.extractors.base import BaseExtractor
 
@@ -7,6 +7,33 @@ logger = logging.getLogger(__name__)
 
 
 class FilmworkExtractor(BaseExtractor):
+    QUERY = """
+        SELECT DISTINCT
+            fw.id as fw_id,
+            fw.title,
+            fw.description,
+            fw.rating,
+            fw.type,
+            fw.created,
+            fw.modified,
+            pfw.role,
+            pfw.created as person_link_created,
+            p.id as person_id,
+            p.full_name,
+            p.modified as person_modified,
+            gfw.created as genre_link_created,
+            g.id as genre_id,
+            g.name as genre_name,
+            g.modified as genre_modified
+        FROM content.film_work fw
+        LEFT JOIN content.person_film_work pfw ON pfw.film_work_id = fw.id
+        LEFT JOIN content.person p ON p.id = pfw.person_id
+        LEFT JOIN content.genre_film_work gfw ON gfw.film_work_id = fw.id
+        LEFT JOIN content.genre g ON g.id = gfw.genre_id
+        WHERE fw.id IN %s
+        ORDER BY fw_id;
+    """
+
     def fetch_by_ids(self, film_ids: list[str]) -> list[dict[str, Any]]:
         """Fetches film_works by their ids.
 
@@ -17,27 +44,22 @@ class FilmworkExtractor(BaseExtractor):
             List of the dicts where keys are requested fields,
                 and values are values of record.
         """
-        query = """
-            SELECT DISTINCT
-                fw.id as fw_id,
-                fw.title,
-                fw.description,
-                fw.rating,
-                fw.type,
-                fw.created,
-                fw.modified,
-                pfw.role,
-                p.id as person_id,
-                p.full_name,
-                g.id as genre_id,
-                g.name as genre_name
-            FROM content.film_work fw
-            LEFT JOIN content.person_film_work pfw ON pfw.film_work_id = fw.id
-            LEFT JOIN content.person p ON p.id = pfw.person_id
-            LEFT JOIN content.genre_film_work gfw ON gfw.film_work_id = fw.id
-            LEFT JOIN content.genre g ON g.id = gfw.genre_id
-            WHERE fw.id IN %s;
-        """
-        result = self.execute_query(query, params=(tuple(film_ids),))
+        result = self.execute_query(self.QUERY, params=(tuple(film_ids),), replica=True)
         logger.info("По ID film_works получены необходимые поля: %s->%s", len(film_ids), len(result))
         return result
+
+    def stream_by_ids(self, film_ids: list[str]) -> Iterable[dict[str, Any]]:
+        """Streams film_works rows by their ids.
+
+        Rows are ordered by 'fw_id', so all rows of one film_work go one after another.
+        It allows FilmworkTransformer.consolidate_stream to yield a film as soon as its id changes.
+
+        Args:
+            film_ids: A list of the ids from 'film_work' table.
+
+        Returns:
+            Iterable of the dicts where keys are requested fields,
+                and values are values of record.
+        """
+        logger.info("По ID film_works запрошена потоковая выборка: %s", len(film_ids))
+        return self.stream_query(self.QUERY, params=(tuple(film_ids),))
@@ -7,6 +7,16 @@ logger = logging.getLogger(__name__)
 
 
 class GenreExtractor(BaseExtractor):
+    QUERY = """
+        SELECT DISTINCT
+            g.id as id,
+            g.name,
+            g.description,
+            g.modified
+        FROM content.genre g
+        WHERE g.id in %s;
+    """
+
     def fetch_by_ids(self, genre_ids: list[str]) -> list[dict[str, Any]]:
         """Fetches genres by their ids.
 
@@ -17,14 +27,6 @@ class GenreExtractor(BaseExtractor):
             List of the dicts where keys are requested fields,
                 and values are values of record.
         """
-        query = """
-            SELECT DISTINCT
-                g.id as id,
-                g.name,
-                g.description
-            FROM content.genre g
-            WHERE g.id in %s;
-        """
-        result = self.execute_query(query, params=(tuple(genre_ids),))
+        result = self.execute_query(self.QUERY, params=(tuple(genre_ids),), replica=True)
         logger.info("По ID genres получены необходимые поля: %s->%s", len(genre_ids), len(result))
         return result
@@ -0,0 +1,165 @@
+import json
+import logging
+from typing import Any, Callable, Iterable, Optional
+
+from redis import Redis, RedisError
+
+logger = logging.getLogger(__name__)
+
+# Счётчик поколения индекса. Входит в ключи кэша списков API (src.utils.query_key)
+GENERATION_KEY_PREFIX = "generation:"
+
+
+def _person_for_film(person: dict[str, Any]) -> dict[str, Any]:
+    return {"uuid": person["id"], "full_name": person["name"]}
+
+
+def film_entry(source: dict[str, Any]) -> dict[str, Any]:
+    """Shape of the film in the API cache: src.models.Film dumped by .json()."""
+    return {
+        "uuid": source["id"],
+        "title": source["title"],
+        "description": source["description"],
+        "genre": [{"uuid": genre["id"], "name": genre["name"]} for genre in source["genre"]],
+        "imdb_rating": source["imdb_rating"],
+        "actors": [_person_for_film(person) for person in source["actors"]],
+        "writers": [_person_for_film(person) for person in source["writers"]],
+        "directors": [_person_for_film(person) for person in source["directors"]],
+    }
+
+
+def person_entry(source: dict[str, Any]) -> dict[str, Any]:
+    """Shape of the person in the API cache: src.models.Person dumped by .json()."""
+    return {"uuid": source["id"], "full_name": source["full_name"], "films": source["films"]}
+
+
+def genre_entry(source: dict[str, Any]) -> dict[str, Any]:
+    """Shape of the genre in the API cache: src.models.Genre dumped by .json()."""
+    return {"uuid": source["id"], "name": source["name"]}
+
+
+class DocumentCache:
+    """Keeps the Redis cache of the API fresh after the documents are indexed.
+
+    The API caches a document by its uuid (RedisService.put), so after reindexing it serves
+    the stale document until the TTL expires. Right after a successful bulk the loader:
+    - if write_through: puts fresh documents in the same JSON shape;
+    - if generations: increments the generation counter of the index. Cached lists of the API
+        are keyed by it, so the lists of the previous generation are not read anymore;
+    - if channel is set: publishes the changed ids to the channel. The API evicts them
+        (unless they are written through) from all its caches and rereads the generation.
+    All of them are sent by one pipeline.
+    Cache is best-effort: Redis errors are logged and don't stop the ETL.
+
+    The generation must be incremented only after the batch is visible for search, otherwise the API
+    caches the old lists under the new generation. So the loader refreshes the index before (see needs_refresh).
+    While the refresh of the index is suspended (BaseETLProcess.suspend_refresh), increments of its generation
+    are deferred (see defer): the process calls bump_generation once, after the refresh is restored.
+    The cache is shared by all the processes, so increments are deferred per index.
+
+    Message format: {"index": str, "ids": list[str], "cached": bool}.
+    "cached" is true, if the entries are already written through and must not be deleted from Redis.
+    """
+
+    ENTRIES: dict[str, Callable[[dict[str, Any]], dict[str, Any]]] = {
+        "movies": film_entry,
+        "persons": person_entry,
+        "genres": genre_entry,
+    }
+
+    def __init__(self, host: str, port: int, expire: int, write_through: bool = True, channel: Optional[str] = None,
+                 generations: bool = False):
+        """
+        Args:
+            host: A host of Redis.
+            port: A port of Redis.
+            expire: TTL of the written entries in seconds. Same as the TTL of the detail entries of the API.
+            write_through: If True, indexed documents are written to the cache.
+            channel: An optional pub/sub channel to publish the changed ids.
+            generations: If True, the generation of the index is incremented after every batch.
+        """
+        self.redis = Redis(host=host, port=port)
+        self.expire = expire
+        self.write_through = write_through
+        self.channel = channel
+        self.generations = generations
+        # Индексы, увеличение поколения которых отложено до bump_generation
+        self.deferred: set[str] = set()
+
+    def defer(self, index: str) -> None:
+        """Stops incrementing the generation of the index after batches until bump_generation."""
+        self.deferred.add(index)
+
+    def needs_refresh(self, index: str) -> bool:
+        """True, if the index must be refreshed before publish: the generation is incremented by it."""
+        return self.generations and index not in self.deferred
+
+    def publish(self, pipeline: Any, index: str, ids: list[str], cached: bool) -> None:
+        """Adds the generation increment and the message of the changed ids to the pipeline."""
+        if not ids:
+            return
+        if self.needs_refresh(index):
+            pipeline.incr(GENERATION_KEY_PREFIX + index)
+        if self.channel:
+            pipeline.publish(self.channel, json.dumps({"index": index, "ids": ids, "cached": cached}))
+
+    def put_many(self, index: str, sources: Iterable[dict[str, Any]]) -> int:
+        """Writes through and publishes the indexed documents by one pipelined request.
+
+        Args:
+            index: A name of the index of the documents.
+            sources: The _source dicts of the indexed documents.
+
+        Returns:
+            A count of the written entries.
+        """
+        entry = self.ENTRIES.get(index)
+        if entry is None:
+            return 0
+        write_through = self.write_through
+        pipeline = self.redis.pipeline(transaction=False)
+        ids = []
+        for source in sources:
+            ids.append(source["id"])
+            if write_through:
+                pipeline.set(source["id"], json.dumps(entry(source), ensure_ascii=False), ex=self.expire)
+        self.publish(pipeline, index, ids, cached=write_through)
+        try:
+            pipeline.execute()
+        except RedisError as e:
+            logger.error("Cache. Не удалось обновить кэш документов индекса %s: %s", index, e)
+            return 0
+        written = len(ids) if write_through else 0
+        logger.info("Cache. Документов индекса %s: записано в кэш %s, опубликовано %s",
+                    index, written, len(ids) if self.channel else 0)
+        return written
+
+    def delete_many(self, index: str, ids: list[str]) -> None:
+        """Deletes the entries of the documents, which are deleted from the index, and publishes them."""
+        pipeline = self.redis.pipeline(transaction=False)
+        pipeline.delete(*ids)
+        self.publish(pipeline, index, ids, cached=False)
+        try:
+            pipeline.execute()
+        except RedisError as e:
+            logger.error("Cache. Не удалось удалить документы из кэша: %s", e)
+
+    def bump_generation(self, index: str) -> None:
+        """Increments the generation of the index, which is already refreshed, and stops deferring its increments.
+
+        The empty message makes the API reread the generation.
+        """
+        self.deferred.discard(index)
+        if not self.generations:
+            return
+        pipeline = self.redis.pipeline(transaction=False)
+        pipeline.incr(GENERATION_KEY_PREFIX + index)
+        if self.channel:
+            pipeline.publish(self.channel, json.dumps({"index": index, "ids": [], "cached": True}))
+        try:
+            pipeline.execute()
+        except RedisError as e:
+            logger.error("Cache. Не удалось увеличить поколение индекса %s: %s", index, e)
+
+    def close(self) -> None:
+        self.redis.close()
@@ -1,19 +1,40 @@
+import hashlib
+import json
 import logging
-from typing import Any, Generator, Iterable
+from http import HTTPStatus
+from typing import Any, Generator, Iterable, Optional
 
-import backoff
 from elastic_transport import TransportError
-from elasticsearch import Elasticsearch
-from elasticsearch.helpers import BulkIndexError, bulk
+from elasticsearch import ApiError, Elasticsearch
+from elasticsearch.helpers import bulk
+from etl_libs.loaders.cache import DocumentCache
 from pydantic import BaseModel
 
 logger = logging.getLogger(__name__)
 
 
 class ElasticsearchLoader:
-    def __init__(self, dsn: dict[str, str]):
-        """Opens connection with Elasticsearch after initializing."""
+    # 'external_gte' accepts the same version again: retried batches and reprocessing
+    # after m2m changes (which don't touch 'modified') rewrite the document, older snapshots are rejected.
+    VERSION_TYPE = "external_gte"
+    # Hash of the rest of the _source. Compared by the Verifier without fetching the documents.
+    CONTENT_HASH_FIELD = "content_hash"
+    # Same output as json.dumps with these arguments, without building the encoder on every call
+    SORT_KEY_ENCODER = json.JSONEncoder(sort_keys=True)
+    CANONICAL_ENCODER = json.JSONEncoder(sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+    def __init__(self, dsn: dict[str, str], cache: Optional[DocumentCache] = None):
+        """Opens connection with Elasticsearch after initializing.
+
+        Args:
+            dsn: A DSN of the Elasticsearch.
+            cache: An optional DocumentCache. If set, successfully indexed documents are written through to it.
+        """
         self.client = Elasticsearch(dsn)
+        self.cache = cache
+        # Set by the Verifier while repairing: the content of Postgres is authoritative then,
+        # so documents rejected by the version are overwritten (see overwrite_conflicts).
+        self.overwrite_stale = False
 
     def close(self) -> None:
         """Closes connection with Elasticsearch if it is opened."""
@@ -25,44 +46,324 @@ class ElasticsearchLoader:
         """Checks if index exists in Elasticsearch."""
         return self.client.indices.exists(index=index_name)
 
-    @staticmethod
-    def prepare_data(index: str, data: Iterable[BaseModel]) -> Generator[dict[str, Any], None, None]:
+    def recreate_index(self, index_name: str, body: dict[str, Any]) -> None:
+        """Deletes the index if it exists and creates it with the settings and mappings of the body.
+
+        Args:
+            index_name: A name of the index.
+            body: A dict with 'settings' and 'mappings', as in the index_jsons_dir.
+        """
+        if self.index_exists(index_name):
+            self.client.indices.delete(index=index_name)
+        self.client.indices.create(index=index_name, **body)
+        logger.info("Loader. Индекс %s создан заново", index_name)
+
+    def get_refresh_interval(self, index_name: str) -> Optional[str]:
+        """Returns the refresh interval of the index, or None if it is not set (the default of Elasticsearch)."""
+        response = self.client.indices.get_settings(index=index_name, name="index.refresh_interval")
+        return response[index_name]["settings"].get("index", {}).get("refresh_interval")
+
+    def set_refresh_interval(self, index_name: str, interval: Optional[str]) -> None:
+        """Sets the refresh interval of the index. '-1' disables refresh, None resets it to the default."""
+        self.client.indices.put_settings(index=index_name, settings={"index": {"refresh_interval": interval}})
+        logger.info("Loader. Интервал refresh индекса %s: %s", index_name, interval)
+
+    def refresh(self, index_name: str) -> None:
+        """Makes all the loaded documents of the index visible for search."""
+        self.client.indices.refresh(index=index_name)
+
+    def ensure_content_hash_mapping(self, index_name: str) -> None:
+        """Adds the CONTENT_HASH_FIELD to the mapping of the index, created before it appeared.
+
+        Mappings are strict, so documents with the field are rejected by such index.
+        Adding a field is idempotent.
+        """
+        self.client.indices.put_mapping(
+            index=index_name, properties={self.CONTENT_HASH_FIELD: {"type": "long", "index": False}},
+        )
+
+    @classmethod
+    def normalize(cls, value: Any) -> Any:
+        """Sorts lists of the document recursively.
+
+        Order of the lists inside the document is not significant for the index,
+        and row and columnar transformers build them in different orders.
+        """
+        if isinstance(value, dict):
+            return {key: cls.normalize(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return sorted((cls.normalize(item) for item in value), key=cls.SORT_KEY_ENCODER.encode)
+        return value
+
+    @classmethod
+    def content_hash(cls, source: dict[str, Any]) -> int:
+        """Returns a signed 64-bit hash of the normalized source (without CONTENT_HASH_FIELD)."""
+        source = {key: value for key, value in source.items() if key != cls.CONTENT_HASH_FIELD}
+        canonical = cls.CANONICAL_ENCODER.encode(cls.normalize(source))
+        return int.from_bytes(hashlib.blake2b(canonical.encode(), digest_size=8).digest(), "big", signed=True)
+
+    @classmethod
+    def with_content_hash(cls, source: dict[str, Any]) -> dict[str, Any]:
+        """Returns the source with CONTENT_HASH_FIELD."""
+        return {**source, cls.CONTENT_HASH_FIELD: cls.content_hash(source)}
+
+    @classmethod
+    def bulk_action(cls, index: Optional[str], doc_id: str, version: Optional[int]) -> dict[str, Any]:
+        """Returns an action line of the bulk body for a document.
+
+        If index is None, the action has no '_index': the index is set by the bulk request (see load_bulk_body).
+
+        If version is set, the action carries external version,
+        so Elasticsearch rejects snapshots older than the indexed one.
+        """
+        action = {"_id": doc_id} if index is None else {"_index": index, "_id": doc_id}
+        if version is not None:
+            action.update(version=version, version_type=cls.VERSION_TYPE)
+        return {"index": action}
+
+    @classmethod
+    def prepare_data(cls, index: str, data: Iterable[BaseModel], min_version: Optional[int] = None) \
+            -> Generator[dict[str, Any], None, None]:
         """Decorates every model from data.
 
         Dumps model in predefined structure. Format:
-        {'_index': name of index, '_id': id of document, '_source': dump of model
+        {'_index': name of index, '_id': id of document, '_source': dump of model with content hash,
+         '_version': version of document, '_version_type': cls.VERSION_TYPE}
+        Version keys are present only if model has a version.
 
         Args:
             index: A name of the index in Elasticsearch.
             data: A list of the Models.
+            min_version: An optional lower bound of the versions (see raise_versions).
 
         Returns:
             A Generator of the dicts.
         """
         for doc in data:
-            yield {"_index": index, "_id": doc.id, "_source": doc.model_dump()}
+            action = {"_index": index, "_id": doc.id, "_source": cls.with_content_hash(doc.model_dump())}
+            version = getattr(doc, "version", None)
+            if version is not None:
+                version = version if min_version is None else max(version, min_version)
+                action.update(_version=version, _version_type=cls.VERSION_TYPE)
+            yield action
+
+    @classmethod
+    def raise_versions(cls, body: bytes, min_version: int) -> bytes:
+        """Raises the external versions of the actions of NDJSON bulk body up to min_version.
+
+        Versions are the newest 'modified' of the source rows, so they go down, when the newest linked row is deleted,
+        and the documents would be rejected. The ETL passes the watermark of the batch, which triggered the reload,
+        as min_version: the documents are extracted after it, so they are not older than any snapshot
+        with a lower version. Actions without a version are not changed.
+
+        Args:
+            body: A bytes NDJSON body of the bulk request.
+            min_version: A lower bound of the versions.
+
+        Returns:
+            A bytes NDJSON body.
+        """
+        lines = body.splitlines()
+        for position in range(0, len(lines), 2):
+            action = json.loads(lines[position])
+            params = next(iter(action.values()))
+            if params.get("version") is not None and params["version"] < min_version:
+                params["version"] = min_version
+                lines[position] = json.dumps(action, separators=(",", ":")).encode()
+        return b"".join(line + b"\n" for line in lines)
+
+    @staticmethod
+    def is_conflict(item: dict[str, Any]) -> bool:
+        """Checks if the failed item of the bulk is a version conflict."""
+        return next(iter(item.values())).get("status") == HTTPStatus.CONFLICT
+
+    @staticmethod
+    def log_errors(index: str, items: list[dict[str, Any]], conflicts_are_errors: bool = False) -> int:
+        """Logs failed items of the bulk.
+
+        Version conflicts are usually benign: the index already has the same or newer snapshot of the document.
+        They are logged as info (the ones with another content are reported by warn_stale_conflicts).
+        Other errors are logged as error.
+
+        Args:
+            index: A string name of the index in ElasticSearch.
+            items: A list of the failed items like {'index': {'_id': ..., 'status': ..., 'error': ...}}.
+            conflicts_are_errors: If True, version conflicts are logged and counted as the other errors.
+
+        Returns:
+            A count of the failed items, except version conflicts (unless conflicts_are_errors).
+        """
+        results = [next(iter(item.values())) for item in items]
+        conflicts = [result for result in results if result.get("status") == HTTPStatus.CONFLICT]
+        failed = [result for result in results if result.get("status") != HTTPStatus.CONFLICT]
+        if conflicts_are_errors:
+            failed, conflicts = results, []
+        if conflicts:
+            logger.info("Loader. Пропущено устаревших версий в индексе %s: %s", index, len(conflicts))
+        if failed:
+            logger.error("Loader. При записи в индекс возникла ошибка. Ошибок: %s. Первая: %s", len(failed), failed[0])
+        return len(failed)
 
-    @backoff.on_exception(backoff.expo, TransportError, max_time=300, jitter=backoff.random_jitter)
-    def load_to_elasticsearch(self, index: str, data: Iterable[BaseModel]) -> None:
+    @staticmethod
+    def collect_sources(actions: Iterable[dict[str, Any]], sources: list[dict[str, Any]]) \
+            -> Generator[dict[str, Any], None, None]:
+        """Yields the actions and appends their sources to the list. Sources of the lazy data are kept for the cache."""
+        for action in actions:
+            sources.append(action["_source"])
+            yield action
+
+    def overwrite_conflicts(self, index: str, sources: Iterable[dict[str, Any]], errors: list[dict[str, Any]]) \
+            -> list[dict[str, Any]]:
+        """Overwrites the documents, rejected by the version, without the external version.
+
+        Versions are derived from the 'modified' columns, so they go down, when the newest linked row is deleted.
+        Such documents are never updated by the regular loading, and the Verifier finds them again and again.
+        Indexing without a version bumps the stored one, so the following snapshots are still compared to it.
+
+        Args:
+            index: A string name of the index in ElasticSearch.
+            sources: Sources of the loaded documents.
+            errors: Failed items of the bulk.
+
+        Returns:
+            Failed items after the overwrite: the errors except the conflicts and the errors of the overwrite.
+        """
+        conflicts = {next(iter(item.values())).get("_id") for item in errors if self.is_conflict(item)}
+        if not conflicts:
+            return errors
+        logger.error("Loader. Версии документов в индексе %s ниже записанных, документы перезаписаны: %s",
+                     index, sorted(conflicts))
+        actions = (
+            {"_index": index, "_id": source["id"], "_source": source} for source in sources if source["id"] in conflicts
+        )
+        _, overwrite_errors = bulk(self.client, actions, raise_on_error=False)
+        return [item for item in errors if not self.is_conflict(item)] + overwrite_errors
+
+    def warn_stale_conflicts(self, index: str, sources: Iterable[dict[str, Any]], errors: list[dict[str, Any]]) -> None:
+        """Warns about the version conflicts, where the index has another content under a newer version.
+
+        Such documents are not updated until their next change or `python main.py verify`.
+        Conflicts with the same content are benign (e.g. retried batches) and are not reported.
+
+        Args:
+            index: A string name of the index in ElasticSearch.
+            sources: Sources of the loaded documents with the content hash.
+            errors: Failed items of the bulk.
+        """
+        conflicts = {next(iter(item.values())).get("_id") for item in errors if self.is_conflict(item)}
+        if not conflicts:
+            return
+        hashes = {source["id"]: source.get(self.CONTENT_HASH_FIELD) for source in sources if source["id"] in conflicts}
+        try:
+            response = self.client.mget(index=index, ids=sorted(hashes), source_includes=[self.CONTENT_HASH_FIELD])
+        except (ApiError, TransportError) as e:
+            logger.error("Loader. Не удалось проверить конфликты версий в индексе %s: %s", index, e)
+            return
+        stale = [
+            doc["_id"] for doc in response["docs"]
+            if doc.get("found") and doc["_source"].get(self.CONTENT_HASH_FIELD) != hashes[doc["_id"]]
+        ]
+        if stale:
+            logger.warning("Loader. Индекс %s содержит более новые версии с другим содержимым, документы не обновлены: %s",
+                           index, stale)
+
+    def cache_documents(self, index: str, sources: Iterable[dict[str, Any]], errors: list[dict[str, Any]]) -> None:
+        """Writes the documents through to the cache, except the failed ones.
+
+        Version conflicts are skipped too: the index has a newer snapshot, than the one in the sources.
+        If the cache increments the generation, the index is refreshed first (see DocumentCache.needs_refresh).
+        """
+        if self.cache.needs_refresh(index):
+            self.refresh(index)
+        failed_ids = {next(iter(item.values())).get("_id") for item in errors}
+        self.cache.put_many(index, (source for source in sources if source["id"] not in failed_ids))
+
+    def load_to_elasticsearch(self, index: str, data: Iterable[BaseModel], min_version: Optional[int] = None) \
+            -> tuple[int, int]:
         """Main loading function.
 
         Make requests to ElasticSearch and loads data in index.
         Uses bulk to optimize loading multiple records.
 
-        If bulk raises BulkIndexError, just silently logs.
+        Failed items are just logged by log_errors, conflicts with another content - by warn_stale_conflicts.
+        TransportError is propagated: data may be a one-shot generator,
+        so the retry must be done by the caller, which is able to rebuild it.
 
         Args:
             index: A string name of the index in ElasticSearch.
             data: An Iterable of the Models to load.
+            min_version: An optional lower bound of the versions (see raise_versions).
 
         Returns:
-            None.
+            A tuple of the counts of indexed and failed documents.
         """
         if not self.index_exists(index):
             logger.error("Loader. Ошибка при записи в индекс. Индекс %s не найден.", index)
-            return
-        try:
-            bulk(self.client, self.prepare_data(index, data))
-            logger.info("Loader. Записи успешно загружены в индекс %s", index)
-        except BulkIndexError:
-            logger.error("Loader. При записи в индекс возникла ошибка.", exc_info=True)
+            return 0, 0
+        sources = []
+        actions = self.collect_sources(self.prepare_data(index, data, min_version), sources)
+        indexed, errors = bulk(self.client, actions, raise_on_error=False)
+        if self.overwrite_stale:
+            rejected = len(errors)
+            errors = self.overwrite_conflicts(index, sources, errors)
+            indexed += rejected - len(errors)
+        elif errors:
+            self.warn_stale_conflicts(index, sources, errors)
+        failed = self.log_errors(index, errors, conflicts_are_errors=self.overwrite_stale)
+        if self.cache is not None:
+            self.cache_documents(index, sources, errors)
+        logger.info("Loader. Записи успешно загружены в индекс %s", index)
+        return indexed, failed
+
+    def load_bulk_body(self, index: str, body: bytes, min_version: Optional[int] = None) -> tuple[int, int]:
+        """Loads already serialized NDJSON bulk body.
+
+        Used with TransformPool, columnar transformers and snapshots, which serialize documents themselves.
+        Actions without '_index' are written to the index.
+        Failed items are logged like in the load_to_elasticsearch.
+
+        Args:
+            index: A string name of the index in ElasticSearch.
+            body: A bytes NDJSON body of the bulk request.
+            min_version: An optional lower bound of the versions (see raise_versions).
+
+        Returns:
+            A tuple of the counts of indexed and failed documents.
+        """
+        if not self.index_exists(index):
+            logger.error("Loader. Ошибка при записи в индекс. Индекс %s не найден.", index)
+            return 0, 0
+        if min_version is not None:
+            body = self.raise_versions(body, min_version)
+        response = self.client.bulk(index=index, operations=body)
+        errors = [item for item in response["items"] if "error" in next(iter(item.values()))]
+        if self.overwrite_stale and errors:
+            errors = self.overwrite_conflicts(index, (json.loads(line) for line in body.splitlines()[1::2]), errors)
+        elif errors:
+            self.warn_stale_conflicts(index, (json.loads(line) for line in body.splitlines()[1::2]), errors)
+        failed = self.log_errors(index, errors, conflicts_are_errors=self.overwrite_stale) if errors else 0
+        if self.cache is not None:
+            sources = (json.loads(line) for line in body.splitlines()[1::2])
+            self.cache_documents(index, sources, errors)
+        logger.info("Loader. Записи успешно загружены в индекс %s", index)
+        return len(response["items"]) - len(errors), failed
+
+    def delete_documents(self, index: str, ids: list[str]) -> int:
+        """Deletes documents by their ids. Used to repair documents, which were deleted in Postgres.
+
+        Args:
+            index: A string name of the index in ElasticSearch.
+            ids: A list of the ids of documents.
+
+        Returns:
+            A count of the deleted documents.
+        """
+        actions = ({"_op_type": "delete", "_index": index, "_id": doc_id} for doc_id in ids)
+        deleted, errors = bulk(self.client, actions, raise_on_error=False)
+        self.log_errors(index, errors)
+        if self.cache is not None and ids:
+            if self.cache.needs_refresh(index):
+                self.refresh(index)
+            self.cache.delete_many(index, ids)
+        logger.info("Loader. Удалено документов из индекса %s: %s", index, deleted)
+        return deleted
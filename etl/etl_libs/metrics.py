@@ -0,0 +1,95 @@
+import logging
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Generator, Iterable, TypeVar
+
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Labels: process - the main table of the ETL process, table - the extracted table.
+ROWS_EXTRACTED = Counter(
+    "etl_rows_extracted_total", "Updated records, fetched from the extracted table", ["process", "table"]
+)
+DOCS_INDEXED = Counter(
+    "etl_docs_indexed_total", "Documents, successfully written to Elasticsearch", ["process", "table"]
+)
+BULK_FAILURES = Counter(
+    "etl_bulk_failures_total", "Failed items of the bulk requests (version conflicts excluded)", ["process", "table"]
+)
+STAGE_SECONDS = Histogram(
+    "etl_stage_seconds", "Time of the stage per batch of the updated records", ["process", "table", "stage"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+WATERMARK_AGE = Gauge(
+    "etl_watermark_age_seconds", "Now minus the last checkpointed 'modified' of the extracted table",
+    ["process", "table"],
+)
+
+
+def start_metrics_server(port: int) -> None:
+    """Starts HTTP listener of the metrics in Prometheus text format in the daemon thread."""
+    start_http_server(port)
+    logger.info("Метрики доступны на порту %s", port)
+
+
+def set_watermark(process: str, table: str, modified: datetime) -> None:
+    """Sets the checkpointed watermark. Its age is calculated on every scrape."""
+    timestamp = modified.timestamp()
+    WATERMARK_AGE.labels(process, table).set_function(lambda: time.time() - timestamp)
+
+
+class BatchTimer:
+    """Measures the time of the stages of one batch.
+
+    Stages may be nested (e.g. the loader consumes a lazy transformer, which consumes a lazy extractor):
+    the time of the inner stage is not counted in the outer one, so the stages sum up to the batch time.
+    """
+
+    def __init__(self):
+        self.durations: dict[str, float] = defaultdict(float)
+        self._stack: list[str] = []
+        self._started = 0.0
+
+    @contextmanager
+    def stage(self, name: str) -> Generator[None, None, None]:
+        self.account()
+        self._stack.append(name)
+        try:
+            yield
+        finally:
+            self.account()
+            self._stack.pop()
+
+    def account(self) -> None:
+        """Counts the time since the last switch of the stages in the current (innermost) stage."""
+        now = time.perf_counter()
+        if self._stack:
+            self.durations[self._stack[-1]] += now - self._started
+        self._started = now
+
+    def suspend(self) -> None:
+        """Called before the batch yields control to another table in the middle of the batch."""
+
+    def resume(self) -> None:
+        """Called when the batch gets control back."""
+
+    def iterate(self, name: str, iterable: Iterable[T]) -> Generator[T, None, None]:
+        """Yields items of the iterable, counting the time of producing them in the stage."""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def observe(self, process: str, table: str) -> None:
+        """Records the durations to the STAGE_SECONDS histogram."""
+        for name, duration in self.durations.items():
+            STAGE_SECONDS.labels(process, table, name).observe(duration)
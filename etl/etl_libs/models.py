@@ -1,12 +1,17 @@
 from typing import Optional
 
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, Field, field_validator
 
 
 class BaseID(BaseModel):
     id: str
 
 
+class BaseDocument(BaseID):
+    # External version of the document in Elasticsearch. Not a part of the _source.
+    version: Optional[int] = Field(default=None, exclude=True)
+
+
 class ActorInline(BaseID):
     name: str
 
@@ -27,7 +32,7 @@ class GenreInline(BaseID):
     name: str
 
 
-class FilmworkModel(BaseID):
+class FilmworkModel(BaseDocument):
     title: str
     description: Optional[str]
     imdb_rating: float
@@ -44,11 +49,11 @@ class FilmworkModel(BaseID):
         return value or 0.0
 
 
-class PersonModel(BaseID):
+class PersonModel(BaseDocument):
     full_name: str
     films: Optional[list[FilmworkInline]]
 
 
-class GenreModel(BaseID):
+class GenreModel(BaseDocument):
     name: str
     description: Optional[str]
@@ -1,11 +1,21 @@
 import logging
 from abc import ABC
 from datetime import datetime
+from typing import Any, Generator, Iterable, Iterator, Optional, Sequence
 
+import backoff
+from elastic_transport import TransportError
 from etl_libs.extractors.base import BaseExtractor
+from etl_libs import metrics
+from etl_libs.loaders.cache import DocumentCache
 from etl_libs.loaders.loader import ElasticsearchLoader
+from etl_libs.metrics import BatchTimer
+from etl_libs.profiling import BatchProfiler
+from etl_libs.scheduler import PriorityLanes
 from etl_libs.storage import State, JsonFileStorage
 from etl_libs.transformers.base import BaseTransformer
+from etl_libs.transformers.columnar import ColumnarTransformer
+from etl_libs.transformers.pool import TransformPool
 from pydantic import BaseModel
 
 logger = logging.getLogger(__name__)
@@ -15,11 +25,46 @@ class BaseETLProcess(ABC):
     TABLES: tuple
     INDEXES_MAPPING: dict
     MAIN_TABLE: str
-    extractor: BaseExtractor
-    transformer: BaseTransformer
-    loader: ElasticsearchLoader
-
-    def __init__(self):
+    EXTRACTOR_CLASS: type[BaseExtractor]
+    TRANSFORMER_CLASS: type[BaseTransformer]
+    LOADER_CLASS: type[ElasticsearchLoader]
+    COLUMNAR_TRANSFORMER_CLASS: Optional[type[ColumnarTransformer]] = None
+    # Ключ состояния с интервалом refresh, который нужно вернуть индексу (см. suspend_refresh)
+    SUSPENDED_REFRESH_KEY = "suspended_refresh_interval"
+
+    def __init__(self, pg_dsn: dict, es_dsn: str, transform_pool: Optional[TransformPool] = None,
+                 columnar: bool = False, columnar_validate: bool = False, bulk_share: float = 0.2,
+                 pg_replica_dsns: Sequence[dict] = (), profiler: Optional[BatchProfiler] = None,
+                 refresh_threshold: int = 0, suspended_refresh_interval: str = "-1",
+                 cache: Optional[DocumentCache] = None):
+        """
+        Args:
+            pg_dsn: A dict of the Postgres connection params.
+            es_dsn: A string DSN of the Elasticsearch.
+            transform_pool: An optional TransformPool. If set, transform stage runs in its processes.
+            columnar: If True and the process has COLUMNAR_TRANSFORMER_CLASS, batches are transformed in Arrow.
+            columnar_validate: If True, every columnar batch is compared with the output of the row Transformer.
+            bulk_share: A share of the steps, given to the bulk lane (related tables) while the high lane has work.
+            pg_replica_dsns: Dicts of the Postgres read replicas connection params. See BaseExtractor.
+            profiler: An optional BatchProfiler. If set, every batch is profiled by it.
+            refresh_threshold: A count of documents of the cycle, after which the refresh of the index is suspended.
+                0 disables it. See suspend_refresh.
+            suspended_refresh_interval: A refresh interval of the index while it is suspended. '-1' disables refresh.
+            cache: An optional DocumentCache of the API. If set, the loader writes the indexed documents through to it.
+        """
+        self.extractor = self.EXTRACTOR_CLASS(pg_dsn, replica_dsns=pg_replica_dsns)
+        self.transformer = self.TRANSFORMER_CLASS()
+        self.loader = self.LOADER_CLASS(es_dsn, cache=cache)
+        self.transform_pool = transform_pool
+        self.columnar_transformer = \
+            self.COLUMNAR_TRANSFORMER_CLASS() if columnar and self.COLUMNAR_TRANSFORMER_CLASS else None
+        self.columnar_validate = columnar_validate
+        self.bulk_share = bulk_share
+        self.profiler = profiler
+        self.refresh_threshold = refresh_threshold
+        self.suspended_refresh_interval = suspended_refresh_interval
+        self.cycle_documents = 0
+        self.cycle_errors = 0
         self.state = State(storage=JsonFileStorage(self.MAIN_TABLE + ".json"))
 
     @staticmethod
@@ -60,25 +105,104 @@ class BaseETLProcess(ABC):
         """Returns a name of last_uuid key for state."""
         return table + '_last_uuid'
 
-    def run(self) -> None:
-        """Sequentially runs the ETL process for tables which requires to extract.
+    def run(self) -> int:
+        """Runs the ETL process for tables which requires to extract.
 
-        For each table, listed in the self.TABLES, runs a .process_table method.
+        Tables are split into two lanes of the PriorityLanes:
+        - high: the self.MAIN_TABLE. Its updates are small and map 1:1 to documents.
+        - bulk: related tables. Their updates fan out to many documents (e.g. a genre rename).
+        Lanes are interleaved step by step, the bulk lane gets self.bulk_share of the steps,
+        so fresh edits are not waiting behind a large reprocessing.
+        The high lane is polled again after every bulk step, when it has drained:
+        edits, made while the bulk lane works, are loaded in the same cycle.
         Logs when it starts and finishes.
-        If the error occurs - logs and skips.
+        If the error occurs - logs and skips the table.
+
+        If the cycle loads more than self.refresh_threshold documents, the refresh of the index
+        is suspended until the end of the cycle (see suspend_refresh).
+
+        Returns:
+            A count of the extracted records of all tables. Used by the scheduler to detect activity.
+            Tables, skipped because of errors, are counted in self.cycle_errors.
         """
         logger.info("=" * 80)
         logger.info("Запуск ETL")
+        # Интервал мог остаться изменённым после падения или ошибки в предыдущем цикле
+        self.restore_refresh()
+        self.cycle_documents = 0
+        self.cycle_errors = 0
+        lanes = PriorityLanes(bulk_share=self.bulk_share)
         for table in self.TABLES:
+            lanes.add(table, self.iter_table(table), bulk=table != self.MAIN_TABLE)
+
+        processed = 0
+        main_failed = False
+        while lanes:
+            table, step = lanes.next()
             try:
-                self.process_table(table)
+                processed += next(step)
+            except StopIteration:
+                lanes.remove(table)
             except Exception as e:
                 logger.error("Таблица %s: ошибка при обработке таблицы %s: %s", self.MAIN_TABLE, table, e)
-                continue
+                lanes.remove(table)
+                self.cycle_errors += 1
+                main_failed = main_failed or table == self.MAIN_TABLE
+            if table != self.MAIN_TABLE and not main_failed and self.MAIN_TABLE not in lanes and lanes.has_bulk():
+                lanes.add(self.MAIN_TABLE, self.iter_table(self.MAIN_TABLE), bulk=False)
+            if self.refresh_threshold and self.cycle_documents >= self.refresh_threshold:
+                self.suspend_refresh()
+        self.restore_refresh()
         logger.info("ETL завершил работу")
         logger.info("=" * 80)
         self.extractor.disconnect()
         self.loader.close()
+        return processed
+
+    def suspend_refresh(self) -> None:
+        """Sets the refresh interval of the index to self.suspended_refresh_interval for the rest of the cycle.
+
+        While the large backlog is loaded, Elasticsearch doesn't create a segment every refresh interval.
+        The previous interval is saved to the state before the change, so it is restored
+        by the restore_refresh even if the process crashed in the middle of the cycle.
+        Does nothing if the refresh is already suspended.
+        Generation increments of the cache are deferred until the restore_refresh: the documents are not visible.
+        """
+        if self.state.get_state(self.SUSPENDED_REFRESH_KEY) is not None:
+            return
+        index = self.INDEXES_MAPPING[self.MAIN_TABLE]
+        try:
+            previous = self.loader.get_refresh_interval(index)
+            self.state.set_state(self.SUSPENDED_REFRESH_KEY, {"interval": previous})
+            self.loader.set_refresh_interval(index, self.suspended_refresh_interval)
+            if self.loader.cache is not None:
+                self.loader.cache.defer(index)
+        except TransportError as e:
+            logger.error("Таблица %s: не удалось изменить интервал refresh индекса %s: %s", self.MAIN_TABLE, index, e)
+            return
+        logger.info("Таблица %s: загружено документов %s, refresh индекса %s приостановлен до конца цикла",
+                    self.MAIN_TABLE, self.cycle_documents, index)
+
+    def restore_refresh(self) -> None:
+        """Restores the refresh interval, saved by the suspend_refresh, and refreshes the index once.
+        Then increments the generation of the cache once for all the batches, loaded while it was suspended.
+
+        The saved interval is removed from the state only after it is restored,
+        so on errors it is retried on the next cycle. Until then, only the increments of this index stay deferred.
+        """
+        suspended = self.state.get_state(self.SUSPENDED_REFRESH_KEY)
+        if suspended is None:
+            return
+        index = self.INDEXES_MAPPING[self.MAIN_TABLE]
+        try:
+            self.loader.set_refresh_interval(index, suspended["interval"])
+            self.loader.refresh(index)
+        except TransportError as e:
+            logger.error("Таблица %s: не удалось вернуть интервал refresh индекса %s: %s", self.MAIN_TABLE, index, e)
+            return
+        if self.loader.cache is not None:
+            self.loader.cache.bump_generation(index)
+        self.state.set_state(self.SUSPENDED_REFRESH_KEY, None)
 
     def get_last_modified(self, stated: str, table: str) -> datetime:
         """Returns the datetime to start extracting by 'modified'.
@@ -98,71 +222,201 @@ class BaseETLProcess(ABC):
             return datetime.fromisoformat(stated)
         return self.extractor.get_oldest_modified_date(table)
 
-    def transform_data(self, extracted_table: str, extracted_ids: list[str]) -> list[BaseModel]:
-        """Takes the name of the table and ids from it.
-            Finds in the self.MAIN_TABLE all ids, related to the extracted.
-            By ids from the self.MAIN_TABLE gets the full records.
-            Returns a parsed Models of the records.
+    def get_main_ids(self, extracted_table: str, extracted_ids: list[str]) -> list[str]:
+        """Returns ids from the self.MAIN_TABLE, related to the extracted ids.
 
         If name of the self.MAIN_TABLE is equal to name of the extracted table,
             then ids from the self.MAIN_TABLE is equal to the extracted ids.
+        """
+        if extracted_table == self.MAIN_TABLE:
+            return extracted_ids
+        return self.extractor.fetch_mains_by_related_table(self.MAIN_TABLE, extracted_table, extracted_ids)
+
+    def transform_data(self, objects_ids: list[str], timer: Optional[BatchTimer] = None) -> Iterable[BaseModel]:
+        """Takes ids from the self.MAIN_TABLE.
+            By them streams the full records.
+            Returns a lazy Iterable of parsed Models of the records.
 
         Args:
-            extracted_table: A string name of the table.
-            extracted_ids: A list of the strings ids.
+            objects_ids: A list of the strings ids from the self.MAIN_TABLE.
+            timer: An optional BatchTimer. If set, streaming of the rows and consolidation are timed by it.
 
         Returns:
-            A list of the Models.
+            An Iterable of the Models. It is consumed by the loader while bulk is serialized.
             Type is equal to type of the objects in the self.MAIN_TABLE.
         """
-        if extracted_table == self.MAIN_TABLE:
-            objects_ids = extracted_ids
-        else:
-            objects_ids = self.extractor.fetch_mains_by_related_table(self.MAIN_TABLE, extracted_table, extracted_ids)
+        details = self.extractor.stream_by_ids(objects_ids)
+        if timer is None:
+            return self.transformer.consolidate_stream(details)
+        return timer.iterate("transform", self.transformer.consolidate_stream(timer.iterate("extract", details)))
 
-        film_details = self.extractor.fetch_by_ids(objects_ids)
-        return self.transformer.consolidate(film_details)
+    @backoff.on_exception(backoff.expo, TransportError, max_time=300, jitter=backoff.random_jitter)
+    def transform_and_load(self, objects_ids: list[str], timer: BatchTimer, min_version: Optional[int] = None) \
+            -> tuple[int, int]:
+        """Transforms the objects from the self.MAIN_TABLE and loads them to its index.
 
-    def process_table(self, extracted_table: str) -> None:
-        """Method which starts ETL process, related to one pair of main and extracted table.
+        Transformed data is a lazy stream, so on Elasticsearch errors
+        the whole batch is rebuilt from the extraction step.
+
+        If self.columnar_transformer is set, rows are fetched into the Arrow batch
+        and transformed to the serialized bulk body by it.
+        Otherwise, if self.transform_pool is set, rows are fetched at once and transformed
+        in its processes to the serialized bulk bodies.
+
+        Args:
+            objects_ids: A list of the strings ids from the self.MAIN_TABLE.
+            timer: A BatchTimer of the current batch.
+            min_version: An optional lower bound of the external versions: the version of the watermark of the batch,
+                which triggered the reload (see ElasticsearchLoader.raise_versions).
+
+        Returns:
+            A tuple of the counts of indexed and failed documents.
+        """
+        index = self.INDEXES_MAPPING[self.MAIN_TABLE]
+        if self.columnar_transformer is not None:
+            with timer.stage("extract"):
+                batch = self.extractor.fetch_arrow_by_ids(objects_ids)
+            with timer.stage("transform"):
+                if self.columnar_validate:
+                    self.columnar_transformer.validate(batch)
+                body = self.columnar_transformer.to_ndjson(index, batch)
+            if not body:
+                return 0, 0
+            with timer.stage("load"):
+                return self.loader.load_bulk_body(index, body, min_version)
+
+        if self.transform_pool is None:
+            transformed_data = self.transform_data(objects_ids, timer)
+            with timer.stage("load"):
+                return self.loader.load_to_elasticsearch(index, transformed_data, min_version)
+
+        indexed = failed = 0
+        with timer.stage("extract"):
+            details = self.extractor.fetch_by_ids(objects_ids)
+        for body in timer.iterate("transform", self.transform_pool.transform(self.TRANSFORMER_CLASS, index, details)):
+            with timer.stage("load"):
+                body_indexed, body_failed = self.loader.load_bulk_body(index, body, min_version)
+            indexed += body_indexed
+            failed += body_failed
+        return indexed, failed
+
+    def iter_id_batches(self, batch_size: int) -> Generator[list[str], None, None]:
+        """Walks all the ids of the self.MAIN_TABLE in the order of the primary key.
+
+        Used by the full passes over the index (verification, snapshot export), which don't need the watermark.
+        """
+        last_id = "00000000-0000-0000-0000-000000000000"
+        while True:
+            ids = self.extractor.fetch_ids_after(self.MAIN_TABLE, last_id, batch_size)
+            if not ids:
+                return
+            yield ids
+            last_id = ids[-1]
+
+    def build_documents(self, objects_ids: list[str]) -> Iterator[tuple[dict[str, Any], Optional[int]]]:
+        """Builds the sources of the documents with their external versions, as the transform_and_load does.
+
+        Args:
+            objects_ids: A list of the strings ids from the self.MAIN_TABLE.
+
+        Returns:
+            An Iterator of the tuples (source without content hash, version).
+        """
+        if self.columnar_transformer is not None:
+            batch = self.extractor.fetch_arrow_by_ids(objects_ids)
+            for document in self.columnar_transformer.to_documents(batch) if batch.num_rows else []:
+                version = document.pop("version")
+                yield document, version
+            return
+        for model in self.transform_data(objects_ids):
+            yield model.model_dump(), model.version
+
+    def iter_table(self, extracted_table: str) -> Generator[int, None, None]:
+        """Runs ETL process, related to one pair of main and extracted table, step by step.
 
         How:
             1. Retrieve values `last_modified` and `last_uuid` from the state.
             2. Gets batch of the ids for updated records from the extracted_table (`fetch_updated_records`).
-            3. Calls the `transform_data`, which returns the List of Models of the same objects as the self.MAIN_TABLE.
-            4. Loads the data by `load_to_elasticsearch`.
-            5. Saves to the state new `last_modified` and `last_uuid`.
+            3. Finds related ids from the self.MAIN_TABLE (`get_main_ids`).
+                Fan-out may turn a batch into many objects, so they are split into chunks of the batch size.
+            4. Calls the `transform_and_load` for every chunk:
+                `transform_data` returns the Iterable of Models of the same objects as the self.MAIN_TABLE,
+                `load_to_elasticsearch` loads them.
+                Yields after every chunk, so the caller can switch to another table between chunks.
+            5. Saves to the state new `last_modified` and `last_uuid` after the last chunk of the batch.
             6. Repeats, while Extractor returns batches.
 
+        Every batch is reported to the metrics (see etl_libs.metrics):
+        counts of rows and documents, stage timings and the age of the saved watermark.
+        If self.profiler is set, it also reports CPU time, memory and cProfile of the batch.
 
         Args:
             extracted_table: A string name of the current extracted table.
 
         Returns:
-            None.
+            A Generator of the counts of extracted records, processed on every step.
         """
         last_stated_modified = self.state.get_state(self.get_state_last_modified_key(extracted_table))
         last_stated_uuid = self.state.get_state(self.get_state_last_uuid_key(extracted_table))
         last_modified = self.get_last_modified(last_stated_modified, extracted_table)
         last_uuid = last_stated_uuid or "00000000-0000-0000-0000-000000000000"
+        chunk_size = self.extractor.BATCH_SIZE
+        labels = (self.MAIN_TABLE, extracted_table)
+        if last_stated_modified:
+            metrics.set_watermark(*labels, last_modified)
 
         logger.info("=" * 80)
         logger.info("Таблица %s: начат процесс загрузки обновлений по %s", self.MAIN_TABLE, extracted_table)
         while True:
             logger.info("=" * 80)
 
-            updated_records, last_modified_of_batch, last_uuid_of_batch = \
-                self.extractor.fetch_updated_records(extracted_table, last_modified, last_uuid)
-            if not updated_records:
-                logger.info("Таблица %s: все обновления по %s загружены", self.MAIN_TABLE, extracted_table)
-                break
-
-            transformed_data = self.transform_data(extracted_table, updated_records)
-            self.loader.load_to_elasticsearch(self.INDEXES_MAPPING[self.MAIN_TABLE], transformed_data)
-
-            self.state.set_state(key=self.get_state_last_modified_key(extracted_table),
-                                 value=str(last_modified_of_batch))
-            self.state.set_state(key=self.get_state_last_uuid_key(extracted_table), value=last_uuid_of_batch)
+            timer = self.profiler.start() if self.profiler is not None else BatchTimer()
+            try:
+                with timer.stage("extract"):
+                    updated_records, last_modified_of_batch, last_uuid_of_batch = \
+                        self.extractor.fetch_updated_records(extracted_table, last_modified, last_uuid)
+                if not updated_records:
+                    logger.info("Таблица %s: все обновления по %s загружены", self.MAIN_TABLE, extracted_table)
+                    return
+                metrics.ROWS_EXTRACTED.labels(*labels).inc(len(updated_records))
+
+                with timer.stage("extract"):
+                    objects_ids = self.get_main_ids(extracted_table, updated_records)
+                # Документы прочитаны после изменений батча, поэтому их версия не ниже его водяного знака
+                min_version = BaseTransformer.to_version(last_modified_of_batch)
+                for start in range(0, len(objects_ids), chunk_size):
+                    indexed, failed = self.transform_and_load(objects_ids[start:start + chunk_size], timer, min_version)
+                    metrics.DOCS_INDEXED.labels(*labels).inc(indexed)
+                    metrics.BULK_FAILURES.labels(*labels).inc(failed)
+                    self.cycle_documents += indexed + failed
+                    if start + chunk_size < len(objects_ids):
+                        timer.suspend()
+                        yield 0
+                        timer.resume()
+
+                with timer.stage("state"):
+                    self.state.set_state(key=self.get_state_last_modified_key(extracted_table),
+                                         value=str(last_modified_of_batch))
+                    self.state.set_state(key=self.get_state_last_uuid_key(extracted_table), value=last_uuid_of_batch)
+                metrics.set_watermark(*labels, last_modified_of_batch)
+                timer.observe(*labels)
+                if self.profiler is not None:
+                    self.profiler.finish(*labels, timer=timer, rows=len(updated_records))
+            finally:
+                # Профилировщик (если включён) не должен работать, пока выполняются другие таблицы
+                timer.suspend()
 
             last_modified = last_modified_of_batch
             last_uuid = last_uuid_of_batch
+            yield len(updated_records)
+
+    def process_table(self, extracted_table: str) -> int:
+        """Runs ETL process, related to one pair of main and extracted table, until all updates are loaded.
+
+        Args:
+            extracted_table: A string name of the current extracted table.
+
+        Returns:
+            A count of the extracted records.
+        """
+        return sum(self.iter_table(extracted_table))
@@ -15,9 +15,3 @@ class GenreETLProcess(BaseETLProcess):
     EXTRACTOR_CLASS = GenreExtractor
     TRANSFORMER_CLASS = GenreTransformer
     LOADER_CLASS = ElasticsearchLoader
-
-    def __init__(self, pg_dsn: dict, es_dsn: str):
-        self.extractor = self.EXTRACTOR_CLASS(pg_dsn)
-        self.transformer = self.TRANSFORMER_CLASS()
-        self.loader = self.LOADER_CLASS(es_dsn)
-        super().__init__()
@@ -0,0 +1,126 @@
+import cProfile
+import heapq
+import json
+import logging
+import os
+import random
+import time
+import tracemalloc
+from collections import defaultdict
+from typing import Any, Optional
+
+from etl_libs.metrics import BatchTimer
+
+logger = logging.getLogger(__name__)
+
+
+class ProfiledBatchTimer(BatchTimer):
+    """BatchTimer, which also counts CPU time and tracemalloc peak of every stage.
+
+    Peak is reset on every switch of the stages, so the peak of the stage is not hidden
+    by the nested stages (e.g. rows streaming inside the consolidation).
+    If `profile` is set, it is enabled only while the batch has control.
+    """
+
+    def __init__(self, profile: Optional[cProfile.Profile] = None):
+        super().__init__()
+        self.cpu: dict[str, float] = defaultdict(float)
+        self.peaks: dict[str, int] = defaultdict(int)
+        self.profile = profile
+        self._cpu_started = time.process_time()
+        self._snapshot = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        self.resume()
+
+    def account(self) -> None:
+        cpu = time.process_time()
+        if self._stack:
+            stage = self._stack[-1]
+            self.cpu[stage] += cpu - self._cpu_started
+            self.peaks[stage] = max(self.peaks[stage], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        self._cpu_started = cpu
+        super().account()
+
+    def suspend(self) -> None:
+        if self.profile is not None:
+            self.profile.disable()
+
+    def resume(self) -> None:
+        if self.profile is not None:
+            self.profile.enable()
+
+    def wall(self) -> float:
+        """Returns the time of the batch, without the time of other tables, which ran in the middle of it."""
+        return sum(self.durations.values())
+
+    def top_allocations(self, limit: int) -> list[dict[str, Any]]:
+        """Returns the allocation sites, which grew most since the start of the batch."""
+        stats = tracemalloc.take_snapshot().compare_to(self._snapshot, "lineno")
+        return [
+            {"site": str(stat.traceback), "size_diff": stat.size_diff, "count_diff": stat.count_diff}
+            for stat in stats[:limit]
+        ]
+
+
+class BatchProfiler:
+    """Opt-in profiling of the batches of BaseETLProcess.iter_table.
+
+    For every batch writes a JSON line to `<directory>/<process>.<table>.jsonl`:
+    wall and CPU time, tracemalloc peak of every stage and the top allocation sites.
+    A share (`sample_rate`) of the batches is also profiled by cProfile. Profiles of the `slowest`
+    of them are kept in `<directory>/profiles/*.prof` (pstats format: snakeviz, gprof2dot, flameprof).
+    """
+
+    def __init__(self, directory: str, slowest: int = 5, sample_rate: float = 1.0, top_allocations: int = 10):
+        self.directory = directory
+        self.slowest = slowest
+        self.sample_rate = sample_rate
+        self.top_allocations = top_allocations
+        self.batches: dict[tuple[str, str], int] = defaultdict(int)
+        # Куча (время, путь) сохранённых профилей: в вершине самый быстрый
+        self.profiles: list[tuple[float, str]] = []
+        os.makedirs(os.path.join(directory, "profiles"), exist_ok=True)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        logger.info("Profiler. Отчёты пишутся в %s", directory)
+
+    def start(self) -> ProfiledBatchTimer:
+        """Starts profiling of the batch. Returns a timer to pass through the stages."""
+        sampled = self.slowest and random.random() < self.sample_rate
+        return ProfiledBatchTimer(cProfile.Profile() if sampled else None)
+
+    def finish(self, process: str, table: str, timer: ProfiledBatchTimer, rows: int) -> None:
+        """Writes the report of the batch and keeps its cProfile if it is among the slowest."""
+        timer.suspend()
+        wall = timer.wall()
+        self.batches[process, table] += 1
+        batch = self.batches[process, table]
+        report = {
+            "process": process,
+            "table": table,
+            "batch": batch,
+            "rows": rows,
+            "wall": wall,
+            "stages": {
+                stage: {"wall": timer.durations[stage], "cpu": timer.cpu[stage], "peak_bytes": timer.peaks[stage]}
+                for stage in timer.durations
+            },
+            "top_allocations": timer.top_allocations(self.top_allocations),
+        }
+        with open(os.path.join(self.directory, f"{process}.{table}.jsonl"), "a") as file:
+            file.write(json.dumps(report) + "\n")
+
+        if timer.profile is not None:
+            self.keep_profile(timer.profile, os.path.join(self.directory, "profiles", f"{process}.{table}.{batch}.prof"),
+                              wall)
+
+    def keep_profile(self, profile: cProfile.Profile, path: str, wall: float) -> None:
+        """Dumps the profile, if it is among the `slowest`, and removes the fastest one, which is pushed out."""
+        if len(self.profiles) >= self.slowest:
+            if wall <= self.profiles[0][0]:
+                return
+            _, fastest_path = heapq.heappop(self.profiles)
+            os.remove(fastest_path)
+        profile.dump_stats(path)
+        heapq.heappush(self.profiles, (wall, path))
@@ -0,0 +1,99 @@
+import logging
+from typing import Iterator
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveScheduler:
+    """Calculates a pause between the ETL cycles.
+
+    - If the cycle extracted any records, the next cycle starts immediately:
+        new changes may arrive while the backlog is being drained.
+    - If the cycle found nothing, the pause is `interval`.
+    - After `idle_cycles_before_backoff` consecutive idle cycles the pause doubles
+        on every next idle cycle, but not more than `max_interval`.
+    - Any activity resets the pause.
+    - A cycle with errors and without activity is not idle: the changes may be there, but not extracted.
+        The pause is `interval`, and the count of idle cycles is kept as is.
+    """
+
+    def __init__(self, interval: float, max_interval: float, idle_cycles_before_backoff: int = 3):
+        self.interval = interval
+        self.max_interval = max(max_interval, interval)
+        self.idle_cycles_before_backoff = idle_cycles_before_backoff
+        self.idle_cycles = 0
+
+    def next_delay(self, processed: int, failed: bool = False) -> float:
+        """Returns a pause in seconds before the next cycle.
+
+        Args:
+            processed: A count of the records, extracted by the finished cycle.
+            failed: True if any table of the cycle was skipped because of an error.
+        """
+        if processed:
+            if self.idle_cycles:
+                logger.info("Scheduler. Обнаружены обновления, интервал сброшен")
+            self.idle_cycles = 0
+            return 0
+        if failed:
+            logger.info("Scheduler. Цикл завершился с ошибками, повтор через %s с", self.interval)
+            return self.interval
+
+        self.idle_cycles += 1
+        extra_cycles = self.idle_cycles - self.idle_cycles_before_backoff
+        if extra_cycles <= 0:
+            return self.interval
+        # Ограничиваем степень, чтобы не считать огромные числа при долгом простое
+        delay = min(self.interval * 2 ** min(extra_cycles, 32), self.max_interval)
+        logger.info("Scheduler. Циклов без обновлений: %s, пауза %s с", self.idle_cycles, delay)
+        return delay
+
+
+class PriorityLanes:
+    """Weighted interleaving of the high-priority and bulk lanes.
+
+    Every lane contains named steppers (generators). `next` chooses the lane:
+    while both lanes have steppers, the bulk lane gets `bulk_share` of the steps.
+    Steps are counted from the last `add`, so a stepper, added again after a long run of the other lane,
+    doesn't take all the steps to catch up.
+    Steppers inside the lane are rotated round-robin.
+    """
+
+    def __init__(self, bulk_share: float):
+        self.bulk_share = min(max(bulk_share, 0.0), 1.0)
+        self.lanes: dict[bool, dict[str, Iterator]] = {False: {}, True: {}}
+        self.steps = {False: 0, True: 0}
+
+    def __bool__(self) -> bool:
+        return any(self.lanes.values())
+
+    def __contains__(self, name: str) -> bool:
+        return any(name in lane for lane in self.lanes.values())
+
+    def has_bulk(self) -> bool:
+        return bool(self.lanes[True])
+
+    def add(self, name: str, stepper: Iterator, bulk: bool) -> None:
+        self.lanes[bulk][name] = stepper
+        self.steps = {False: 0, True: 0}
+
+    def remove(self, name: str) -> None:
+        for lane in self.lanes.values():
+            lane.pop(name, None)
+
+    def next(self) -> tuple[str, Iterator]:
+        """Returns the name and the stepper, which must make the next step."""
+        if not self.lanes[True]:
+            bulk = False
+        elif not self.lanes[False]:
+            bulk = True
+        else:
+            total = self.steps[False] + self.steps[True] + 1
+            bulk = self.steps[True] + 1 <= self.bulk_share * total
+        self.steps[bulk] += 1
+
+        lane = self.lanes[bulk]
+        name = next(iter(lane))
+        # Перемещаем в конец очереди своей полосы (round-robin)
+        lane[name] = lane.pop(name)
+        return name, lane[name]
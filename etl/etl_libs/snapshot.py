@@ -0,0 +1,143 @@
+import gzip
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Iterable, Optional
+
+from etl_libs.loaders.loader import ElasticsearchLoader
+from etl_libs.processes.base import BaseETLProcess
+from etl_libs.storage import JsonFileStorage, State
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+
+
+class SnapshotWriter:
+    """Exports the documents of the ETL processes to the compressed NDJSON segments.
+
+    Segment is a gzip file with the bulk body: action line (id and external version, without '_index')
+    and source line (with content hash) for every document. So it is loaded as is into any index.
+    The manifest lists the segments of every index and the source watermarks:
+    (modified, id) of the newest record of every table, taken before the export.
+    Every change after the watermark is exported or will be processed by the incremental ETL again.
+    """
+
+    def __init__(self, directory: str, segment_docs: int = 50_000, batch_size: int = 1000):
+        self.directory = directory
+        self.segment_docs = segment_docs
+        self.batch_size = batch_size
+        self.manifest: dict[str, Any] = {
+            "created": datetime.now(timezone.utc).isoformat(),
+            "indexes": {},
+            "watermarks": {},
+        }
+        os.makedirs(directory, exist_ok=True)
+
+    def export(self, process: BaseETLProcess) -> None:
+        """Exports the index of the process and saves the manifest."""
+        index = process.INDEXES_MAPPING[process.MAIN_TABLE]
+        watermarks = {}
+        for table in process.TABLES:
+            modified, last_id = process.extractor.get_watermark(table)
+            watermarks[table] = {"last_modified": modified and str(modified), "last_uuid": last_id}
+        self.manifest["watermarks"][process.MAIN_TABLE] = watermarks
+
+        segments = []
+        documents = (document for ids in process.iter_id_batches(self.batch_size)
+                     for document in process.build_documents(ids))
+        segment, docs = None, 0
+        for source, version in documents:
+            if segment is None:
+                name = f"{index}-{len(segments):05d}.ndjson.gz"
+                segment = gzip.open(os.path.join(self.directory, name), "wb")
+                segments.append({"file": name, "docs": 0})
+            action = ElasticsearchLoader.bulk_action(None, source["id"], version)
+            segment.write(json.dumps(action, separators=(",", ":")).encode() + b"\n")
+            segment.write(json.dumps(ElasticsearchLoader.with_content_hash(source), separators=(",", ":"),
+                                     ensure_ascii=False).encode() + b"\n")
+            segments[-1]["docs"] += 1
+            docs += 1
+            if segments[-1]["docs"] >= self.segment_docs:
+                segment.close()
+                segment = None
+        if segment is not None:
+            segment.close()
+
+        self.manifest["indexes"][index] = {"docs": docs, "segments": segments}
+        with open(os.path.join(self.directory, MANIFEST), "w") as file:
+            json.dump(self.manifest, file, indent=2)
+        logger.info("Snapshot. Индекс %s: выгружено документов %s в %s сегментов", index, docs, len(segments))
+
+
+class SnapshotLoader:
+    """Streams the segments of the snapshot into the indexes in parallel, without Postgres.
+
+    Segments are sent as is (they are bulk bodies), in chunks of `chunk_docs` documents.
+    """
+
+    def __init__(self, directory: str, loader: ElasticsearchLoader, workers: int = 4, chunk_docs: int = 5000):
+        self.directory = directory
+        self.loader = loader
+        self.workers = workers
+        self.chunk_docs = chunk_docs
+        with open(os.path.join(directory, MANIFEST)) as file:
+            self.manifest = json.load(file)
+
+    def chunks(self, path: str) -> Iterable[bytes]:
+        """Reads the segment by the chunks of whole documents (pairs of lines)."""
+        with gzip.open(path, "rb") as segment:
+            lines = []
+            for line in segment:
+                lines.append(line)
+                if len(lines) >= 2 * self.chunk_docs:
+                    yield b"".join(lines)
+                    lines = []
+            if lines:
+                yield b"".join(lines)
+
+    def load_segment(self, index: str, segment: dict[str, Any]) -> tuple[int, int]:
+        indexed = failed = 0
+        for body in self.chunks(os.path.join(self.directory, segment["file"])):
+            body_indexed, body_failed = self.loader.load_bulk_body(index, body)
+            indexed += body_indexed
+            failed += body_failed
+        return indexed, failed
+
+    def load(self, targets: Optional[dict[str, str]] = None) -> dict[str, tuple[int, int]]:
+        """Loads every index of the snapshot.
+
+        Args:
+            targets: An optional mapping of the index of the snapshot to the target index.
+                Indexes, which are absent in it, are loaded into the same name.
+
+        Returns:
+            A dict of the target index to the counts of the indexed and failed documents.
+        """
+        targets = targets or {}
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for index, meta in self.manifest["indexes"].items():
+                target = targets.get(index, index)
+                counts = list(executor.map(lambda segment: self.load_segment(target, segment), meta["segments"]))
+                results[target] = (sum(indexed for indexed, _ in counts), sum(failed for _, failed in counts))
+                logger.info("Snapshot. Индекс %s загружен из %s: документов %s (в снимке %s), ошибок %s",
+                            target, index, results[target][0], meta["docs"], results[target][1])
+        return results
+
+    def restore_state(self, processes: Iterable[type[BaseETLProcess]]) -> None:
+        """Writes the watermarks of the snapshot to the states of the processes.
+
+        Incremental ETL continues from the moment of the snapshot.
+        """
+        for process in processes:
+            watermarks = self.manifest["watermarks"].get(process.MAIN_TABLE, {})
+            state = State(storage=JsonFileStorage(process.MAIN_TABLE + ".json"))
+            for table, watermark in watermarks.items():
+                if watermark["last_modified"] is None:
+                    continue
+                state.set_state(BaseETLProcess.get_state_last_modified_key(table), watermark["last_modified"])
+                state.set_state(BaseETLProcess.get_state_last_uuid_key(table), watermark["last_uuid"])
+            logger.info("Snapshot. Состояние %s восстановлено: %s", process.MAIN_TABLE, watermarks)
@@ -1,12 +1,40 @@
 from abc import ABC, abstractmethod
-from typing import Any
+from datetime import datetime, timedelta, timezone
+from typing import Any, Iterable, Iterator, Optional
 
 from pydantic import BaseModel
 
 
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
 class BaseTransformer(ABC):
     TRANSFORM_TO_MODEL: BaseModel
+    ID_FIELD: str
 
     @abstractmethod
     def consolidate(self, details: list[dict[str, Any]]) -> list[BaseModel]:
         pass
+
+    def consolidate_stream(self, details: Iterable[dict[str, Any]]) -> Iterator[BaseModel]:
+        """Lazy version of the consolidate.
+
+        By default, collects all the details and consolidates them at once.
+        Transformers, which can group ordered details, override it to yield models one by one.
+        """
+        yield from self.consolidate(list(details))
+
+    @staticmethod
+    def to_version(*modified: Optional[datetime]) -> Optional[int]:
+        """Returns an external version of the document: the newest 'modified' in microseconds.
+
+        Args:
+            modified: 'modified' values of all the source rows of the document. None values are skipped.
+
+        Returns:
+            An integer version or None if there are no values.
+        """
+        dates = [date if date.tzinfo else date.replace(tzinfo=timezone.utc) for date in modified if date is not None]
+        if not dates:
+            return None
+        return (max(dates) - EPOCH) // timedelta(microseconds=1)
@@ -0,0 +1,177 @@
+import json
+import logging
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import Any
+
+from etl_libs.loaders.loader import ElasticsearchLoader
+from etl_libs.transformers.base import BaseTransformer
+from etl_libs.transformers.filmwork import FilmworkTransformer
+from etl_libs.transformers.person import PersonTransformer
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = pc = None
+
+logger = logging.getLogger(__name__)
+
+
+class ColumnarTransformer(ABC):
+    """Base class of the columnar (Arrow) Transformers.
+
+    Works with the whole pyarrow.RecordBatch from BaseExtractor.fetch_arrow_by_ids:
+    deduplication and group-by are vectorized, Python code runs once per document, not per row.
+    Documents are emitted as NDJSON bulk body, without pydantic Models.
+
+    Requires optional 'pyarrow' package.
+    """
+
+    ROW_TRANSFORMER_CLASS: type[BaseTransformer]
+
+    def __init__(self):
+        if pa is None:
+            raise RuntimeError("Columnar transform requires 'pyarrow' package")
+
+    @abstractmethod
+    def to_documents(self, batch: 'pa.RecordBatch') -> list[dict[str, Any]]:
+        """Consolidates rows of the batch into the documents of the index.
+
+        Every document has an extra 'version' key with the external version (see BaseTransformer.to_version).
+        """
+
+    def to_ndjson(self, index: str, batch: 'pa.RecordBatch') -> bytes:
+        """Serializes documents of the batch into NDJSON body of the bulk request.
+
+        Args:
+            index: A name of the index in Elasticsearch.
+            batch: A pyarrow.RecordBatch from the extractor.
+
+        Returns:
+            A bytes NDJSON body. Empty if batch has no rows.
+        """
+        lines = []
+        documents = self.to_documents(batch) if batch.num_rows else []
+        for document in documents:
+            action = ElasticsearchLoader.bulk_action(index, document["id"], document.pop("version"))
+            lines.append(json.dumps(action, separators=(",", ":")))
+            lines.append(json.dumps(ElasticsearchLoader.with_content_hash(document), separators=(",", ":"),
+                                    ensure_ascii=False))
+        logger.info("ColumnarTransformer. Записи преобразованы: %s->%s", batch.num_rows, len(documents))
+        return "".join(line + "\n" for line in lines).encode()
+
+    def validate(self, batch: 'pa.RecordBatch') -> list[str]:
+        """Compares documents with the output of the row Transformer on the same rows.
+
+        Order of the lists inside the document is not significant for the index,
+        so lists are compared sorted. External version is compared too.
+
+        Args:
+            batch: A pyarrow.RecordBatch from the extractor.
+
+        Returns:
+            A list of ids of the mismatched documents.
+        """
+        expected = {
+            model.id: ElasticsearchLoader.normalize({**model.model_dump(), "version": model.version})
+            for model in self.ROW_TRANSFORMER_CLASS().consolidate(batch.to_pylist())
+        }
+        actual = {document["id"]: ElasticsearchLoader.normalize(document) for document in self.to_documents(batch)}
+        mismatched = [doc_id for doc_id in expected.keys() | actual.keys() if expected.get(doc_id) != actual.get(doc_id)]
+        if mismatched:
+            logger.error("ColumnarTransformer. Расхождение с %s: %s", self.ROW_TRANSFORMER_CLASS.__name__, mismatched)
+        return mismatched
+
+    @staticmethod
+    def _version(table: 'pa.Table', column: str) -> 'pa.ChunkedArray':
+        """Returns a timestamp column as external versions: microseconds since epoch (see BaseTransformer.to_version).
+
+        All-null columns have 'null' type in Arrow, so they are cast through the timestamp type too.
+        """
+        return table[column].cast(pa.timestamp("us", tz="UTC")).cast(pa.int64())
+
+    @staticmethod
+    def _distinct(table: 'pa.Table', columns: list[str]) -> 'pa.Table':
+        """Returns distinct rows of the columns. The order of the rows is not guaranteed, callers must not rely on it."""
+        return table.select(columns).group_by(columns, use_threads=False).aggregate([])
+
+
+class FilmworkColumnarTransformer(ColumnarTransformer):
+    ROW_TRANSFORMER_CLASS = FilmworkTransformer
+
+    ROLES = {"actor": "actors", "writer": "writers", "director": "directors"}
+    # Same as FilmworkTransformer._process_detail: a new link of the cast or genres raises the version too.
+    VERSION_COLUMNS = ("modified", "person_modified", "genre_modified", "person_link_created", "genre_link_created")
+
+    def to_documents(self, batch: 'pa.RecordBatch') -> list[dict[str, Any]]:
+        table = pa.Table.from_batches([batch])
+
+        films = self._distinct(table, ["fw_id", "title", "description", "rating"]).to_pydict()
+
+        version = pc.max_element_wise(*(self._version(table, column) for column in self.VERSION_COLUMNS), skip_nulls=True)
+        versions = pa.table({"fw_id": table["fw_id"], "version": version})
+        versions = versions.group_by("fw_id", use_threads=False).aggregate([("version", "max")]).to_pydict()
+        version_by_film = dict(zip(versions["fw_id"], versions["version_max"]))
+
+        genres = self._distinct(table.filter(pc.is_valid(table["genre_name"])), ["fw_id", "genre_id", "genre_name"])
+        genres = genres.group_by("fw_id", use_threads=False).aggregate([("genre_id", "list"), ("genre_name", "list")])
+        genres = genres.to_pydict()
+        genres_by_film = {
+            film_id: [{"id": genre_id, "name": name} for genre_id, name in zip(ids, names)]
+            for film_id, ids, names in zip(genres["fw_id"], genres["genre_id_list"], genres["genre_name_list"])
+        }
+
+        persons = table.filter(pc.is_in(table["role"], value_set=pa.array(list(self.ROLES))))
+        persons = self._distinct(persons, ["fw_id", "role", "person_id", "full_name"])
+        persons = persons.group_by(["fw_id", "role"], use_threads=False).aggregate(
+            [("person_id", "list"), ("full_name", "list")]
+        ).to_pydict()
+        persons_by_film = defaultdict(dict)
+        for film_id, role, ids, names in zip(persons["fw_id"], persons["role"],
+                                             persons["person_id_list"], persons["full_name_list"]):
+            persons_by_film[film_id][role] = (ids, names)
+
+        documents = []
+        for film_id, title, description, rating in zip(films["fw_id"], films["title"],
+                                                       films["description"], films["rating"]):
+            document = {
+                "id": film_id,
+                "title": title,
+                "description": description,
+                "imdb_rating": float(rating or 0.0),
+                "genre": genres_by_film.get(film_id, []),
+                "version": version_by_film[film_id],
+            }
+            for role, field in self.ROLES.items():
+                ids, names = persons_by_film[film_id].get(role, ([], []))
+                document[field + "_names"] = names
+                document[field] = [{"id": person_id, "name": name} for person_id, name in zip(ids, names)]
+            documents.append(document)
+        return documents
+
+
+class PersonColumnarTransformer(ColumnarTransformer):
+    ROW_TRANSFORMER_CLASS = PersonTransformer
+
+    def to_documents(self, batch: 'pa.RecordBatch') -> list[dict[str, Any]]:
+        table = pa.Table.from_batches([batch])
+
+        persons = pa.table({"p_id": table["p_id"], "full_name": table["full_name"], "version": self._version(table, "modified")})
+        persons = self._distinct(persons, ["p_id", "full_name", "version"]).to_pydict()
+
+        films = self._distinct(table.filter(pc.is_valid(table["film_id"])), ["p_id", "film_id", "role"])
+        films = films.group_by(["p_id", "film_id"], use_threads=False).aggregate([("role", "list")]).to_pydict()
+        films_by_person = defaultdict(list)
+        for person_id, film_id, roles in zip(films["p_id"], films["film_id"], films["role_list"]):
+            films_by_person[person_id].append({"id": film_id, "roles": roles})
+
+        return [
+            {
+                "id": person_id,
+                "full_name": full_name,
+                "films": films_by_person.get(person_id, []),
+                "version": version,
+            }
+            for person_id, full_name, version in zip(persons["p_id"], persons["full_name"], persons["version"])
+        ]
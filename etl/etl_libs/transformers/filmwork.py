@@ -1,5 +1,7 @@
 import logging
-from typing import Any
+from itertools import groupby
+from operator import itemgetter
+from typing import Any, Iterable, Iterator
 
 from etl_libs.models import FilmworkModel
 from etl_libs.transformers.base import BaseTransformer
@@ -9,6 +11,7 @@ logger = logging.getLogger(__name__)
 
 class FilmworkTransformer(BaseTransformer):
     MODEL = FilmworkModel
+    ID_FIELD = 'fw_id'
 
     def consolidate(self, details: list[dict[str, Any]]) -> list[FilmworkModel]:
         films = {}
@@ -16,51 +19,82 @@ class FilmworkTransformer(BaseTransformer):
         for detail in details:
             film_id = detail["fw_id"]
             if film_id not in films:
-                films[film_id] = {
-                    "id": film_id,
-                    "imdb_rating": detail["rating"],
-                    "title": detail["title"],
-                    "description": detail["description"],
-                    "genre": [],
-                    "actors_names": [],
-                    "writers_names": [],
-                    "directors_names": [],
-                    "actors": [],
-                    "writers": [],
-                    "directors": [],
-                }
-            self._process_role(film_id, detail, films)
-
-            if detail["genre_name"] is not None:
-                genre = {'id': detail['genre_id'], 'name': detail['genre_name']}
-                if genre not in films[film_id]['genre']:
-                    films[film_id]['genre'].append(genre)
-
-        for film in films.values():
-            film["genre"] = list(film["genre"])
+                films[film_id] = self._new_film(detail)
+            self._process_detail(films[film_id], detail)
 
         result = [self.MODEL(**film) for film in films.values()]
         logger.info("Transformer. Записи преобразованы в %s: %s->%s", self.MODEL.__name__, len(details), len(result))
         return result
 
-    def _process_role(self, film_id: str, detail: dict[str, Any], films: dict[str, Any]) -> None:
+    def consolidate_stream(self, details: Iterable[dict[str, Any]]) -> Iterator[FilmworkModel]:
+        """Yields a finished model as soon as 'fw_id' of the details changes.
+
+        Details must be ordered by 'fw_id' (see FilmworkExtractor.stream_by_ids),
+        so only the rows of a single film are kept in memory.
+        """
+        details_count, films_count = 0, 0
+
+        for _, film_details in groupby(details, key=itemgetter("fw_id")):
+            film = None
+            for detail in film_details:
+                if film is None:
+                    film = self._new_film(detail)
+                self._process_detail(film, detail)
+                details_count += 1
+            films_count += 1
+            yield self.MODEL(**film)
+
+        logger.info("Transformer. Записи преобразованы в %s: %s->%s", self.MODEL.__name__, details_count, films_count)
+
+    @staticmethod
+    def _new_film(detail: dict[str, Any]) -> dict[str, Any]:
+        return {
+            "id": detail["fw_id"],
+            "imdb_rating": detail["rating"],
+            "title": detail["title"],
+            "description": detail["description"],
+            "genre": [],
+            "actors_names": [],
+            "writers_names": [],
+            "directors_names": [],
+            "actors": [],
+            "writers": [],
+            "directors": [],
+            "version": None,
+        }
+
+    def _process_detail(self, film: dict[str, Any], detail: dict[str, Any]) -> None:
+        version = self.to_version(
+            detail["modified"], detail["person_modified"], detail["genre_modified"],
+            detail["person_link_created"], detail["genre_link_created"],
+        )
+        film["version"] = max(filter(None, (film["version"], version)), default=None)
+        self._process_role(film, detail)
+
+        if detail["genre_name"] is not None:
+            genre = {'id': detail['genre_id'], 'name': detail['genre_name']}
+            if genre not in film['genre']:
+                film['genre'].append(genre)
+
+    @staticmethod
+    def _process_role(film: dict[str, Any], detail: dict[str, Any]) -> None:
         roles = ['actor', 'writer', 'director', None]
         role = detail["role"]
         person = {"id": detail["person_id"], "name": detail["full_name"]}
         full_name = detail["full_name"]
 
         if role not in roles:
-            logger.error(f"Не удалось определить роль %s", role)
+            logger.error("Не удалось определить роль %s", role)
             return
 
-        if role == "actor" and person not in films[film_id]["actors"]:
-            films[film_id]["actors"].append(person)
-            films[film_id]["actors_names"].append(full_name)
+        if role == "actor" and person not in film["actors"]:
+            film["actors"].append(person)
+            film["actors_names"].append(full_name)
 
-        elif role == "writer" and person not in films[film_id]["writers"]:
-            films[film_id]["writers"].append(person)
-            films[film_id]["writers_names"].append(full_name)
+        elif role == "writer" and person not in film["writers"]:
+            film["writers"].append(person)
+            film["writers_names"].append(full_name)
 
-        elif role == "director" and person not in films[film_id]["directors"]:
-            films[film_id]["directors"].append(person)
-            films[film_id]["directors_names"].append(full_name)
+        elif role == "director" and person not in film["directors"]:
+            film["directors"].append(person)
+            film["directors_names"].append(full_name)
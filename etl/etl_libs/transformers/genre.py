@@ -9,9 +9,10 @@ logger = logging.getLogger(__name__)
 
 class GenreTransformer(BaseTransformer):
     MODEL = GenreModel
+    ID_FIELD = 'id'
 
     def consolidate(self, details: list[dict[str, Any]]) -> list[GenreModel]:
-        result = [self.MODEL(**genre) for genre in details]
+        result = [self.MODEL(**genre, version=self.to_version(genre["modified"])) for genre in details]
         logger.info("Transformer. Записи преобразованы в %s: %s->%s",
                     self.MODEL.__name__, len(details), len(result))
         return result
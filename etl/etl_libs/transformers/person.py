@@ -9,6 +9,7 @@ logger = logging.getLogger(__name__)
 
 class PersonTransformer(BaseTransformer):
     MODEL = PersonModel
+    ID_FIELD = 'p_id'
 
     def consolidate(self, details: list[dict[str, Any]]) -> list[PersonModel]:
         persons = {}
@@ -19,7 +20,8 @@ class PersonTransformer(BaseTransformer):
                 persons[person_id] = {
                     "id": person_id,
                     "full_name": detail["full_name"],
-                    "films": []
+                    "films": [],
+                    "version": self.to_version(detail["modified"]),
                 }
 
             film_id = detail.get("film_id")
@@ -0,0 +1,96 @@
+import json
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from operator import itemgetter
+from typing import Any, Iterator, Sequence
+
+from etl_libs.loaders.loader import ElasticsearchLoader
+from etl_libs.transformers.base import BaseTransformer
+
+logger = logging.getLogger(__name__)
+
+
+def transform_chunk(transformer_class: type[BaseTransformer], index: str,
+                    columns: tuple[str, ...], rows: list[tuple]) -> bytes:
+    """Worker function of the TransformPool.
+
+    Restores dicts from the compact rows, consolidates them into Models
+    and serializes the Models to the NDJSON body of the bulk request.
+
+    Args:
+        transformer_class: A class of the Transformer to consolidate rows.
+        index: A name of the index in Elasticsearch.
+        columns: A tuple of the column names. Shared by all the rows.
+        rows: A list of the tuples of values. All rows of the one object must be in the same chunk.
+
+    Returns:
+        A bytes NDJSON body of the bulk request.
+    """
+    details = [dict(zip(columns, row)) for row in rows]
+    lines = []
+    for doc in transformer_class().consolidate(details):
+        lines.append(json.dumps(ElasticsearchLoader.bulk_action(index, doc.id, doc.version), separators=(",", ":")).encode())
+        lines.append(json.dumps(ElasticsearchLoader.with_content_hash(doc.model_dump()), ensure_ascii=False).encode())
+    lines.append(b"")
+    return b"\n".join(lines)
+
+
+class TransformPool:
+    """Process pool for the CPU-bound transform stage.
+
+    Rows are transferred to workers as tuples with one shared header of column names,
+    so the keys are not pickled for every row.
+    Workers return serialized bulk bodies, which loader sends as is.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        logger.info("TransformPool. Запущено процессов: %s", workers)
+
+    def close(self) -> None:
+        """Waits for the workers and shuts the pool down."""
+        self.executor.shutdown()
+        logger.info("TransformPool. Процессы остановлены")
+
+    def split(self, id_field: str, details: Sequence[Any]) -> tuple[tuple[str, ...], list[list[tuple]]]:
+        """Packs rows into compact chunks, one per worker.
+
+        Rows are partitioned by the hash of their object id,
+        so all rows of the one object go to the same chunk.
+
+        Args:
+            id_field: A name of the column with object id.
+            details: A Sequence of the DictRow from the extractor.
+
+        Returns:
+            A tuple of the column names and a list of the non-empty chunks of tuples.
+        """
+        columns = tuple(details[0].keys())
+        id_position = columns.index(id_field)
+        get_values = itemgetter(*columns)
+        chunks = [[] for _ in range(self.workers)]
+        for row in details:
+            values = get_values(row)
+            chunks[hash(values[id_position]) % self.workers].append(values)
+        return columns, [chunk for chunk in chunks if chunk]
+
+    def transform(self, transformer_class: type[BaseTransformer], index: str,
+                  details: Sequence[Any]) -> Iterator[bytes]:
+        """Fans rows out to the workers.
+
+        Args:
+            transformer_class: A class of the Transformer to consolidate rows.
+            index: A name of the index in Elasticsearch.
+            details: A Sequence of the DictRow from the extractor.
+
+        Returns:
+            An Iterator of the NDJSON bulk bodies in the order of chunks.
+        """
+        if not details:
+            return
+        columns, chunks = self.split(transformer_class.ID_FIELD, details)
+        futures = [self.executor.submit(transform_chunk, transformer_class, index, columns, chunk) for chunk in chunks]
+        logger.info("TransformPool. Записи отправлены на преобразование: %s->%s", len(details), len(futures))
+        for future in futures:
+            yield future.result()
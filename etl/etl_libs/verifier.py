@@ -0,0 +1,209 @@
+import logging
+from array import array
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from etl_libs.loaders.loader import ElasticsearchLoader
+from etl_libs.metrics import BatchTimer
+from etl_libs.processes.base import BaseETLProcess
+
+logger = logging.getLogger(__name__)
+
+MASK = (1 << 64) - 1
+
+
+def to_signed(value: int) -> int:
+    """Wraps the int into the signed 64-bit range, as the Java long overflows."""
+    value &= MASK
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+@dataclass
+class IdRange:
+    """Range of the ids `[low, high)` and positions `[start, stop)` of the Postgres ids inside it.
+
+    None bounds are open, so the first and the last ranges also cover ids, which exist only in Elasticsearch.
+    """
+
+    start: int
+    stop: int
+    low: Optional[str]
+    high: Optional[str]
+
+    def query(self) -> dict[str, Any]:
+        bounds = {}
+        if self.low is not None:
+            bounds["gte"] = self.low
+        if self.high is not None:
+            bounds["lt"] = self.high
+        return {"range": {"id": bounds}} if bounds else {"match_all": {}}
+
+
+@dataclass
+class VerifyReport:
+    index: str
+    documents: int = 0
+    ranges_compared: int = 0
+    leaves: int = 0
+    reindexed: list[str] = field(default_factory=list)
+    deleted: list[str] = field(default_factory=list)
+
+
+class Verifier:
+    """Finds and repairs the drift between Postgres and the index of the ETL process.
+
+    How:
+        1. Builds every document of the self.process.MAIN_TABLE by the process transformer
+            and keeps a sorted list of (id, content hash) of them.
+        2. Splits the id space into `fanout` ranges and compares (count, sum of content hashes) of every range.
+            Elasticsearch calculates them by the scripted metric over the stored
+            ElasticsearchLoader.CONTENT_HASH_FIELD, without fetching the documents.
+        3. Recurses only into the ranges, which differ, until the range has no more than `leaf_size` documents.
+        4. In the leaf compares hashes one by one: reindexes missing and changed ids,
+            deletes ids, which are absent in Postgres.
+    """
+
+    PG_BATCH_SIZE = 1000
+    SCROLL_SIZE = 5000
+    # Сумма переполняется как Java long, поэтому в Python суммы приводятся функцией to_signed.
+    # 'content_hash' - ElasticsearchLoader.CONTENT_HASH_FIELD
+    SUM_SCRIPT = {
+        "init_script": "state.sum = 0L; state.count = 0L",
+        "map_script": "state.count += 1; if (doc['content_hash'].size() > 0) { state.sum += doc['content_hash'].value }",
+        "combine_script": "return state",
+        "reduce_script": "long sum = 0L; long count = 0L; "
+                         "for (s in states) { if (s != null) { sum += s.sum; count += s.count } } "
+                         "return ['sum': sum, 'count': count]",
+    }
+
+    def __init__(self, process: BaseETLProcess, leaf_size: int = 1000, fanout: int = 16, dry_run: bool = False):
+        self.process = process
+        self.index = process.INDEXES_MAPPING[process.MAIN_TABLE]
+        self.client = process.loader.client
+        self.leaf_size = leaf_size
+        self.fanout = fanout
+        self.dry_run = dry_run
+        self.ids: list[str] = []
+        self.hashes = array("q")
+        # Префиксные суммы хэшей: сумма диапазона за O(1)
+        self.prefix_sums = array("q", [0])
+
+    def hash_postgres(self) -> None:
+        """Walks the main table in the order of ids and hashes every document."""
+        for ids in self.process.iter_id_batches(self.PG_BATCH_SIZE):
+            hashes = {
+                document["id"]: ElasticsearchLoader.content_hash(document)
+                for document, _ in self.process.build_documents(ids)
+            }
+            for object_id in ids:
+                content_hash = hashes.get(object_id)
+                if content_hash is None:
+                    # Удалён между запросами
+                    continue
+                self.ids.append(object_id)
+                self.hashes.append(content_hash)
+                self.prefix_sums.append(to_signed(self.prefix_sums[-1] + content_hash))
+        logger.info("Verifier. %s: документов в Postgres: %s", self.index, len(self.ids))
+
+    def split(self, id_range: IdRange) -> list[IdRange]:
+        """Splits the range into `fanout` ranges with equal counts of Postgres ids."""
+        count = id_range.stop - id_range.start
+        parts = min(self.fanout, max(count, 1))
+        positions = sorted({id_range.start + count * part // parts for part in range(1, parts)})
+        ranges = []
+        low, start = id_range.low, id_range.start
+        for position in positions:
+            ranges.append(IdRange(start, position, low, self.ids[position]))
+            low, start = self.ids[position], position
+        ranges.append(IdRange(start, id_range.stop, low, id_range.high))
+        return ranges
+
+    def postgres_digest(self, id_range: IdRange) -> tuple[int, int]:
+        return id_range.stop - id_range.start, to_signed(self.prefix_sums[id_range.stop] - self.prefix_sums[id_range.start])
+
+    def elastic_digests(self, ranges: list[IdRange]) -> list[tuple[int, int]]:
+        """Calculates (count, sum of hashes) of all the ranges by one aggregation request."""
+        response = self.client.search(
+            index=self.index,
+            size=0,
+            aggs={
+                "ranges": {
+                    "filters": {"filters": {str(number): id_range.query() for number, id_range in enumerate(ranges)}},
+                    "aggs": {"digest": {"scripted_metric": self.SUM_SCRIPT}},
+                },
+            },
+        )
+        buckets = response["aggregations"]["ranges"]["buckets"]
+        return [
+            (buckets[str(number)]["doc_count"], to_signed(buckets[str(number)]["digest"]["value"]["sum"]))
+            for number in range(len(ranges))
+        ]
+
+    def elastic_hashes(self, id_range: IdRange) -> dict[str, Optional[int]]:
+        """Fetches ids and stored hashes of the range from doc values, without _source."""
+        hashes = {}
+        search_after = None
+        while True:
+            response = self.client.search(
+                index=self.index,
+                size=self.SCROLL_SIZE,
+                query=id_range.query(),
+                source=False,
+                docvalue_fields=["id", ElasticsearchLoader.CONTENT_HASH_FIELD],
+                sort=[{"id": "asc"}],
+                search_after=search_after,
+            )
+            hits = response["hits"]["hits"]
+            for hit in hits:
+                values = hit.get("fields", {}).get(ElasticsearchLoader.CONTENT_HASH_FIELD)
+                hashes[hit["_id"]] = values[0] if values else None
+            if len(hits) < self.SCROLL_SIZE:
+                return hashes
+            search_after = hits[-1]["sort"]
+
+    def repair_leaf(self, id_range: IdRange, report: VerifyReport) -> None:
+        """Compares the leaf range id by id and repairs the differences."""
+        report.leaves += 1
+        elastic = self.elastic_hashes(id_range)
+        postgres = dict(zip(self.ids[id_range.start:id_range.stop], self.hashes[id_range.start:id_range.stop]))
+        to_reindex = [object_id for object_id, content_hash in postgres.items() if elastic.get(object_id) != content_hash]
+        to_delete = [object_id for object_id in elastic if object_id not in postgres]
+        report.reindexed.extend(to_reindex)
+        report.deleted.extend(to_delete)
+        if self.dry_run:
+            return
+        batch_size = self.process.extractor.BATCH_SIZE
+        self.process.loader.overwrite_stale = True
+        try:
+            for start in range(0, len(to_reindex), batch_size):
+                self.process.transform_and_load(to_reindex[start:start + batch_size], BatchTimer())
+        finally:
+            self.process.loader.overwrite_stale = False
+        if to_delete:
+            self.process.loader.delete_documents(self.index, to_delete)
+
+    def verify(self) -> VerifyReport:
+        """Runs the verification of the index and repairs the drift (unless dry_run).
+
+        Returns:
+            A VerifyReport with the ids of the reindexed and deleted documents.
+        """
+        report = VerifyReport(index=self.index)
+        self.hash_postgres()
+        report.documents = len(self.ids)
+        ranges = [IdRange(0, len(self.ids), None, None)]
+        while ranges:
+            report.ranges_compared += len(ranges)
+            differing = [
+                id_range for id_range, digest in zip(ranges, self.elastic_digests(ranges))
+                if digest != self.postgres_digest(id_range)
+            ]
+            ranges = []
+            for id_range in differing:
+                if id_range.stop - id_range.start <= self.leaf_size:
+                    self.repair_leaf(id_range, report)
+                else:
+                    ranges.extend(self.split(id_range))
+        logger.info("Verifier. %s: сравнено диапазонов: %s, листьев: %s, переиндексировано: %s, удалено: %s",
+                    self.index, report.ranges_compared, report.leaves, len(report.reindexed), len(report.deleted))
+        return report
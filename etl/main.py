@@ -1,13 +1,30 @@
+import argparse
+import json
 import logging
+import os
 import time
 
 from elasticsearch import Elasticsearch
 
-from etl_libs.config import get_settings
+from etl_libs.config import Settings, get_settings
+from etl_libs.doctor import Doctor
+from etl_libs.loaders.cache import DocumentCache
+from etl_libs.loaders.loader import ElasticsearchLoader
+from etl_libs.metrics import start_metrics_server
 from etl_libs.processes.base import BaseETLProcess
 from etl_libs.processes.filmwork import FilmworkETLProcess
 from etl_libs.processes.genre import GenreETLProcess
 from etl_libs.processes.person import PersonETLProcess
+from etl_libs.profiling import BatchProfiler
+from etl_libs.scheduler import AdaptiveScheduler
+from etl_libs.snapshot import SnapshotLoader, SnapshotWriter
+from etl_libs.transformers.pool import TransformPool
+from etl_libs.verifier import Verifier
+
+logger = logging.getLogger(__name__)
+
+PROCESSES = (GenreETLProcess, FilmworkETLProcess, PersonETLProcess)
+INDEX_JSONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "etl_libs", "index_jsons_dir")
 
 
 def check_indexes_first(indexes: list, es_dsn: str) -> None:
@@ -31,45 +48,195 @@ def check_indexes_first(indexes: list, es_dsn: str) -> None:
         time.sleep(10)
 
 
-def main():
-    settings = get_settings()
-
-    logger = logging.getLogger(__name__)
-    BaseETLProcess.configure_logging(
-        log_path=settings.logger.path,
-        log_level=settings.logger.level,
-        log_format=settings.logger.format
-    )
-
-    pg_dsn = {
+def get_pg_dsn(settings: Settings) -> dict:
+    return {
         "dbname": settings.postgres.db,
         "user": settings.postgres.user,
         "password": settings.postgres.password,
         "host": settings.postgres.host,
         "port": settings.postgres.port,
     }
-    es_dsn = f"http://{settings.elastic.host}:{settings.elastic.port}"
+
+
+def get_pg_replica_dsns(settings: Settings) -> list[dict]:
+    replica_dsns = []
+    for replica in settings.postgres.replica_hosts:
+        host, _, port = replica.partition(":")
+        replica_dsns.append({**get_pg_dsn(settings), "host": host, "port": int(port or settings.postgres.port)})
+    return replica_dsns
+
+
+def get_es_dsn(settings: Settings) -> str:
+    return f"http://{settings.elastic.host}:{settings.elastic.port}"
+
+
+def run(settings: Settings, args: argparse.Namespace) -> None:
+    """Runs ETL processes in the endless loop."""
+    pg_dsn = get_pg_dsn(settings)
+    es_dsn = get_es_dsn(settings)
+
+    # Пул процессов для стадии Transform, если она CPU-bound (например, при первичной загрузке)
+    transform_pool = TransformPool(settings.transform_workers) if settings.transform_workers > 0 else None
+
+    # Запись свежих документов в кэш API, поколения индексов и публикация изменённых id сразу после загрузки в ES
+    cache = None
+    if settings.cache_write_through or settings.cache_publish_changes or settings.cache_bump_generations:
+        cache = DocumentCache(
+            settings.redis.host, settings.redis.port,
+            # Записи живут столько же, сколько записанные API: TTL и окно stale-while-revalidate
+            expire=settings.cache_detail_expire_in_seconds + settings.cache_stale_while_revalidate,
+            write_through=settings.cache_write_through,
+            channel=settings.cache_invalidation_channel if settings.cache_publish_changes else None,
+            generations=settings.cache_bump_generations,
+        )
 
     # Соединения с PG и ES открываются и закрываются единожды (questionable)
-    etl_film_works = FilmworkETLProcess(pg_dsn=pg_dsn, es_dsn=es_dsn)
-    etl_genres = GenreETLProcess(pg_dsn=pg_dsn, es_dsn=es_dsn)
-    etl_persons = PersonETLProcess(pg_dsn=pg_dsn, es_dsn=es_dsn)
+    process_options = {
+        "transform_pool": transform_pool,
+        "columnar": settings.columnar_transform,
+        "columnar_validate": settings.columnar_validate,
+        "bulk_share": settings.bulk_lane_share,
+        "pg_replica_dsns": get_pg_replica_dsns(settings),
+        # Профилирование батчей (tracemalloc, CPU, cProfile) включается только явно, у него заметные накладные расходы
+        "profiler": BatchProfiler(
+            settings.profile_dir, slowest=settings.profile_slowest, sample_rate=settings.profile_sample_rate,
+        ) if settings.profile_dir else None,
+        "refresh_threshold": settings.refresh_suspend_threshold,
+        "suspended_refresh_interval": settings.refresh_suspended_interval,
+        "cache": cache,
+    }
+    etl_processes = [process(pg_dsn=pg_dsn, es_dsn=es_dsn, **process_options) for process in PROCESSES]
+
+    if settings.metrics_port:
+        start_metrics_server(settings.metrics_port)
 
     logger.info('Ожидается создание индексов...')
     check_indexes_first(indexes=settings.elastic.indexes, es_dsn=es_dsn)
+    for etl_process in etl_processes:
+        etl_process.loader.ensure_content_hash_mapping(etl_process.INDEXES_MAPPING[etl_process.MAIN_TABLE])
+
+    scheduler = AdaptiveScheduler(
+        interval=settings.interval,
+        max_interval=settings.max_interval,
+        idle_cycles_before_backoff=settings.idle_cycles_before_backoff,
+    )
 
     logger.info("НАЧИНАЕМ")
     try:
         while True:
             logger.info("Запущен новый цикл ETL")
-            etl_genres.run()
-            etl_film_works.run()
-            etl_persons.run()
-            time.sleep(settings.interval)
+            processed = sum(etl_process.run() for etl_process in etl_processes)
+            failed = any(etl_process.cycle_errors for etl_process in etl_processes)
+            time.sleep(scheduler.next_delay(processed, failed=failed))
     except Exception as exc_info:
         logger.error("Непредвиденная ошибка: ", exc_info=exc_info)
+    finally:
+        if transform_pool is not None:
+            transform_pool.close()
     logger.error("Произошёл выход из цикла")
 
 
+def doctor(settings: Settings, args: argparse.Namespace) -> None:
+    """Explains the queries of the extractors and optionally creates the indexes."""
+    etl_doctor = Doctor(pg_dsn=get_pg_dsn(settings), processes=PROCESSES)
+    if args.create_indexes:
+        etl_doctor.create_indexes()
+    report = etl_doctor.check()
+    problems = sum(len(problems) for problems in report.values())
+    logger.info("Doctor. Проверено запросов: %s, найдено проблем: %s", len(report), problems)
+
+
+def verify(settings: Settings, args: argparse.Namespace) -> None:
+    """Compares the indexes with Postgres by the ranges of ids and repairs the differing documents."""
+    for process in PROCESSES:
+        etl_process = process(pg_dsn=get_pg_dsn(settings), es_dsn=get_es_dsn(settings),
+                              columnar=settings.columnar_transform)
+        try:
+            etl_process.loader.ensure_content_hash_mapping(etl_process.INDEXES_MAPPING[etl_process.MAIN_TABLE])
+            Verifier(etl_process, leaf_size=args.leaf_size, dry_run=args.dry_run).verify()
+        finally:
+            etl_process.extractor.disconnect()
+            etl_process.loader.close()
+
+
+def export(settings: Settings, args: argparse.Namespace) -> None:
+    """Exports the documents of all indexes to the snapshot directory."""
+    writer = SnapshotWriter(args.output, segment_docs=args.segment_docs)
+    for process in PROCESSES:
+        etl_process = process(pg_dsn=get_pg_dsn(settings), es_dsn=get_es_dsn(settings),
+                              columnar=settings.columnar_transform)
+        try:
+            writer.export(etl_process)
+        finally:
+            etl_process.extractor.disconnect()
+            etl_process.loader.close()
+
+
+def reload(settings: Settings, args: argparse.Namespace) -> None:
+    """Loads the snapshot into the indexes without Postgres."""
+    loader = ElasticsearchLoader(get_es_dsn(settings))
+    snapshot = SnapshotLoader(args.snapshot, loader, workers=args.workers)
+    targets = dict(target.split("=", 1) for target in args.target)
+    try:
+        if args.recreate:
+            for index in snapshot.manifest["indexes"]:
+                with open(os.path.join(INDEX_JSONS_DIR, index + ".json")) as file:
+                    loader.recreate_index(targets.get(index, index), json.load(file))
+        snapshot.load(targets)
+        if args.restore_state:
+            snapshot.restore_state(PROCESSES)
+    finally:
+        loader.close()
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="ETL Postgres -> Elasticsearch")
+    parser.set_defaults(command=run)
+    subparsers = parser.add_subparsers()
+
+    run_parser = subparsers.add_parser("run", help="Запустить ETL (по умолчанию)")
+    run_parser.set_defaults(command=run)
+
+    doctor_parser = subparsers.add_parser("doctor", help="EXPLAIN (ANALYZE, BUFFERS) запросов экстракторов")
+    doctor_parser.add_argument("--create-indexes", action="store_true",
+                               help="Создать (CONCURRENTLY) индексы для пагинации и fan-out запросов")
+    doctor_parser.set_defaults(command=doctor)
+
+    verify_parser = subparsers.add_parser("verify", help="Сверить индексы с Postgres и переиндексировать расхождения")
+    verify_parser.add_argument("--dry-run", action="store_true", help="Только найти расхождения, без исправления")
+    verify_parser.add_argument("--leaf-size", type=int, default=1000,
+                               help="Размер диапазона, который сравнивается поштучно")
+    verify_parser.set_defaults(command=verify)
+
+    export_parser = subparsers.add_parser("export", help="Выгрузить документы всех индексов в снимок (NDJSON.gz)")
+    export_parser.add_argument("--output", required=True, help="Директория снимка")
+    export_parser.add_argument("--segment-docs", type=int, default=50_000, help="Документов в одном сегменте")
+    export_parser.set_defaults(command=export)
+
+    reload_parser = subparsers.add_parser("reload", help="Загрузить снимок в индексы без обращения к Postgres")
+    reload_parser.add_argument("--snapshot", required=True, help="Директория снимка")
+    reload_parser.add_argument("--target", action="append", default=[], metavar="INDEX=TARGET",
+                               help="Загрузить индекс снимка в другой индекс, например movies=movies_v2")
+    reload_parser.add_argument("--workers", type=int, default=4, help="Количество параллельно загружаемых сегментов")
+    reload_parser.add_argument("--recreate", action="store_true",
+                               help="Пересоздать целевые индексы с маппингом из index_jsons_dir")
+    reload_parser.add_argument("--restore-state", action="store_true",
+                               help="Записать водяные знаки снимка в состояние ETL")
+    reload_parser.set_defaults(command=reload)
+    return parser
+
+
+def main():
+    args = get_parser().parse_args()
+    settings = get_settings()
+
+    BaseETLProcess.configure_logging(
+        log_path=settings.logger.path,
+        log_level=settings.logger.level,
+        log_format=settings.logger.format
+    )
+    args.command(settings, args)
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,42 @@
+"""
+Tests of the generation increments of the DocumentCache.
+"""
+from unittest import mock
+
+from etl_libs.loaders.cache import DocumentCache
+
+
+def make_cache():
+    cache = DocumentCache(host="localhost", port=6379, expire=300, write_through=False, channel="channel",
+                          generations=True)
+    cache.redis = mock.MagicMock()
+    return cache
+
+
+def incremented(cache):
+    pipeline = cache.redis.pipeline.return_value
+    return [call.args[0] for call in pipeline.incr.call_args_list]
+
+
+def test_deferred_index_does_not_stop_increments_of_other_indexes():
+    cache = make_cache()
+    cache.defer("movies")
+
+    cache.put_many("movies", [{"id": "f1"}])
+    cache.put_many("persons", [{"id": "p1"}])
+
+    assert not cache.needs_refresh("movies") and cache.needs_refresh("persons")
+    assert incremented(cache) == ["generation:persons"]
+
+
+def test_bump_generation_stops_deferring_only_its_index():
+    cache = make_cache()
+    cache.defer("movies")
+    cache.defer("persons")
+
+    cache.bump_generation("movies")
+    cache.put_many("movies", [{"id": "f1"}])
+    cache.put_many("persons", [{"id": "p1"}])
+
+    assert incremented(cache) == ["generation:movies", "generation:movies"]
+    assert cache.deferred == {"persons"}
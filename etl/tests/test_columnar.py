@@ -0,0 +1,53 @@
+"""
+Tests of the columnar (Arrow) transform mode.
+"""
+from datetime import datetime, timezone
+
+import pytest
+
+from etl_libs.extractors.base import BaseExtractor
+
+pa = pytest.importorskip("pyarrow")
+
+from etl_libs.transformers.columnar import FilmworkColumnarTransformer  # noqa: E402
+
+UUID, TEXT, FLOAT8, TIMESTAMPTZ = 2950, 25, 701, 1184
+FILM_COLUMNS = {
+    "fw_id": UUID, "title": TEXT, "description": TEXT, "rating": FLOAT8, "type": TEXT,
+    "created": TIMESTAMPTZ, "modified": TIMESTAMPTZ,
+    "role": TEXT, "person_link_created": TIMESTAMPTZ, "person_id": UUID, "full_name": TEXT,
+    "person_modified": TIMESTAMPTZ,
+    "genre_link_created": TIMESTAMPTZ, "genre_id": UUID, "genre_name": TEXT, "genre_modified": TIMESTAMPTZ,
+}
+MODIFIED = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def film_batch(rows):
+    types = [BaseExtractor.arrow_type(type_code) for type_code in FILM_COLUMNS.values()]
+    return BaseExtractor.rows_to_arrow(list(FILM_COLUMNS), rows, types)
+
+
+def test_types_of_query_are_kept_for_null_columns():
+    batch = film_batch([("f1", "Film", None, 5.0, "movie", MODIFIED, MODIFIED) + (None,) * 9])
+
+    assert batch.schema.field("role").type == pa.string()
+    assert batch.schema.field("person_modified").type == pa.timestamp("us", tz="UTC")
+
+
+def test_empty_batch_has_types_of_query():
+    batch = film_batch([])
+
+    assert batch.num_rows == 0
+    assert batch.schema.field("fw_id").type == pa.string()
+
+
+def test_film_without_cast_matches_row_transformer():
+    batch = film_batch([
+        ("f1", "Film", None, 5.0, "movie", MODIFIED, MODIFIED, None, None, None, None, None,
+         MODIFIED, "g1", "Drama", MODIFIED),
+    ])
+    transformer = FilmworkColumnarTransformer()
+
+    assert transformer.validate(batch) == []
+    document = transformer.to_documents(batch)[0]
+    assert document["actors"] == [] and document["genre"] == [{"id": "g1", "name": "Drama"}]
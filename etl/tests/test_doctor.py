@@ -0,0 +1,41 @@
+"""
+Tests of the index creation by the Doctor.
+"""
+from unittest import mock
+
+from etl_libs import doctor
+from etl_libs.doctor import Doctor
+
+
+def create_indexes(validity):
+    """Runs create_indexes against a cursor, where indexes have the validity {name: indisvalid}."""
+    cursor = mock.MagicMock()
+    executed = []
+
+    def execute(query, params=None):
+        executed.append(" ".join(query.split()))
+        cursor.fetchone.return_value = (validity[params[0]],) if params and params[0] in validity else None
+
+    cursor.execute.side_effect = execute
+    connection = mock.MagicMock()
+    connection.cursor.return_value.__enter__.return_value = cursor
+    with mock.patch.object(doctor.psycopg2, "connect", return_value=connection):
+        Doctor(pg_dsn={}, processes=()).create_indexes()
+    return [query for query in executed if not query.startswith("SELECT")]
+
+
+def test_valid_index_is_kept():
+    executed = create_indexes({"film_work_modified_id_idx": True})
+
+    assert not any("film_work_modified_id_idx" in query for query in executed)
+    assert "CREATE INDEX CONCURRENTLY IF NOT EXISTS genre_modified_id_idx ON content.genre (modified, id);" in executed
+
+
+def test_invalid_index_is_rebuilt():
+    executed = create_indexes({"film_work_modified_id_idx": False})
+
+    drop = executed.index("DROP INDEX CONCURRENTLY IF EXISTS content.film_work_modified_id_idx;")
+    create = executed.index(
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS film_work_modified_id_idx ON content.film_work (modified, id);"
+    )
+    assert drop < create
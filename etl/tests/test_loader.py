@@ -0,0 +1,65 @@
+"""
+Tests of the external versions and version conflicts of the loader.
+"""
+import json
+import logging
+from unittest import mock
+
+from etl_libs.loaders.loader import ElasticsearchLoader
+
+
+def make_loader():
+    loader = ElasticsearchLoader.__new__(ElasticsearchLoader)
+    loader.client = mock.Mock(**{"indices.exists.return_value": True})
+    loader.cache = None
+    loader.overwrite_stale = False
+    return loader
+
+
+def bulk_body(*documents):
+    lines = []
+    for doc_id, version, source in documents:
+        lines.append(json.dumps(ElasticsearchLoader.bulk_action(None, doc_id, version)))
+        lines.append(json.dumps(ElasticsearchLoader.with_content_hash({"id": doc_id, **source})))
+    return "".join(line + "\n" for line in lines).encode()
+
+
+def versions(body):
+    return [json.loads(line)["index"].get("version") for line in body.splitlines()[::2]]
+
+
+def test_versions_are_raised_to_min_version():
+    body = bulk_body(("a", 5, {}), ("b", 20, {}), ("c", None, {}))
+
+    raised = ElasticsearchLoader.raise_versions(body, 10)
+
+    assert versions(raised) == [10, 20, None]
+    assert raised.splitlines()[1::2] == body.splitlines()[1::2]
+
+
+def test_prepare_data_raises_versions_to_min_version():
+    docs = [mock.Mock(id="a", version=5, **{"model_dump.return_value": {"id": "a"}})]
+
+    action = next(ElasticsearchLoader.prepare_data("movies", docs, min_version=10))
+
+    assert action["_version"] == 10
+
+
+def test_conflict_with_other_content_is_warned(caplog):
+    loader = make_loader()
+    body = bulk_body(("same", 5, {"title": "A"}), ("other", 5, {"title": "B"}))
+    stored_same = ElasticsearchLoader.with_content_hash({"id": "same", "title": "A"})[loader.CONTENT_HASH_FIELD]
+    loader.client.bulk.return_value = {"items": [
+        {"index": {"_id": "same", "status": 409, "error": {}}},
+        {"index": {"_id": "other", "status": 409, "error": {}}},
+    ]}
+    loader.client.mget.return_value = {"docs": [
+        {"_id": "other", "found": True, "_source": {loader.CONTENT_HASH_FIELD: 1}},
+        {"_id": "same", "found": True, "_source": {loader.CONTENT_HASH_FIELD: stored_same}},
+    ]}
+
+    with caplog.at_level(logging.INFO):
+        assert loader.load_bulk_body("movies", body) == (0, 0)
+
+    warnings = [record for record in caplog.records if record.levelno == logging.WARNING]
+    assert len(warnings) == 1 and "['other']" in warnings[0].getMessage()
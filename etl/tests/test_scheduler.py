@@ -0,0 +1,125 @@
+"""
+Tests of the interleaving of the high-priority and bulk lanes.
+"""
+from unittest import mock
+
+from etl_libs.processes.base import BaseETLProcess
+from etl_libs.scheduler import AdaptiveScheduler, PriorityLanes
+
+
+def steps(name, count, log):
+    for _ in range(count):
+        log.append(name)
+        yield 1
+
+
+def failing():
+    raise RuntimeError('boom')
+    yield
+
+
+def test_lanes_give_bulk_share_of_steps():
+    log = []
+    lanes = PriorityLanes(bulk_share=0.25)
+    lanes.add('film_work', steps('film_work', 6, log), bulk=False)
+    lanes.add('person', steps('person', 6, log), bulk=True)
+
+    for _ in range(8):
+        name, stepper = lanes.next()
+        next(stepper)
+
+    assert log.count('person') == 2
+    assert log.count('film_work') == 6
+
+
+def test_lanes_readded_stepper_does_not_catch_up():
+    log = []
+    lanes = PriorityLanes(bulk_share=0.5)
+    lanes.add('person', steps('person', 10, log), bulk=True)
+    for _ in range(5):
+        next(lanes.next()[1])
+
+    lanes.add('film_work', steps('film_work', 10, log), bulk=False)
+    for _ in range(4):
+        next(lanes.next()[1])
+
+    assert log[5:] == ['film_work', 'person', 'film_work', 'person']
+
+
+class FakeProcess(BaseETLProcess):
+    TABLES = ('film_work', 'person')
+    INDEXES_MAPPING = {'film_work': 'movies'}
+    MAIN_TABLE = 'film_work'
+
+    def __init__(self, main_steps, bulk_steps):
+        self.extractor = mock.Mock()
+        self.loader = mock.Mock(cache=None)
+        self.state = mock.Mock(**{'get_state.return_value': None})
+        self.bulk_share = 0.5
+        self.refresh_threshold = 0
+        self.log = []
+        # Счётчики шагов основной таблицы на каждый вызов iter_table: правки появляются во время цикла
+        self.main_steps = list(main_steps)
+        self.bulk_steps = bulk_steps
+
+    def iter_table(self, extracted_table):
+        if extracted_table == self.MAIN_TABLE:
+            count = self.main_steps.pop(0) if self.main_steps else 0
+        else:
+            count = self.bulk_steps
+        return steps(extracted_table, count, self.log)
+
+
+def test_run_polls_drained_high_lane_while_bulk_works():
+    process = FakeProcess(main_steps=[1, 0, 2], bulk_steps=4)
+
+    processed = process.run()
+
+    assert processed == 7
+    # Правки основной таблицы, появившиеся во время массовой переобработки, не ждут её окончания
+    assert process.log == ['film_work', 'person', 'person', 'person', 'film_work', 'person', 'film_work']
+
+
+def test_run_does_not_poll_failed_high_lane():
+    process = FakeProcess(main_steps=[], bulk_steps=3)
+    calls = []
+
+    def iter_table(extracted_table):
+        calls.append(extracted_table)
+        if extracted_table == process.MAIN_TABLE:
+            return failing()
+        return steps(extracted_table, 3, process.log)
+
+    process.iter_table = iter_table
+
+    assert process.run() == 3
+    assert calls == ['film_work', 'person']
+
+
+def test_scheduler_backs_off_idle_cycles():
+    scheduler = AdaptiveScheduler(interval=10, max_interval=35, idle_cycles_before_backoff=2)
+
+    delays = [scheduler.next_delay(0) for _ in range(5)]
+
+    assert delays == [10, 10, 20, 35, 35]
+    assert scheduler.next_delay(3) == 0
+    assert scheduler.next_delay(0) == 10
+
+
+def test_scheduler_does_not_count_failed_cycles_as_idle():
+    scheduler = AdaptiveScheduler(interval=10, max_interval=300, idle_cycles_before_backoff=1)
+    scheduler.next_delay(0)
+
+    delays = [scheduler.next_delay(0, failed=True) for _ in range(5)]
+
+    assert delays == [10] * 5
+    assert scheduler.idle_cycles == 1
+    assert scheduler.next_delay(0) == 20
+
+
+def test_run_counts_failed_tables():
+    process = FakeProcess(main_steps=[1], bulk_steps=0)
+    process.iter_table = lambda table: failing() if table == 'person' else steps(table, 1, process.log)
+
+    assert process.run() == 1
+    assert process.cycle_errors == 1
@@ -1,3 +1,5 @@
+import asyncio
+
 import uvicorn
 from elasticsearch import AsyncElasticsearch
 from fastapi import FastAPI
@@ -10,6 +12,8 @@ from src.core.logger import setup_logging
 from src.api.v1 import films, genres, persons
 from src.core.api_settings import settings
 from src.db import _redis, elastic
+from src.services._redis import get_redis_service
+from src.services.invalidation import CacheInvalidationListener
 
 
 setup_logging()
@@ -30,10 +34,26 @@ async def startup():
     logging.debug('Config: %s', vars(settings))
     _redis.redis = Redis(host=settings.redis_host, port=settings.redis_port)
     elastic.es = AsyncElasticsearch(hosts=[f'{settings.es_host}:{settings.es_port}'])
+    # Тот же экземпляр, что получают сервисы через Depends: FastAPI передаёт зависимость именованным аргументом,
+    # а lru_cache различает позиционный и именованный вызов
+    app.state.redis_service = get_redis_service(redis=_redis.redis)
+    if settings.cache_invalidation_channel:
+        app.state.cache_invalidation = CacheInvalidationListener(
+            app.state.redis_service, settings.cache_invalidation_channel,
+        )
+        app.state.cache_invalidation.start()
+    if settings.cache_stats_log_interval:
+        app.state.cache_stats = asyncio.create_task(
+            app.state.redis_service.log_stats(settings.cache_stats_log_interval),
+        )
 
 
 @app.on_event('shutdown')
 async def shutdown():
+    if settings.cache_invalidation_channel:
+        await app.state.cache_invalidation.stop()
+    if settings.cache_stats_log_interval:
+        app.state.cache_stats.cancel()
     await _redis.redis.close()
     await elastic.es.close()
 
@@ -1,7 +1,41 @@
+from __future__ import annotations
+
+from typing import Generic, Literal, Optional, Sequence, TypeVar
+
 from fastapi import Query
-from fastapi_pagination import Page
+from fastapi_pagination import Page as BasePage
+from fastapi_pagination.bases import AbstractParams
+from pydantic import Field
+
+T = TypeVar('T')
+
+
+class ExtendedPage(BasePage[T], Generic[T]):
+    """
+    Page with the relation of the total: 'eq' if the total is exact,
+    'gte' if it is at least the total (counting was stopped at the threshold, see TotalHitsHandler),
+    and the opaque cursor of the next page (see PaginationHandler 'search_after').
+    """
+
+    total_relation: Literal['eq', 'gte'] = Field('eq', description="'eq' - exact total, 'gte' - at least total")
+    next_cursor: Optional[str] = Field(None, description="Pass as 'cursor' to get the next page. None on the last page")
+
+    @classmethod
+    def create(
+        cls,
+        items: Sequence[T],
+        total: int,
+        params: AbstractParams,
+        total_relation: str = 'eq',
+        next_cursor: Optional[str] = None,
+    ) -> ExtendedPage[T]:
+        page = super().create(items=items, total=total, params=params)
+        page.total_relation = total_relation
+        page.next_cursor = next_cursor
+        return page
+
 
-Page = Page.with_custom_options(
+Page = ExtendedPage.with_custom_options(
     size=Query(50, ge=1, le=100, alias='page_size'),
     page=Query(1, ge=1, alias='page_number')
 )
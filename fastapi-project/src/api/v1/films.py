@@ -4,20 +4,29 @@ from typing import Optional, Annotated
 from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import UUID4
 from src.api.pagination import Page
-from src.api.validators import check_params
+from src.api.validators import check_cursor, check_fields, check_params
 from src.schemas import FilmSchema, FilmShort
 from src.services import FilmsService, get_films_service
 
 router = APIRouter()
 
 
-@router.get('/', response_model=Page[FilmShort])
+@router.get('/', response_model=Page[FilmShort], response_model_exclude_unset=True)
 async def list_of_films(
     film_service: FilmsService = Depends(get_films_service),
     sort: str = Query(
         '-imdb_rating', description="Sort by field, prefix '-' for descending order", regex='^-?imdb_rating$'
     ),
     genre: Optional[str] = Query(None, description='Genre UUID for filtering'),
+    approximate_total: bool = Query(
+        False, description="Count total only up to a threshold, 'total_relation' is 'gte' if it is reached"
+    ),
+    cursor: Optional[str] = Query(
+        None, description="Cursor pagination: 'next_cursor' of the previous page. Replaces 'page_number'"
+    ),
+    fields: Optional[str] = Query(
+        None, description='Comma separated fields of the films to return, e.g. title,imdb_rating. All by default'
+    ),
 ):
     """
     Return a list of films.
@@ -25,16 +34,25 @@ async def list_of_films(
     - Sort by rating.
     - Filter by genre uuid.
     - Results pagination.
+    - Approximate total for broad queries.
+    - Cursor pagination for deep pages.
+    - Choice of the returned fields.
     """
     params = check_params()
+    search_after, pit_id = check_cursor(cursor)
+    fields = check_fields(fields, FilmShort)
     filter_ = {'field': 'genre.id', 'value': genre} if genre else None
-    films, total = await film_service.get_many(sort=sort, filters=[filter_], page_number=params.page, size=params.size)
+    films, total, total_relation, next_cursor = await film_service.get_many(
+        sort=sort, filters=[filter_], page_number=params.page, size=params.size, approximate_total=approximate_total,
+        search_after=search_after, pit_id=pit_id, fields=fields,
+    )
 
     if not films:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='Not Found')
 
-    res = [FilmShort.parse_obj(film) for film in films]
-    return Page.create(items=res, total=total, params=params)
+    res = [FilmShort.parse_obj(film.dict(include=set(fields) if fields else None)) for film in films]
+    return Page.create(items=res, total=total, params=params, total_relation=total_relation,
+                       next_cursor=next_cursor)
 
 
 @router.get('/{film_id}', response_model=FilmSchema, description='Return details about film by UUID')
@@ -46,25 +64,41 @@ async def film_details(film_id: UUID4, film_service: FilmsService = Depends(get_
     return FilmSchema.parse_obj(film)
 
 
-@router.get('/search/', response_model=Page[FilmShort])
+@router.get('/search/', response_model=Page[FilmShort], response_model_exclude_unset=True)
 async def search_films(
     query: Annotated[str, Query('', description='Film title for searching', min_length=1)],
     film_service: FilmsService = Depends(get_films_service),
+    approximate_total: bool = Query(
+        False, description="Count total only up to a threshold, 'total_relation' is 'gte' if it is reached"
+    ),
+    cursor: Optional[str] = Query(
+        None, description="Cursor pagination: 'next_cursor' of the previous page. Replaces 'page_number'"
+    ),
+    fields: Optional[str] = Query(
+        None, description='Comma separated fields of the films to return, e.g. title,imdb_rating. All by default'
+    ),
 ):
     """
     Return a list of films with the most relevant title.
     Available options:
     - Search by film title.
     - Results pagination.
+    - Approximate total for broad queries.
+    - Cursor pagination for deep pages.
+    - Choice of the returned fields.
     """
     search = {'field': 'title', 'value': query}
     params = check_params()
-    films, total = await film_service.get_many(
-        search=search, page_number=params.page, size=params.size
+    search_after, pit_id = check_cursor(cursor)
+    fields = check_fields(fields, FilmShort)
+    films, total, total_relation, next_cursor = await film_service.get_many(
+        search=search, page_number=params.page, size=params.size, approximate_total=approximate_total,
+        search_after=search_after, pit_id=pit_id, fields=fields,
     )
 
     if not films:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='Not Found')
 
-    res = [film.dict() for film in films]
-    return Page.create(items=res, total=total, params=params)
+    res = [FilmShort.parse_obj(film.dict(include=set(fields) if fields else None)) for film in films]
+    return Page.create(items=res, total=total, params=params, total_relation=total_relation,
+                       next_cursor=next_cursor)
@@ -1,10 +1,10 @@
 from http import HTTPStatus
-from typing import List, Annotated
+from typing import List, Annotated, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import UUID4
 from src.api.pagination import Page
-from src.api.validators import check_params
+from src.api.validators import check_cursor, check_params
 from src.schemas import PersonSchema
 from src.schemas.films import FilmShort
 from src.services import FilmsService, get_films_service
@@ -23,6 +23,12 @@ router = APIRouter()
 async def search_persons(
     query: Annotated[str, Query('', description="Person's name for searching", min_length=1)],
     person_service: PersonsService = Depends(get_persons_service),
+    approximate_total: bool = Query(
+        False, description="Count total only up to a threshold, 'total_relation' is 'gte' if it is reached"
+    ),
+    cursor: Optional[str] = Query(
+        None, description="Cursor pagination: 'next_cursor' of the previous page. Replaces 'page_number'"
+    ),
 ):
     """
     Search person by full_name.
@@ -32,14 +38,17 @@ async def search_persons(
     """
     search = {'field': 'full_name', 'value': query}
     params = check_params()
-    persons, total = await person_service.get_many(
-        search=search, page_number=params.page, size=params.size
+    search_after, pit_id = check_cursor(cursor)
+    persons, total, total_relation, next_cursor = await person_service.get_many(
+        search=search, page_number=params.page, size=params.size, approximate_total=approximate_total,
+        search_after=search_after, pit_id=pit_id,
     )
     if not persons:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='Not Found')
 
     res = [person.dict() for person in persons]
-    return Page.create(items=res, total=total, params=params)
+    return Page.create(items=res, total=total, params=params, total_relation=total_relation,
+                       next_cursor=next_cursor)
 
 
 @router.get(
@@ -1,7 +1,13 @@
+from typing import Optional
+
+from pydantic import BaseModel
+
 from fastapi_pagination.api import AbstractParams, resolve_params
 from fastapi import HTTPException
 from http import HTTPStatus
 
+from src.utils.cursor import decode_cursor
+
 
 def check_params() -> AbstractParams:
     params = resolve_params()
@@ -10,6 +16,41 @@ def check_params() -> AbstractParams:
         raise HTTPException(
             status_code=HTTPStatus.BAD_REQUEST,
             detail='Amount of entries > 10k is not supported. '
-                   'Please try to apply filters/use search endpoint.'
+                   'Please try to apply filters/use search endpoint or cursor pagination.'
         )
     return params
+
+
+def check_cursor(cursor: Optional[str]) -> tuple[Optional[list], Optional[str]]:
+    """
+    Parse the cursor of the next page, returned in the previous page.
+
+    :param cursor: An opaque cursor or None.
+    :return: Sort values to search after and the id of the point in time. Both are None if there is no cursor.
+    """
+    if not cursor:
+        return None, None
+    try:
+        return decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail='Invalid cursor')
+
+
+def check_fields(fields: Optional[str], model: type[BaseModel]) -> Optional[list[str]]:
+    """
+    Parse the comma separated fields of the response model to return. 'uuid' is always returned.
+
+    :param fields: A string like 'title,imdb_rating' or None.
+    :param model: A response model of the items.
+    :return: A list of the fields or None, if all the fields are requested.
+    """
+    if not fields:
+        return None
+    names = {name.strip() for name in fields.split(',') if name.strip()}
+    unknown = names - model.__fields__.keys()
+    if unknown:
+        raise HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST,
+            detail=f'Unknown fields: {", ".join(sorted(unknown))}. Available: {", ".join(model.__fields__)}'
+        )
+    return sorted(names | {'uuid'})
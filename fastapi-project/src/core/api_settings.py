@@ -8,8 +8,21 @@ class Settings(BaseSettings):
     project_name: str = Field('Read-only API for online-cinema', env='API_PROJECT_NAME')
     redis_host: str = Field('127.0.0.1', env='REDIS_HOST')
     redis_port: int = Field(6379, env='REDIS_PORT')
+    cache_expire_in_seconds: int = Field(60 * 5, env='CACHE_EXPIRE_IN_SECONDS')
+    cache_detail_expire_in_seconds: int = Field(60 * 5, env='CACHE_DETAIL_EXPIRE_IN_SECONDS')
+    cache_invalidation_channel: str = Field('cache_invalidation', env='CACHE_INVALIDATION_CHANNEL')
+    cache_generation_local_ttl: float = Field(0, env='CACHE_GENERATION_LOCAL_TTL')
+    cache_local_max_entries: int = Field(10_000, env='CACHE_LOCAL_MAX_ENTRIES')
+    cache_local_max_bytes: int = Field(64 * 1024 * 1024, env='CACHE_LOCAL_MAX_BYTES')
+    cache_local_ttl: float = Field(5, env='CACHE_LOCAL_TTL')
+    cache_fill_lock_timeout: float = Field(0, env='CACHE_FILL_LOCK_TIMEOUT')
+    cache_stale_while_revalidate: int = Field(0, env='CACHE_STALE_WHILE_REVALIDATE')
+    cache_stats_log_interval: float = Field(60, env='CACHE_STATS_LOG_INTERVAL')
     es_host: str = Field('127.0.0.1', env='ES_HOST')
     es_port: int = Field(9200, env='ES_PORT')
+    es_track_total_hits: int = Field(0, env='ES_TRACK_TOTAL_HITS')
+    es_approximate_total_threshold: int = Field(10_000, env='ES_APPROXIMATE_TOTAL_THRESHOLD')
+    es_cursor_pit_keep_alive: str = Field('', env='ES_CURSOR_PIT_KEEP_ALIVE')
     log_format: str = Field('%(asctime)s - %(name)s - %(levelname)s - %(message)s', env='API_LOG_FORMAT')
     log_default_handlers: list = Field(['console', ], env='API_LOG_DEFAULT_HANDLERS')
     console_log_lvl: str = Field('DEBUG', env='API_CONSOLE_LOG_LVL')
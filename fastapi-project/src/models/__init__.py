@@ -1,5 +1,5 @@
-from .film import Film  # noqa
+from .film import Film, FilmShort  # noqa
 from .genre import Genre  # noqa
 from .person import Person  # noqa
 
-ElasticModel = Film | Genre | Person
+ElasticModel = Film | FilmShort | Genre | Person
@@ -23,3 +23,13 @@ class Film(BaseOrjsonModel):
     actors: list[PersonFromElastic]
     writers: list[PersonFromElastic]
     directors: list[PersonFromElastic]
+
+
+class FilmShort(BaseOrjsonModel):
+    """
+    Short version of Film, built from the projected _source for lists.
+    index: movies
+    """
+    uuid: str = Field(..., alias='id')
+    title: str | None
+    imdb_rating: float | None
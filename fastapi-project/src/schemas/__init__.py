@@ -2,4 +2,4 @@ from .films import FilmSchema, FilmShort  # noqa
 from .genre import GenreSchema  # noqa
 from .person import PersonSchema  # noqa
 
-Schema = FilmSchema | GenreSchema | PersonSchema
+Schema = FilmSchema | FilmShort | GenreSchema | PersonSchema
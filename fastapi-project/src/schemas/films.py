@@ -27,9 +27,9 @@ class FilmSchema(BaseModel):
 class FilmShort(BaseModel):
     """
     Short version of Film object.
-    It is used to form a list of films.
+    It is used to form a list of films. Fields, which are not requested by 'fields', are not set.
     """
 
     uuid: str
-    title: str
+    title: str | None
     imdb_rating: float | None
@@ -1,79 +1,306 @@
+import asyncio
 import logging
+import time
+import uuid
 from functools import lru_cache
-from typing import Optional
+from typing import Any, Callable, Optional
 
 from fastapi import Depends
 from orjson import orjson
 from pydantic.json import pydantic_encoder
 from redis.asyncio import Redis
+from src.core.api_settings import settings
 from src.db._redis import get_redis
 from src.schemas import Schema
+from src.services.local_cache import LocalCache
 
 
 class RedisService:
     """
     A class to combine all the Redis operations in the one place.
     Stores functions to get/put data in and out of cache.
+
+    Objects are also written by the ETL right after they are indexed (CACHE_WRITE_THROUGH),
+    in the same shape as `put` does, so TTL is shared with it.
+    Objects, changed in the index, are evicted by CacheInvalidationListener,
+    so CACHE_DETAIL_EXPIRE_IN_SECONDS may be long.
+
+    Lists are stored as one entry with the page, the total count of the query and the sort values of the last item:
+    {'total': int, 'relation': 'eq' | 'gte', 'search_after': list | None, 'items': list},
+    so a list request is served without Elasticsearch at all.
+    Lists are keyed by the generation of the index (see get_generation), which is incremented by the ETL
+    after every batch, so lists of the previous generations are not read and just expire.
+
+    Two tiers: 'local' - LocalCache of the parsed objects in the worker (L1), 'redis' - Redis (L2).
+    Hot keys skip both the network hop and parsing. `hits` and `misses` are counted per tier,
+    `stats` returns them with the size of the local cache, `log_stats` writes them to the log periodically.
+
+    Stale-while-revalidate: if STALE_WHILE_REVALIDATE is set, Redis entries live for it longer than their TTL.
+    Past the TTL (soft expiry) an entry is still returned, but the `on_stale` callback of the reader is called
+    to refresh it in the background. Past the TTL + STALE_WHILE_REVALIDATE (hard expiry) it is gone.
+    Soft expiry is calculated from the remaining TTL of the key, so the values have the same format
+    as the ones written by the ETL.
+
+    Evictions are numbered (see eviction_mark): a reader takes the mark before it reads Elasticsearch,
+    and `put` skips the object, evicted after the mark. Otherwise a snapshot, read just before the ETL changed it,
+    would be put after the eviction and live until CACHE_DETAIL_EXPIRE_IN_SECONDS.
+    The latest EVICTIONS_MAX_TRACKED evictions are kept, older marks skip the put.
     """
-    CACHE_EXPIRE_IN_SECONDS: int = 60 * 5
+    CACHE_EXPIRE_IN_SECONDS: int = settings.cache_expire_in_seconds
+    CACHE_DETAIL_EXPIRE_IN_SECONDS: int = settings.cache_detail_expire_in_seconds
+    GENERATION_KEY_PREFIX: str = 'generation:'
+    GENERATION_LOCAL_TTL: float = settings.cache_generation_local_ttl
+    STALE_WHILE_REVALIDATE: int = settings.cache_stale_while_revalidate
+    LOCK_KEY_PREFIX: str = 'lock:'
+    FILL_LOCK_TIMEOUT: float = settings.cache_fill_lock_timeout
+    # Deletes the lock only if it is still held by the token: it may have expired and been taken by another worker.
+    RELEASE_LOCK_SCRIPT: str = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+    EVICTIONS_MAX_TRACKED: int = 10_000
 
     def __init__(self, redis: Redis):
         self.redis = redis
+        # index -> (generation, time.monotonic() when it was read)
+        self.generations: dict[str, tuple[int, float]] = {}
+        self.local = LocalCache(
+            max_entries=settings.cache_local_max_entries,
+            max_bytes=settings.cache_local_max_bytes,
+            ttl=settings.cache_local_ttl,
+        )
+        self.hits = {'local': 0, 'redis': 0}
+        self.misses = {'local': 0, 'redis': 0}
+        self.stale_hits = 0
+        # object id -> number of its last eviction. Insertion order is the order of the numbers.
+        self.evictions: dict[str, int] = {}
+        self.eviction_count = 0
+        # Number of the last eviction, which is not tracked anymore
+        self.evictions_forgotten = 0
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Get the counters of the worker since its start.
+        :return: A dict with hits and misses per tier, stale hits and entries and bytes of the local cache.
+        """
+        return {
+            'hits': dict(self.hits),
+            'misses': dict(self.misses),
+            'stale_hits': self.stale_hits,
+            'local_entries': len(self.local.entries),
+            'local_bytes': self.local.size,
+        }
+
+    async def log_stats(self, interval: float) -> None:
+        """
+        Write the stats to the log every interval until cancelled.
+        :param interval: Seconds between the records.
+        :return:
+        """
+        while True:
+            await asyncio.sleep(interval)
+            logging.info('Cache stats: %s', self.stats())
+
+    def _get_local(self, key: str) -> Optional[Schema | tuple[list[Schema], int, str, Optional[list]]]:
+        value = self.local.get(key)
+        if value is None:
+            self.misses['local'] += 1
+            return None
+        self.hits['local'] += 1
+        return value
+
+    async def _get_redis(self, key: str, on_stale: Optional[Callable[[], Any]] = None) -> Optional[bytes]:
+        if not self.STALE_WHILE_REVALIDATE or on_stale is None:
+            data = await self.redis.get(key)
+        else:
+            async with self.redis.pipeline(transaction=False) as pipeline:
+                data, ttl_ms = await pipeline.get(key).pttl(key).execute()
+            if data and 0 <= ttl_ms < self.STALE_WHILE_REVALIDATE * 1000:
+                self.stale_hits += 1
+                on_stale()
+        if data:
+            self.hits['redis'] += 1
+        else:
+            self.misses['redis'] += 1
+        return data
+
+    async def get_generation(self, index: str) -> int:
+        """
+        Get the generation of the index using command get https://redis.io/commands/get/.
+        If GENERATION_LOCAL_TTL is set, the read value is reused during it, or until forget_generation.
+        :param index: A name of the index.
+        :return: An integer generation. 0, if the ETL doesn't count generations.
+        """
+        cached = self.generations.get(index)
+        if cached and time.monotonic() - cached[1] < self.GENERATION_LOCAL_TTL:
+            return cached[0]
+        generation = int(await self.redis.get(self.GENERATION_KEY_PREFIX + index) or 0)
+        self.generations[index] = (generation, time.monotonic())
+        return generation
+
+    def forget_generation(self, index: str) -> None:
+        """
+        Drop the locally cached generation of the index. Called when the index is changed.
+        :param index: A name of the index.
+        :return:
+        """
+        self.generations.pop(index, None)
+
+    async def acquire_lock(self, key: str) -> Optional[str]:
+        """
+        Take a short lock of the cache key filling, shared by all workers, using set NX https://redis.io/commands/set/.
+        Lock expires after FILL_LOCK_TIMEOUT, so a crashed holder doesn't block the key.
+        :param key: A cache key.
+        :return: A token to release the lock, or None if the lock is held by another caller.
+        """
+        token = uuid.uuid4().hex
+        acquired = await self.redis.set(self.LOCK_KEY_PREFIX + key, token, px=int(self.FILL_LOCK_TIMEOUT * 1000), nx=True)
+        return token if acquired else None
+
+    async def is_locked(self, key: str) -> bool:
+        """
+        Check if the lock of the cache key filling is held using command exists https://redis.io/commands/exists/.
+        :param key: A cache key.
+        :return: True if the lock is held by any caller.
+        """
+        return bool(await self.redis.exists(self.LOCK_KEY_PREFIX + key))
+
+    async def release_lock(self, key: str, token: str) -> None:
+        """
+        Release the lock, taken by acquire_lock.
+        :param key: A cache key.
+        :param token: A token, returned by acquire_lock.
+        :return:
+        """
+        await self.redis.eval(self.RELEASE_LOCK_SCRIPT, 1, self.LOCK_KEY_PREFIX + key, token)
+
+    def evict_local(self, object_ids: list[str]) -> None:
+        """
+        Delete objects from the local cache of the worker.
+        :param object_ids: A list of objects ids.
+        :return:
+        """
+        for object_id in object_ids:
+            self.local.delete(object_id)
+            self.eviction_count += 1
+            self.evictions.pop(object_id, None)
+            self.evictions[object_id] = self.eviction_count
+        while len(self.evictions) > self.EVICTIONS_MAX_TRACKED:
+            self.evictions_forgotten = self.evictions.pop(next(iter(self.evictions)))
 
-    async def get(self, object_id: str, model: type[Schema]) -> Optional[Schema]:
+    def eviction_mark(self) -> int:
+        """
+        Get the number of the last eviction. Taken before reading the object from Elasticsearch and passed to `put`.
+        :return: An integer mark.
+        """
+        return self.eviction_count
+
+    def evicted_since(self, object_id: str, mark: int) -> bool:
+        """
+        Check if the object may have been evicted after the mark.
+        :param object_id: An id of the object.
+        :param mark: A mark, returned by eviction_mark.
+        :return: True if the object was evicted after the mark, or the mark is too old to know.
+        """
+        return mark < self.evictions_forgotten or self.evictions.get(object_id, 0) > mark
+
+    async def delete_many(self, object_ids: list[str]) -> None:
+        """
+        Delete objects from both tiers. Redis using command del https://redis.io/commands/del/.
+        :param object_ids: A list of objects ids.
+        :return:
+        """
+        self.evict_local(object_ids)
+        await self.redis.delete(*object_ids)
+        logging.debug('Evicted objects from cache: count=%s', len(object_ids))
+
+    async def get(
+            self, object_id: str, model: type[Schema], on_stale: Optional[Callable[[], Any]] = None,
+    ) -> Optional[Schema]:
         """
         Get object from cache using command get https://redis.io/commands/get/.
         :param model: Model to parse.
         :param object_id: '00af52ec-9345-4d66-adbe-50eb917f463a'
+        :param on_stale: An optional callback, called if the object is past its soft expiry.
         :return: FilmSchema | GenreSchema | PersonSchema
         """
-        data = await self.redis.get(object_id)
+        object_data = self._get_local(object_id)
+        if object_data is not None:
+            return object_data
+
+        data = await self._get_redis(object_id, on_stale)
         if not data:
             return None
 
         object_data = model.parse_raw(data)
+        self.local.put(object_id, object_data, len(data))
         logging.info('Retrieved object from cache: %s', object_id)
         return object_data
 
-    async def get_many(self, record_key: str, model: Schema) -> Optional[list[Schema]]:
+    async def get_many(
+            self, record_key: str, model: Schema, on_stale: Optional[Callable[[], Any]] = None,
+    ) -> Optional[tuple[list[Schema], int, str, Optional[list]]]:
         """
-        Get multiple objects from cache using command get https://redis.io/commands/get/.
+        Get a page of objects and the total count of the query from cache using command get https://redis.io/commands/get/.
         :param record_key: A string record key, containing the record.
         :param model: A model, used for parsing objects.
-        :return: A list of Schema.
+        :param on_stale: An optional callback, called if the record is past its soft expiry.
+        :return: A list of Schema, the total count, its relation and the sort values of the last object.
         """
-        data = await self.redis.get(record_key)
+        result = self._get_local(record_key)
+        if result is not None:
+            return result
+
+        data = await self._get_redis(record_key, on_stale)
         if not data:
             return None
 
-        result = [model(**entity) for entity in orjson.loads(data)]
+        record = orjson.loads(data)
+        result = (
+            [model(**entity) for entity in record['items']], record['total'], record['relation'], record['search_after']
+        )
+        self.local.put(record_key, result, len(data))
         logging.info('Retrieved objects from cache: key=%s', record_key)
         return result
 
-    async def put(self, entity: Schema) -> None:
+    async def put(self, entity: Schema, mark: Optional[int] = None) -> None:
         """
         Save object info using set https://redis.io/commands/set/.
         Pydantic allows to serialize model to json.
         :param entity: FilmSchema | GenreSchema | PersonSchema
+        :param mark: An optional mark of eviction_mark, taken before the entity was read.
+            The entity is not saved, if it was evicted after the mark: it may be older than the index.
         :return:
         """
         try:
-            await self.redis.set(entity.uuid, entity.json(), self.CACHE_EXPIRE_IN_SECONDS)
+            if mark is not None and self.evicted_since(entity.uuid, mark):
+                logging.info('Skipped object evicted while it was read: id=%s', entity.uuid)
+                return
+            data = entity.json()
+            await self.redis.set(entity.uuid, data, self.CACHE_DETAIL_EXPIRE_IN_SECONDS + self.STALE_WHILE_REVALIDATE)
+            self.local.put(entity.uuid, entity, len(data))
             logging.info('Saved object into cache: id=%s', entity.uuid)
         except TypeError:
             logging.error('Cannot cache object: %s to cache. Cannot convert uuid to string.', entity.__class__)
         except AttributeError:
             logging.error("Cannot cache object: %s. No attribute 'uuid'.", entity.__class__)
 
-    async def put_many(self, record_key: str, entities: list[Schema]) -> None:
+    async def put_many(
+            self, record_key: str, entities: list[Schema], total: int, relation: str = 'eq',
+            search_after: Optional[list] = None,
+    ) -> None:
         """
-        Save multiple objects to cache using set https://redis.io/commands/set/.
+        Save a page of objects with the total count of the query to cache using set https://redis.io/commands/set/.
         :param record_key: A string key to store record.
         :param entities: A list of objects to store.
+        :param total: A total count of the objects by the query.
+        :param relation: 'eq' if the total is exact, 'gte' if it is a lower bound.
+        :param search_after: Sort values of the last object to build the cursor of the next page.
         :return: -
         """
-        value_str = orjson.dumps(entities, default=pydantic_encoder)
-        await self.redis.set(record_key, value_str, self.CACHE_EXPIRE_IN_SECONDS)
+        value_str = orjson.dumps(
+            {'total': total, 'relation': relation, 'search_after': search_after, 'items': entities},
+            default=pydantic_encoder,
+        )
+        await self.redis.set(record_key, value_str, self.CACHE_EXPIRE_IN_SECONDS + self.STALE_WHILE_REVALIDATE)
+        self.local.put(record_key, (entities, total, relation, search_after), len(value_str))
         logging.info('Saved object into cache: key=%s', record_key)
 
 
@@ -1,6 +1,8 @@
+import asyncio
 import logging
+import time
 from functools import lru_cache
-from typing import Optional
+from typing import Any, Awaitable, Callable, Optional
 
 from fastapi import Depends
 
@@ -8,7 +10,10 @@ from src.models import ElasticModel
 from src.schemas import Schema
 from src.services._redis import RedisService, get_redis_service
 from src.services.elastic import ElasticService, get_elastic_service
+from src.services.single_flight import SingleFlight
 from src.utils.kwargs_transformer.transformer import KwargsTransformer, get_kwargs_transformer
+from src.utils.cursor import encode_cursor
+from src.utils.query_key import build_query_key
 
 
 class BaseService:
@@ -21,7 +26,13 @@ class BaseService:
     index: str
     elastic_model: ElasticModel
     redis_model: Schema
+    # Lighter models of the list items. If not set, lists are built of the full models.
+    list_elastic_model: Optional[ElasticModel] = None
+    list_redis_model: Optional[Schema] = None
     DEFAULT_SIZE = 100
+    # Bump on changes of the cached objects shape: entries of the old shape are not read anymore.
+    CACHE_SCHEMA_VERSION = 4
+    LOCK_POLL_INTERVAL_IN_SECONDS = 0.05
 
     def __init__(
             self, redis_service: RedisService, elastic_service: ElasticService, kwargs_transformer: KwargsTransformer
@@ -29,6 +40,79 @@ class BaseService:
         self.redis_service: RedisService = redis_service
         self.elastic_service: ElasticService = elastic_service
         self.kwargs_transformer: KwargsTransformer = kwargs_transformer
+        self.single_flight = SingleFlight()
+        # Фоновые обновления устаревших ключей: ключ -> задача
+        self.refreshes: dict[str, asyncio.Task] = {}
+
+    async def fill(self, key: str, read: Callable[[], Awaitable[Any]], fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Fill the missed cache key once for all the concurrent callers.
+
+        Within the worker callers of the same key are coalesced by SingleFlight.
+        If RedisService.FILL_LOCK_TIMEOUT is set, workers are coalesced by the Redis lock too:
+        the holder fetches, others poll the cache until the holder fills it, or fetch by themselves
+        after the timeout or as soon as the lock is released without filling (e.g. the object was not found).
+
+        :param key: A cache key.
+        :param read: A coroutine function to read the key from the cache.
+        :param fetch: A coroutine function to fetch the value from Elasticsearch and put it to the cache.
+        :return: A result of the read or fetch.
+        """
+        return await self.single_flight.do(key, lambda: self._fill_locked(key, read, fetch))
+
+    async def _fill_locked(self, key: str, read: Callable[[], Awaitable[Any]], fetch: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.redis_service.FILL_LOCK_TIMEOUT:
+            return await fetch()
+        token = await self.redis_service.acquire_lock(key)
+        if token is None:
+            deadline = time.monotonic() + self.redis_service.FILL_LOCK_TIMEOUT
+            while time.monotonic() < deadline:
+                await asyncio.sleep(self.LOCK_POLL_INTERVAL_IN_SECONDS)
+                result = await read()
+                if result:
+                    return result
+                if not await self.redis_service.is_locked(key):
+                    # Держатель блокировки закончил, но ничего не записал в кэш (например, 404)
+                    return await read() or await fetch()
+            logging.warning('Cache key was not filled by the lock holder in time: %s', key)
+            return await fetch()
+        try:
+            # Ключ мог быть заполнен между промахом и взятием блокировки
+            return await read() or await fetch()
+        finally:
+            await self.redis_service.release_lock(key, token)
+
+    def revalidate(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> None:
+        """
+        Refresh the key, which is past its soft expiry, in the background task (stale-while-revalidate).
+        At most one refresh of the key is in flight in the worker. If RedisService.FILL_LOCK_TIMEOUT is set,
+        the refresh is skipped while another worker holds the lock of the key.
+
+        :param key: A cache key.
+        :param fetch: A coroutine function to fetch the value from Elasticsearch and put it to the cache.
+        :return:
+        """
+        if key in self.refreshes:
+            return
+        self.refreshes[key] = asyncio.create_task(self._refresh(key, fetch))
+        self.refreshes[key].add_done_callback(lambda task: self._refresh_done(key, task))
+
+    async def _refresh(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> None:
+        if not self.redis_service.FILL_LOCK_TIMEOUT:
+            await fetch()
+            return
+        token = await self.redis_service.acquire_lock(key)
+        if token is None:
+            return
+        try:
+            await fetch()
+        finally:
+            await self.redis_service.release_lock(key, token)
+
+    def _refresh_done(self, key: str, task: asyncio.Task) -> None:
+        del self.refreshes[key]
+        if not task.cancelled() and task.exception():
+            logging.error('Cannot refresh stale cache key %s: %s', key, task.exception())
 
     async def get_by_id(self, object_id: str) -> Optional[ElasticModel]:
         """
@@ -38,46 +122,117 @@ class BaseService:
         :return: Film | Genre | Person
         """
 
-        entity = await self.redis_service.get(object_id=object_id, model=self.redis_model)
-        if entity:
+        async def read(on_stale: Optional[Callable[[], Any]] = None) -> Optional[Schema]:
+            return await self.redis_service.get(object_id=object_id, model=self.redis_model, on_stale=on_stale)
+
+        async def fetch() -> Optional[ElasticModel]:
+            mark = self.redis_service.eviction_mark()
+            entity = await self.elastic_service.get(index=self.index, model=self.elastic_model, object_id=object_id)
+            if entity:
+                await self.redis_service.put(entity=entity, mark=mark)
             return entity
-        entity = await self.elastic_service.get(index=self.index, model=self.elastic_model, object_id=object_id)
-        if entity:
-            await self.redis_service.put(entity=entity)
-        return entity
 
-    async def get_many(self, **kwargs) -> Optional[tuple[list[ElasticModel], int]]:
+        return await read(lambda: self.revalidate(object_id, fetch)) or await self.fill(object_id, read, fetch)
+
+    async def get_many(self, **kwargs) -> tuple[Optional[list[ElasticModel]], int, str, Optional[str]]:
         """
-        Returns list of objects suitable to kwargs params, and total count of objects by query.
+        Returns list of objects suitable to kwargs params, total count of objects by query,
+        relation of the total: 'eq' if it is exact, 'gte' if it is a lower bound, and cursor of the next page.
 
         Available kwargs (but not required):
             'page_number': int. Used with 'size' by PaginationHandler to build pagination kwargs.
+            'search_after': list. Used by PaginationHandler instead of 'page_number' for cursor pagination.
+            'pit_id': string. An id of the point in time to search in (see src.utils.cursor).
             'sort': string. Used by SortHandler to fill 'sort' list of constraints.
             'filters': list of dicts like {'field': str, 'value': str, 'type': Optional[str]}.
                 Used by FiltersHandler to fill 'must' and 'should' lists of constraints.
             'search': dict like {'field': str, 'value': str, 'fuzziness': Optional[str]}.
                 Used by SearchHandler to append 'must' list by search constraint
                 and to append 'sort' list by {'_score': 'desc'} constraint.
+            'approximate_total': bool. Used by TotalHitsHandler to count the total only up to a threshold.
+            'fields': list of strings. Fields of the list model to fetch. Translated to the fields of '_source'
+                and used by SourceHandler. All the fields of the list model by default.
         More information about a specific parameter you can find in the related class.
 
         Any other params will be left without changes and unpacked to elastic.search().
-        """
 
+        Objects are built of list_elastic_model (elastic_model if not set) and only its fields are fetched,
+        so the parts of the documents, which are not returned by lists, are neither sent by Elasticsearch nor parsed.
+
+        Results are cached together with the total count by the canonical key of the query and the generation
+        of the index (see build_query_key), so they are not read after the ETL changes the index.
+        A cache hit needs no Elasticsearch queries, a miss needs one: the total is counted by the search itself.
+
+        Cursor of the next page is returned for sorted queries, while pages are full. It contains the sort values
+        of the last object. If ElasticService.PIT_KEEP_ALIVE is set, pages after the first one are pinned
+        to the point in time, which is opened by the second page and is passed on in the cursor.
+        Pinned pages are not cached.
+        """
+        pit_id = kwargs.pop('pit_id', None)
         if not kwargs.get('size'):
             kwargs['size'] = self.DEFAULT_SIZE
-        record_key = self.__class__.__name__ + str(kwargs)
+        if kwargs.get('search_after') and self.elastic_service.PIT_KEEP_ALIVE:
+            kwargs['fields'] = self._source_fields(kwargs.get('fields'))
+            return await self._get_pinned(pit_id, kwargs)
+        generation = await self.redis_service.get_generation(self.index)
+        record_key = build_query_key(self.index, self.CACHE_SCHEMA_VERSION, generation, **kwargs)
+        kwargs['fields'] = self._source_fields(kwargs.get('fields'))
         kwargs = self.kwargs_transformer.transform(kwargs)
 
         logging.debug('kwargs: %s', kwargs)
-        result = await self.redis_service.get_many(record_key, self.redis_model)
+
+        async def read(
+                on_stale: Optional[Callable[[], Any]] = None,
+        ) -> Optional[tuple[list[Schema], int, str, Optional[list]]]:
+            return await self.redis_service.get_many(record_key, self.list_redis_model or self.redis_model,
+                                                     on_stale=on_stale)
+
+        async def fetch() -> Optional[tuple[list[ElasticModel], int, str, Optional[list]]]:
+            found = await self.elastic_service.search(self.index, self.list_elastic_model or self.elastic_model, **kwargs)
+            logging.debug('Received response from elastic: %s', found)
+            if not found:
+                return None
+            if found.items:
+                await self.redis_service.put_many(record_key, found.items, found.total, found.relation, found.search_after)
+            return found.items, found.total, found.relation, found.search_after
+
+        result = await read(lambda: self.revalidate(record_key, fetch)) or await self.fill(record_key, read, fetch)
         if not result:
-            result = await self.elastic_service.search(self.index, self.elastic_model, **kwargs)
-            logging.debug('Received response from elastic: %s', result)
-            if result:
-                await self.redis_service.put_many(record_key, result)
+            return None, 0, 'eq', None
+        items, total, relation, search_after = result
+        return items, total, relation, self._next_cursor(items, kwargs['size'], search_after)
+
+    async def _get_pinned(
+            self, pit_id: Optional[str], kwargs: dict,
+    ) -> tuple[Optional[list[ElasticModel]], int, str, Optional[str]]:
+        if pit_id is None:
+            pit_id = await self.elastic_service.open_point_in_time(self.index)
+        kwargs = self.kwargs_transformer.transform(kwargs)
+        found = await self.elastic_service.search(
+            self.index, self.list_elastic_model or self.elastic_model, pit_id=pit_id, **kwargs
+        )
+        if not found:
+            return None, 0, 'eq', None
+        next_cursor = self._next_cursor(found.items, kwargs['size'], found.search_after, found.pit_id or pit_id)
+        return found.items, found.total, found.relation, next_cursor
+
+    def _source_fields(self, fields: Optional[list[str]]) -> list[str]:
+        """
+        Translate the fields of the list model to the fields of '_source' (e.g. 'uuid' to 'id').
+
+        :param fields: Names of the fields of the list model. All of them, if None.
+        :return: A list of the fields of '_source'.
+        """
+        model = self.list_elastic_model or self.elastic_model
+        return [model.__fields__[name].alias for name in fields or model.__fields__]
 
-        total_records = await self.elastic_service.count(self.index, query=kwargs['body']['query'])
-        return result, total_records
+    @staticmethod
+    def _next_cursor(
+            items: list[ElasticModel], size: int, search_after: Optional[list], pit_id: Optional[str] = None,
+    ) -> Optional[str]:
+        if not search_after or len(items) < size:
+            return None
+        return encode_cursor(search_after, pit_id)
 
     async def get_by_ids(self, object_ids: list[str]) -> Optional[list[ElasticModel]]:
         """
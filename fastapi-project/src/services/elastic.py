@@ -1,41 +1,96 @@
 import logging
 from functools import lru_cache
-from typing import Optional
+from typing import NamedTuple, Optional
 
 from elasticsearch import AsyncElasticsearch, NotFoundError
 from fastapi import Depends
+from src.core.api_settings import settings
 from src.db.elastic import get_elastic
 from src.models import ElasticModel
 
 
+class SearchResult(NamedTuple):
+    """
+    A page of hits of the search.
+    """
+
+    items: list[ElasticModel]
+    total: int
+    # 'eq' if the total is exact, 'gte' if it is a lower bound.
+    relation: str
+    # Sort values of the last hit to search after it. None if the search is not sorted or there are no hits.
+    search_after: Optional[list]
+    # Id of the point in time, if the search was pinned to it. It may change between the pages.
+    pit_id: Optional[str]
+
+
 class ElasticService:
     """
     A class to combine all the Elasticsearch functions in one place.
     It contains all functions, used to fetch data from Elasticsearch.
     """
+    # True - count all the hits of the search exactly, int - count up to it.
+    TRACK_TOTAL_HITS: bool | int = settings.es_track_total_hits or True
+    # How long a point in time is kept between the pages, e.g. '1m'. Empty - pages are not pinned.
+    PIT_KEEP_ALIVE: str = settings.es_cursor_pit_keep_alive
 
     def __init__(self, elastic: AsyncElasticsearch):
         self.elastic = elastic
 
-    async def search(self, index: str, model: type[ElasticModel], **kwargs) -> Optional[list[ElasticModel]]:
+    async def search(
+            self, index: str, model: type[ElasticModel], pit_id: Optional[str] = None, **kwargs,
+    ) -> Optional[SearchResult]:
         """Process search query to ElasticSearch.
 
+        Total count of hits is taken from the same response (hits.total), so no separate `count` query is needed.
+        It is counted according to TRACK_TOTAL_HITS, unless `track_total_hits` is passed in kwargs.
+        If counting stopped at the limit, the relation of the total is 'gte' (at least total), otherwise 'eq'.
+
         :param index: A ElasticSearch index to fetch.
         :param model: A destination model to parse.
+        :param pit_id: An optional id of the point in time (see open_point_in_time) to search in instead of the index.
         :param kwargs: Other optional keyword arguments.
 
         Available all the kwargs from official documentation:
         https://elasticsearch-py.readthedocs.io/en/7.9.1/
 
-        :return: List of fetched objects parsed in Models or None.
+        :return: SearchResult or None.
         """
+        kwargs.setdefault('track_total_hits', self.TRACK_TOTAL_HITS)
+        if pit_id:
+            # Point in time defines the index itself
+            kwargs['body']['pit'] = {'id': pit_id, 'keep_alive': self.PIT_KEEP_ALIVE}
+            index = None
         try:
             response = await self.elastic.search(index=index, **kwargs)
         except NotFoundError:
             return None
-        result = [model(**item['_source']) for item in response['hits']['hits']]
-        logging.info('Retrieved objects from elasticsearch: count=(%s)', len(result))
-        return result
+        hits = response['hits']['hits']
+        result = [model(**item['_source']) for item in hits]
+        total = response['hits']['total']
+        logging.info('Retrieved objects from elasticsearch: count=(%s), total=(%s %s)',
+                     len(result), total['relation'], total['value'])
+        return SearchResult(
+            items=result,
+            total=total['value'],
+            relation=total['relation'],
+            search_after=hits[-1].get('sort') if hits else None,
+            pit_id=response.get('pit_id'),
+        )
+
+    async def open_point_in_time(self, index: str) -> str:
+        """
+        Open a point in time of the index, to paginate over the same snapshot of it.
+        The point in time is not closed explicitly: it expires after PIT_KEEP_ALIVE without searches.
+
+        :param index: A name of the index.
+        :return: An id of the point in time.
+        """
+        # Клиент 7.9 не поддерживает point in time, запрос отправляется напрямую
+        response = await self.elastic.transport.perform_request(
+            'POST', f'/{index}/_pit', params={'keep_alive': self.PIT_KEEP_ALIVE}
+        )
+        return response['id']
 
     async def get(self, index: str, model: type[ElasticModel], object_id: str) -> Optional[ElasticModel]:
         """
@@ -78,18 +133,6 @@ class ElasticService:
         logging.info('Retrieved objects from elasticsearch: count=(%s)', len(result))
         return result
 
-    async def count(self, index: str, query: dict = None) -> int:
-        """
-        Process `count` query to Elasticsearch.
-
-        Gets count of records in specified index.
-        :param index: A name of the index.
-        :param query: A query to process count.
-        :return: An integer count of records.
-        """
-        count = await self.elastic.count(index=index, body={'query': query})
-        return count.get('count')
-
 
 @lru_cache()
 def get_elastic_service(
@@ -1,8 +1,8 @@
 from functools import lru_cache
 
 from fastapi import Depends
-from src.models import Film
-from src.schemas.films import FilmSchema
+from src.models import Film, FilmShort
+from src.schemas.films import FilmSchema, FilmShort as FilmShortSchema
 from src.services._redis import RedisService, get_redis_service
 from src.services.base import BaseService
 from src.services.elastic import ElasticService, get_elastic_service
@@ -19,6 +19,8 @@ class FilmsService(BaseService):
     index = 'movies'
     elastic_model = Film
     redis_model = FilmSchema
+    list_elastic_model = FilmShort
+    list_redis_model = FilmShortSchema
 
 
 @lru_cache()
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+from typing import Optional
+
+import orjson
+from redis.exceptions import RedisError
+from src.services._redis import RedisService
+
+
+class CacheInvalidationListener:
+    """
+    Background subscriber to the ids, changed by the ETL.
+
+    The ETL publishes the ids of the indexed and deleted documents to the channel after every bulk
+    (CACHE_PUBLISH_CHANGES), as {'index': str, 'ids': list[str], 'cached': bool}.
+    Listener deletes the entries of these ids, which are cached by RedisService.put.
+    Entries with 'cached': true are already written through by the ETL and are kept in Redis,
+    but the parsed objects of the local cache are evicted anyway.
+    Locally cached generation of the index is dropped, so the next list request rereads it.
+
+    Pub/sub doesn't store messages: while the listener is reconnecting, entries are stale until TTL.
+    """
+
+    RECONNECT_DELAY_IN_SECONDS: float = 1.0
+
+    def __init__(self, redis_service: RedisService, channel: str):
+        """
+        :param redis_service: A RedisService, which caches are invalidated.
+        :param channel: A name of the pub/sub channel.
+        """
+        self.redis_service = redis_service
+        self.channel = channel
+        self.task: Optional[asyncio.Task] = None
+
+    async def handle(self, data: bytes) -> None:
+        """
+        Evict the entries of the message.
+
+        :param data: A JSON message of the ETL.
+        :return:
+        :raises ValueError: If the message is not JSON or has another shape.
+        """
+        message = orjson.loads(data)
+        ids = message.get('ids') if isinstance(message, dict) else None
+        if (
+                not isinstance(ids, list) or not isinstance(message.get('index'), str)
+                or not all(isinstance(object_id, str) for object_id in ids)
+        ):
+            raise ValueError(f'Unexpected shape of the message: {data!r}')
+        self.redis_service.forget_generation(message['index'])
+        if not message['ids']:
+            return
+        if message.get('cached'):
+            self.redis_service.evict_local(message['ids'])
+        else:
+            await self.redis_service.delete_many(message['ids'])
+
+    async def listen(self) -> None:
+        """
+        Subscribe to the channel and handle messages until cancelled. Reconnects on Redis errors.
+        """
+        while True:
+            pubsub = self.redis_service.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                logging.info('Subscribed to cache invalidation channel: %s', self.channel)
+                async for message in pubsub.listen():
+                    if message['type'] != 'message':
+                        continue
+                    try:
+                        await self.handle(message['data'])
+                    except ValueError as exc:
+                        logging.error('Cannot parse cache invalidation message: %s', exc)
+            except RedisError as exc:
+                logging.error('Cache invalidation channel error: %s. Reconnecting.', exc)
+            finally:
+                await pubsub.close()
+            await asyncio.sleep(self.RECONNECT_DELAY_IN_SECONDS)
+
+    def start(self) -> None:
+        """
+        Start listening in the background task.
+        """
+        self.task = asyncio.create_task(self.listen())
+
+    async def stop(self) -> None:
+        """
+        Cancel the background task.
+        """
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
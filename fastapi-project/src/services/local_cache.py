@@ -0,0 +1,69 @@
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+
+class LocalCache:
+    """
+    In-process LRU cache of already parsed objects. L1 in front of Redis in RedisService.
+
+    Bounded by the count of entries and by the size of their payloads
+    (length of the JSON, which the object was parsed from or dumped to), whichever is reached first.
+    Entries live for a short TTL: other workers don't see evictions of this one.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float):
+        """
+        :param max_entries: A max count of entries. 0 disables the cache.
+        :param max_bytes: A max total size of the payloads of entries.
+        :param ttl: Seconds to keep an entry.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # key -> (value, payload size, expires at by time.monotonic())
+        self.entries: OrderedDict[str, tuple[Any, int, float]] = OrderedDict()
+        self.size = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Return the value and mark it as recently used, or None if it is absent or expired.
+        :param key: A cache key.
+        :return: A cached object or None.
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry[2] <= time.monotonic():
+            self.delete(key)
+            return None
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key: str, value: Any, size: int) -> None:
+        """
+        Store the value and evict the least recently used entries over the bounds.
+        Values larger than a quarter of max_bytes are not stored: they would wipe out the cache.
+        :param key: A cache key.
+        :param value: An object to store.
+        :param size: A size of the payload of the object in bytes.
+        :return:
+        """
+        if not self.max_entries or size > self.max_bytes // 4:
+            return
+        self.delete(key)
+        self.entries[key] = (value, size, time.monotonic() + self.ttl)
+        self.size += size
+        while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+            _, (_, evicted_size, _) = self.entries.popitem(last=False)
+            self.size -= evicted_size
+
+    def delete(self, key: str) -> None:
+        """
+        Remove the entry if it exists.
+        :param key: A cache key.
+        :return:
+        """
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
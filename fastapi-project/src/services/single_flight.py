@@ -0,0 +1,50 @@
+import asyncio
+from typing import Any, Awaitable, Callable
+
+
+class SingleFlight:
+    """
+    Deduplication of concurrent calls by key within the worker.
+
+    The first caller of the key (leader) runs the call, callers of the same key, which come
+    while it is in flight, await the result of the leader instead of running their own.
+    If the leader is cancelled (e.g. the client disconnected), one of the waiting callers runs the call again.
+    """
+
+    def __init__(self):
+        self.calls: dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run the call or join the call of the same key in flight.
+
+        :param key: A key of the call, e.g. a cache key.
+        :param call: A coroutine function without arguments.
+        :return: A result of the call. Exceptions of the call are raised in all the callers.
+        """
+        future = self.calls.get(key)
+        if future is not None:
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                return await self.do(key, call)
+
+        future = asyncio.get_running_loop().create_future()
+        self.calls[key] = future
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            # Ошибку получают ожидающие вызовы, если они есть; иначе asyncio предупредит о непрочитанной ошибке
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self.calls[key]
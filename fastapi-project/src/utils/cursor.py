@@ -0,0 +1,39 @@
+import base64
+import binascii
+from typing import Optional
+
+import orjson
+
+
+def encode_cursor(search_after: list, pit_id: Optional[str] = None) -> str:
+    """
+    Build an opaque cursor of the next page.
+
+    :param search_after: Sort values of the last hit of the page (see PaginationHandler).
+    :param pit_id: An optional id of the point in time, which the pages are pinned to.
+    :return: A URL-safe string.
+    """
+    cursor = {'search_after': search_after}
+    if pit_id:
+        cursor['pit_id'] = pit_id
+    return base64.urlsafe_b64encode(orjson.dumps(cursor)).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple[list, Optional[str]]:
+    """
+    Parse the cursor, built by encode_cursor.
+
+    :param cursor: A string cursor.
+    :return: Sort values of the last hit of the previous page and the id of the point in time or None.
+    :raises ValueError: If the cursor is malformed.
+    """
+    try:
+        data = orjson.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (binascii.Error, orjson.JSONDecodeError) as exc:
+        raise ValueError('Malformed cursor') from exc
+    if not isinstance(data, dict) or not isinstance(data.get('search_after'), list) or not data['search_after']:
+        raise ValueError('Malformed cursor')
+    pit_id = data.get('pit_id')
+    if pit_id is not None and not isinstance(pit_id, str):
+        raise ValueError('Malformed cursor')
+    return data['search_after'], pit_id
@@ -4,6 +4,7 @@ import abc
 import logging
 from typing import Optional
 
+from src.core.api_settings import settings
 from src.utils.kwargs_transformer.constraints import SortConstraint, FilterConstraint, SearchConstraint
 
 logger = logging.getLogger(__name__)
@@ -72,22 +73,69 @@ class BodyHandler(BaseHandler):
 class PaginationHandler(BaseHandler):
     """
     A handler for pagination.
-    Handled keys: kwargs['page_number']: int, kwargs['size']: int.
+    Handled keys: kwargs['page_number']: int, kwargs['size']: int, kwargs['search_after']: Optional[list].
 
     kwargs['page_number'] is a number of page to start from.
     kwargs['size'] is a count of record on every page.
+    kwargs['search_after'] is a list of sort values of the last record of the previous page (cursor pagination).
+    If it is set, 'page_number' is ignored: Elasticsearch doesn't skip 'from_' records, so deep pages are cheap.
     """
 
     def handle(self, kwargs: dict) -> dict:
         """
-        Remove 'page_number'.
-        Add 'from_' containing starting record number.
+        Remove 'page_number' and 'search_after'.
+        Add 'from_' containing starting record number or 'search_after' list in body.
         """
-        if kwargs.get('page_number'):
+        search_after = kwargs.pop('search_after', None)
+        if search_after:
+            kwargs.pop('page_number', None)
+            kwargs['body']['search_after'] = search_after
+        elif kwargs.get('page_number'):
             kwargs['from_'] = (kwargs.pop('page_number') - 1) * kwargs.get('size')
         return super().handle(kwargs)
 
 
+class TotalHitsHandler(BaseHandler):
+    """
+    A handler for approximate total count.
+    Handled key: kwargs['approximate_total']: Optional[bool].
+
+    If kwargs['approximate_total'] is True, Elasticsearch counts hits only up to THRESHOLD
+    and stops: broad queries don't count the whole index. Smaller totals are still exact.
+    """
+
+    THRESHOLD: int = settings.es_approximate_total_threshold
+
+    def handle(self, kwargs: dict) -> dict:
+        """
+        Remove 'approximate_total'.
+        Add 'track_total_hits' containing the threshold.
+        """
+        if kwargs.pop('approximate_total', None):
+            kwargs['track_total_hits'] = self.THRESHOLD
+        return super().handle(kwargs)
+
+
+class SourceHandler(BaseHandler):
+    """
+    A handler for source filtering.
+    Handled key: kwargs['fields']: Optional[list[str]].
+
+    kwargs['fields'] is a list of the fields of _source to fetch. Nested fields can be declared by 'genre.name'.
+    Other fields are not sent by Elasticsearch at all.
+    """
+
+    def handle(self, kwargs: dict) -> dict:
+        """
+        Remove 'fields'.
+        Add '_source' dict with 'includes' list in body.
+        """
+        fields = kwargs.pop('fields', None)
+        if fields:
+            kwargs['body']['_source'] = {'includes': list(fields)}
+        return super().handle(kwargs)
+
+
 class SortHandler(BaseHandler):
     """
     A handler for sort.
@@ -103,9 +151,11 @@ class SortHandler(BaseHandler):
         """
         Remove 'sort'.
         Add sort dict in sort list in body.
+        Surrounding whitespace is stripped the same way as in build_query_key.
         """
-        if kwargs.get('sort'):
-            sort_constraint = SortConstraint(kwargs.pop('sort'))
+        sort = (kwargs.pop('sort', None) or '').strip()
+        if sort:
+            sort_constraint = SortConstraint(sort)
             kwargs['body']['sort'].append(sort_constraint.build())
         return super().handle(kwargs)
 
@@ -192,3 +242,26 @@ class SearchHandler(BaseHandler):
             kwargs['body']['sort'].append({'_score': 'desc'})
 
         return super().handle(kwargs)
+
+
+class TiebreakerHandler(BaseHandler):
+    """
+    A handler to make sort total.
+    No handled keys.
+
+    IMPORTANT: Must be the last handler on every chain, after all the sort constraints.
+
+    If any sort is set, sort by unique 'id' is appended, so records with equal sort values
+    always come in the same order, and sort values of the last record identify the end of the page
+    (see PaginationHandler 'search_after').
+    """
+
+    TIEBREAKER: dict = {'id': 'asc'}
+
+    def handle(self, kwargs: dict) -> dict:
+        """
+        Append sort by 'id' to sort list in body, if it is not empty.
+        """
+        if kwargs['body']['sort']:
+            kwargs['body']['sort'].append(dict(self.TIEBREAKER))
+        return super().handle(kwargs)
@@ -3,9 +3,12 @@ import logging
 from src.utils.kwargs_transformer.handlers import (
     BodyHandler,
     PaginationHandler,
+    TotalHitsHandler,
+    SourceHandler,
     SortHandler,
     FiltersHandler,
     SearchHandler,
+    TiebreakerHandler,
 )
 
 
@@ -19,9 +22,12 @@ class KwargsTransformer:
     Handlers and related tasks:
         BodyHandler: Body creation. Always first.
         PaginationHandler: Pagination.
+        TotalHitsHandler: Approximate total count.
+        SourceHandler: Source filtering.
         SortHandler: Sorting.
         FiltersHandler: Filtration.
         SearchHandler: Searching. Never before SortHandler in chain.
+        TiebreakerHandler: Sorting by id after all the other sorts. Always last.
     More info about fields structure and types in related handler class.
 
     Example:
@@ -39,11 +45,15 @@ class KwargsTransformer:
 
     body_handler = BodyHandler()
     pagination_handler = PaginationHandler()
+    total_hits_handler = TotalHitsHandler()
+    source_handler = SourceHandler()
     sort_handler = SortHandler()
     filter_handler = FiltersHandler()
     search_handler = SearchHandler()
+    tiebreaker_handler = TiebreakerHandler()
 
-    body_handler.set_next(pagination_handler).set_next(sort_handler).set_next(filter_handler).set_next(search_handler)
+    body_handler.set_next(pagination_handler).set_next(total_hits_handler).set_next(source_handler)
+    source_handler.set_next(sort_handler).set_next(filter_handler).set_next(search_handler).set_next(tiebreaker_handler)
 
     def transform(self, kwargs: dict | None) -> dict:
         """
@@ -52,12 +62,15 @@ class KwargsTransformer:
         Available kwargs (but not required):
             'size': int. Used to set count of returned records.
             'page_number': int. Used with 'size' by PaginationHandler to build pagination kwargs.
+            'search_after': list. Used by PaginationHandler instead of 'page_number' for cursor pagination.
             'sort': string. Used by SortHandler to fill 'sort' list of constraints.
             'filters': list of dicts like {'field': str, 'value': str, 'type': Optional[str]}.
                 Used by FiltersHandler to fill 'must' and 'should' lists of constraints.
             'search': dict like {'field': str, 'value': str, 'fuzziness': Optional[str]}.
                 Used by SearchHandler to append 'must' list by search constraint
                 and to append 'sort' list by {'_score': 'desc'} constraint.
+            'approximate_total': bool. Used by TotalHitsHandler to set 'track_total_hits' to a threshold.
+            'fields': list of strings. Used by SourceHandler to fetch only these fields of '_source'.
         More information about a specific parameter you can find in the related class.
 
         Any other params will be left without changes.
@@ -0,0 +1,76 @@
+import hashlib
+from typing import Optional
+
+import orjson
+
+KEY_PREFIX = 'query'
+DIGEST_SIZE = 16
+
+
+def normalize_filters(filters: Optional[list[Optional[dict]]]) -> list[dict]:
+    """
+    Bring filters to the canonical form.
+
+    Skips the filters, which are skipped by FiltersHandler (None and without 'field' or 'value'),
+    fills the default 'type' and sorts them, because the order of bool clauses doesn't change the result.
+
+    :param filters: A list of filter dicts like {'field': str, 'value': str, 'type': Optional[str]}.
+    :return: A sorted list of filter dicts with all the keys.
+    """
+    normalized = [
+        {'field': filter_query['field'], 'value': str(filter_query['value']), 'type': filter_query.get('type', 'must')}
+        for filter_query in filters or []
+        if filter_query and 'field' in filter_query and 'value' in filter_query
+    ]
+    return sorted(normalized, key=lambda filter_query: (filter_query['type'], filter_query['field'],
+                                                        filter_query['value']))
+
+
+def normalize_search(search: Optional[dict]) -> Optional[dict]:
+    """
+    Bring search to the canonical form.
+
+    Search fields are analyzed by lowercasing analyzers, so the case and extra whitespaces of the value
+    don't change the result. The value is lowered as the 'lowercase' filter does it, not casefolded:
+    'ß' and 'ss' are different terms for the index, so they must not share the key.
+
+    :param search: A dict like {'field': str, 'value': str, 'fuzziness': Optional[str]}.
+    :return: A dict with all the keys or None if search is skipped by SearchHandler.
+    """
+    if not search or 'field' not in search or 'value' not in search:
+        return None
+    return {
+        'field': search['field'],
+        'value': ' '.join(str(search['value']).split()).lower(),
+        'fuzziness': search.get('fuzziness', 'auto'),
+    }
+
+
+def build_query_key(index: str, schema_version: int, generation: int, **kwargs) -> str:
+    """
+    Build a short key of the list query for Redis.
+
+    Handler inputs (see KwargsTransformer) are normalized, so semantically identical queries share the key.
+    Any other kwargs are unpacked to elastic.search(), so they are a part of the key as is.
+    Canonical form is hashed, so the key length doesn't depend on the user search text.
+
+    Example: 'query:movies:v1:g42:5f0c...' (32 hex chars of the digest).
+
+    :param index: A name of the index. Namespaces the key.
+    :param schema_version: A version of the cached schema. Bump it to stop reading entries of the old shape.
+    :param generation: A generation of the index (see RedisService.get_generation).
+    :param kwargs: Kwargs of BaseService.get_many. Not changed.
+    :return: A string key.
+    """
+    query = dict(kwargs)
+    query['sort'] = (query.get('sort') or '').strip() or None
+    query['filters'] = normalize_filters(query.get('filters'))
+    query['search'] = normalize_search(query.get('search'))
+    query['page_number'] = query.get('page_number') or 1
+    for optional in ('approximate_total', 'search_after', 'fields'):
+        if not query.get(optional):
+            query.pop(optional, None)
+    if 'fields' in query:
+        query['fields'] = sorted(set(query['fields']))
+    digest = hashlib.blake2b(orjson.dumps(query, option=orjson.OPT_SORT_KEYS), digest_size=DIGEST_SIZE).hexdigest()
+    return f'{KEY_PREFIX}:{index}:v{schema_version}:g{generation}:{digest}'
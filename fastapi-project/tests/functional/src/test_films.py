@@ -101,7 +101,8 @@ async def test_list_films_genre_filtering(
     (
             '/api/v1/films',
             {},
-            "FilmsService{'sort': '-imdb_rating', 'filters': [None], 'page_number': 1, 'size': 50}",
+            # sort='-imdb_rating', filters=[None], page_number=1, size=50
+            'query:movies:v4:g0:7ee91dda06a9a29e5eab040f0bfe1a49',
             'es_films_search_data'
     ),
 
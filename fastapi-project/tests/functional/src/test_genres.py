@@ -55,7 +55,8 @@ async def test_genre_detail(
     (
             '/api/v1/genres',
             {},
-            "GenresService{'size': 1000}",
+            # size=1000
+            'query:genres:v4:g0:ffa4bbbaaf26328b0f231d77f8389812',
             'es_list_genres'
     ),
 
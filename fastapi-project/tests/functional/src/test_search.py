@@ -145,14 +145,16 @@ async def test_persons_search(
     (
             '/api/v1/films/search/',
             {'query': 'Movie', 'page_number': 1, 'page_size': 50},
-            "FilmsService{'search': {'field': 'title', 'value': 'Movie'}, 'page_number': 1, 'size': 50}",
+            # search={'field': 'title', 'value': 'Movie'}, page_number=1, size=50
+            'query:movies:v4:g0:86ed9ef611f69ec52752e7e68d4ef34a',
             'es_films_search_data',
             movies_test_settings
     ),
     (
             '/api/v1/persons/search/',
             {'query': 'Nash', 'page_number': 1, 'page_size': 50},
-            "PersonsService{'search': {'field': 'full_name', 'value': 'Nash'}, 'page_number': 1, 'size': 50}",
+            # search={'field': 'full_name', 'value': 'Nash'}, page_number=1, size=50
+            'query:persons:v4:g0:1e78ca8432a835550c1293aec279f2d4',
             'es_persons_search_data',
             persons_test_settings
     )
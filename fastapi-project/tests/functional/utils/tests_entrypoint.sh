@@ -5,7 +5,7 @@ python ./tests/functional/utils/wait_for_services.py
 
 if [ $? -eq 0 ]; then
     echo "Сервисы доступны. Запуск тестов..."
-    pytest -rP ./tests/functional/src
+    pytest -rP ./tests/unit ./tests/functional/src
 else
     echo "Ошибка при ожидании сервисов. Проверьте состояние сервисов и повторите попытку."
     exit 1
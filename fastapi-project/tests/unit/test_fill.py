@@ -0,0 +1,102 @@
+"""
+Group of tests for checking BaseService.fill: coalescing of the cache fills by the Redis lock.
+"""
+import asyncio
+from unittest import mock
+
+import pytest
+
+from src.services.base import BaseService
+
+
+class FakeLockRedisService:
+    """Locks of the RedisService in memory."""
+    FILL_LOCK_TIMEOUT = 1.0
+
+    def __init__(self):
+        self.locks = {}
+
+    async def acquire_lock(self, key):
+        if key in self.locks:
+            return None
+        self.locks[key] = 'token'
+        return 'token'
+
+    async def is_locked(self, key):
+        return key in self.locks
+
+    async def release_lock(self, key, token):
+        if self.locks.get(key) == token:
+            del self.locks[key]
+
+
+@pytest.fixture
+def service():
+    service = BaseService(FakeLockRedisService(), mock.Mock(), mock.Mock())
+    service.LOCK_POLL_INTERVAL_IN_SECONDS = 0.01
+    return service
+
+
+@pytest.mark.asyncio
+async def test_fill_without_lock_fetches(service):
+    service.redis_service.FILL_LOCK_TIMEOUT = 0
+    fetch = mock.AsyncMock(return_value='value')
+
+    assert await service.fill('key', mock.AsyncMock(return_value=None), fetch) == 'value'
+    fetch.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_fill_holder_reads_before_fetch(service):
+    fetch = mock.AsyncMock(return_value='fetched')
+
+    assert await service.fill('key', mock.AsyncMock(return_value='cached'), fetch) == 'cached'
+    fetch.assert_not_awaited()
+    assert service.redis_service.locks == {}
+
+
+@pytest.mark.asyncio
+async def test_fill_waiter_reads_value_of_holder(service):
+    service.redis_service.locks['key'] = 'other'
+    cache = {}
+
+    async def holder():
+        await asyncio.sleep(0.03)
+        cache['key'] = 'value'
+        del service.redis_service.locks['key']
+
+    fetch = mock.AsyncMock(return_value='fetched')
+    task = asyncio.create_task(holder())
+
+    assert await service.fill('key', mock.AsyncMock(side_effect=lambda: cache.get('key')), fetch) == 'value'
+    fetch.assert_not_awaited()
+    await task
+
+
+@pytest.mark.asyncio
+async def test_fill_waiter_fetches_when_holder_released_without_filling(service):
+    service.redis_service.locks['key'] = 'other'
+
+    async def holder():
+        await asyncio.sleep(0.03)
+        del service.redis_service.locks['key']
+
+    fetch = mock.AsyncMock(return_value=None)
+    task = asyncio.create_task(holder())
+    started = asyncio.get_running_loop().time()
+
+    assert await service.fill('key', mock.AsyncMock(return_value=None), fetch) is None
+    # Не ждёт FILL_LOCK_TIMEOUT, когда объекта нет
+    assert asyncio.get_running_loop().time() - started < service.redis_service.FILL_LOCK_TIMEOUT / 2
+    fetch.assert_awaited_once()
+    await task
+
+
+@pytest.mark.asyncio
+async def test_fill_waiter_fetches_after_timeout(service):
+    service.redis_service.FILL_LOCK_TIMEOUT = 0.05
+    service.redis_service.locks['key'] = 'other'
+    fetch = mock.AsyncMock(return_value='fetched')
+
+    assert await service.fill('key', mock.AsyncMock(return_value=None), fetch) == 'fetched'
+    fetch.assert_awaited_once()
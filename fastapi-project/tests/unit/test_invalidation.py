@@ -0,0 +1,61 @@
+"""
+Group of tests for checking CacheInvalidationListener handling of the ETL messages.
+"""
+import asyncio
+from unittest import mock
+
+import pytest
+
+from src.services.invalidation import CacheInvalidationListener
+
+
+class FakePubSub:
+    """Pub/sub, which delivers the messages once and then waits forever."""
+
+    def __init__(self, messages):
+        self.messages = messages
+
+    async def subscribe(self, channel):
+        pass
+
+    async def listen(self):
+        for data in self.messages:
+            yield {'type': 'message', 'data': data}
+        await asyncio.Event().wait()
+
+    async def close(self):
+        pass
+
+
+@pytest.mark.parametrize('malformed', [
+    b'not json',
+    b'[1, 2]',
+    b'{"index": "movies"}',
+    b'{"index": "movies", "ids": "id"}',
+    b'{"index": 1, "ids": []}',
+    b'{"index": "movies", "ids": [1]}',
+])
+@pytest.mark.asyncio
+async def test_malformed_message_does_not_stop_listener(malformed):
+    redis_service = mock.Mock(delete_many=mock.AsyncMock())
+    redis_service.redis.pubsub.return_value = FakePubSub([malformed, b'{"index": "movies", "ids": ["id"]}'])
+    listener = CacheInvalidationListener(redis_service, 'channel')
+
+    listener.start()
+    await asyncio.sleep(0.01)
+
+    assert not listener.task.done()
+    redis_service.delete_many.assert_awaited_once_with(['id'])
+    await listener.stop()
+
+
+@pytest.mark.asyncio
+async def test_cached_ids_are_evicted_only_locally():
+    redis_service = mock.Mock(delete_many=mock.AsyncMock())
+    listener = CacheInvalidationListener(redis_service, 'channel')
+
+    await listener.handle(b'{"index": "movies", "ids": ["id"], "cached": true}')
+
+    redis_service.forget_generation.assert_called_once_with('movies')
+    redis_service.evict_local.assert_called_once_with(['id'])
+    redis_service.delete_many.assert_not_awaited()
@@ -0,0 +1,92 @@
+"""
+Group of tests for checking LocalCache bounds and TTL.
+"""
+import pytest
+
+from src.services import local_cache
+from src.services.local_cache import LocalCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(local_cache.time, 'monotonic', clock)
+    return clock
+
+
+def test_get_returns_put_value(clock):
+    cache = LocalCache(max_entries=10, max_bytes=1000, ttl=5)
+    cache.put('a', 'value', 10)
+
+    assert cache.get('a') == 'value'
+    assert cache.get('b') is None
+    assert cache.size == 10
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = LocalCache(max_entries=2, max_bytes=1000, ttl=5)
+    cache.put('a', 1, 10)
+    cache.put('b', 2, 10)
+    cache.get('a')
+    cache.put('c', 3, 10)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert cache.size == 20
+
+
+def test_entries_over_byte_budget_are_evicted(clock):
+    cache = LocalCache(max_entries=10, max_bytes=100, ttl=5)
+    for key in 'abcd':
+        cache.put(key, key, 25)
+    cache.put('e', 'e', 25)
+
+    assert cache.get('a') is None
+    assert list(cache.entries) == ['b', 'c', 'd', 'e']
+    assert cache.size == 100
+
+
+def test_value_larger_than_quarter_of_budget_is_not_stored(clock):
+    cache = LocalCache(max_entries=10, max_bytes=100, ttl=5)
+    cache.put('a', 'a', 10)
+    cache.put('big', 'big', 26)
+
+    assert cache.get('big') is None
+    assert cache.get('a') == 'a'
+
+
+def test_replaced_entry_size_is_recounted(clock):
+    cache = LocalCache(max_entries=10, max_bytes=1000, ttl=5)
+    cache.put('a', 1, 10)
+    cache.put('a', 2, 30)
+
+    assert cache.get('a') == 2
+    assert cache.size == 30
+
+
+def test_entry_expires_after_ttl(clock):
+    cache = LocalCache(max_entries=10, max_bytes=1000, ttl=5)
+    cache.put('a', 1, 10)
+
+    clock.now += 4.9
+    assert cache.get('a') == 1
+    clock.now += 0.1
+    assert cache.get('a') is None
+    assert cache.size == 0
+
+
+def test_zero_entries_disable_cache(clock):
+    cache = LocalCache(max_entries=0, max_bytes=1000, ttl=5)
+    cache.put('a', 1, 10)
+
+    assert cache.get('a') is None
+    assert cache.size == 0
@@ -0,0 +1,73 @@
+"""
+Group of tests for checking build_query_key: equivalent queries share the key, different ones don't.
+"""
+import pytest
+
+from src.utils.kwargs_transformer.handlers import SortHandler
+from src.utils.query_key import build_query_key
+
+
+def key(**kwargs):
+    return build_query_key('movies', 4, 0, **kwargs)
+
+
+def test_key_format():
+    assert key().startswith('query:movies:v4:g0:')
+    assert build_query_key('movies', 4, 7) != key()
+    assert build_query_key('genres', 4, 0) != key()
+    assert build_query_key('movies', 5, 0) != key()
+
+
+@pytest.mark.parametrize('first, second', [
+    ({}, {'page_number': 1}),
+    ({}, {'sort': '  '}),
+    ({'sort': '-imdb_rating'}, {'sort': ' -imdb_rating '}),
+    ({}, {'approximate_total': False, 'search_after': None, 'fields': []}),
+    ({'fields': ['title', 'uuid']}, {'fields': ['uuid', 'title', 'uuid']}),
+    (
+        {'filters': [{'field': 'genre', 'value': 'a'}, {'field': 'actors', 'value': 'b'}]},
+        {'filters': [{'field': 'actors', 'value': 'b', 'type': 'must'}, None, {'field': 'genre', 'value': 'a'}]},
+    ),
+    (
+        {'search': {'field': 'title', 'value': 'Star  Wars '}},
+        {'search': {'field': 'title', 'value': 'star wars', 'fuzziness': 'auto'}},
+    ),
+    ({}, {'search': {'field': 'title'}}),
+])
+def test_equivalent_queries_share_key(first, second):
+    assert key(**first) == key(**second)
+
+
+@pytest.mark.parametrize('first, second', [
+    ({'page_number': 1}, {'page_number': 2}),
+    ({'size': 10}, {'size': 20}),
+    ({'sort': 'imdb_rating'}, {'sort': '-imdb_rating'}),
+    ({'fields': ['title']}, {'fields': ['title', 'uuid']}),
+    ({}, {'approximate_total': True}),
+    ({}, {'search_after': [1.0, 'a']}),
+    ({'filters': [{'field': 'genre', 'value': 'a'}]}, {'filters': [{'field': 'genre', 'value': 'a', 'type': 'should'}]}),
+    ({'search': {'field': 'title', 'value': 'star'}}, {'search': {'field': 'title', 'value': 'star', 'fuzziness': 0}}),
+    # Фильтр lowercase анализатора не превращает 'ß' в 'ss', в отличие от str.casefold
+    ({'search': {'field': 'title', 'value': 'Straße'}}, {'search': {'field': 'title', 'value': 'strasse'}}),
+])
+def test_different_queries_have_different_keys(first, second):
+    assert key(**first) != key(**second)
+
+
+def test_kwargs_are_not_changed():
+    kwargs = {'sort': ' title ', 'fields': ['uuid', 'title'], 'search': {'field': 'title', 'value': 'Star'}}
+
+    key(**kwargs)
+
+    assert kwargs == {'sort': ' title ', 'fields': ['uuid', 'title'], 'search': {'field': 'title', 'value': 'Star'}}
+
+
+@pytest.mark.parametrize('first, second', [
+    (None, '  '),
+    ('-imdb_rating', ' -imdb_rating '),
+])
+def test_sort_handler_normalizes_sort_like_key(first, second):
+    # Запросы с одним ключом должны уходить в ES с одинаковой сортировкой
+    bodies = [SortHandler().handle({'sort': sort, 'body': {'sort': []}})['body'] for sort in (first, second)]
+
+    assert bodies[0] == bodies[1]
@@ -0,0 +1,68 @@
+"""
+Group of tests for checking RedisService guards, which don't need Redis.
+"""
+from unittest import mock
+
+import pytest
+
+from src.schemas.genre import GenreSchema
+from src.services._redis import RedisService
+from src.services.local_cache import LocalCache
+
+GENRE = GenreSchema(uuid='f2998290-8ea4-48ae-a3a0-1ea43becfa9b', name='Drama')
+
+
+@pytest.fixture
+def redis_service():
+    redis_service = RedisService(mock.AsyncMock())
+    # Не зависит от CACHE_LOCAL_MAX_ENTRIES окружения
+    redis_service.local = LocalCache(max_entries=100, max_bytes=1024 * 1024, ttl=5)
+    return redis_service
+
+
+@pytest.mark.asyncio
+async def test_put_saves_object_not_evicted_after_mark(redis_service):
+    redis_service.evict_local(['other-id'])
+    mark = redis_service.eviction_mark()
+
+    await redis_service.put(GENRE, mark=mark)
+
+    redis_service.redis.set.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_put_skips_object_evicted_after_mark(redis_service):
+    mark = redis_service.eviction_mark()
+    await redis_service.delete_many([GENRE.uuid])
+
+    await redis_service.put(GENRE, mark=mark)
+
+    redis_service.redis.set.assert_not_awaited()
+    assert redis_service.local.get(GENRE.uuid) is None
+
+
+@pytest.mark.asyncio
+async def test_put_skips_object_if_mark_is_not_tracked_anymore(redis_service):
+    redis_service.EVICTIONS_MAX_TRACKED = 2
+    mark = redis_service.eviction_mark()
+    redis_service.evict_local(['a', 'b', 'c'])
+
+    assert 'a' not in redis_service.evictions
+    await redis_service.put(GENRE, mark=mark)
+
+    redis_service.redis.set.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_stats_count_hits_and_misses_per_tier(redis_service):
+    redis_service.redis.get.side_effect = [None, GENRE.json().encode()]
+
+    assert await redis_service.get(GENRE.uuid, GenreSchema) is None
+    assert await redis_service.get(GENRE.uuid, GenreSchema) == GENRE
+    assert await redis_service.get(GENRE.uuid, GenreSchema) == GENRE
+
+    stats = redis_service.stats()
+    assert stats['hits'] == {'local': 1, 'redis': 1}
+    assert stats['misses'] == {'local': 2, 'redis': 1}
+    assert stats['local_entries'] == 1
+    assert stats['local_bytes'] == len(GENRE.json())
@@ -0,0 +1,74 @@
+"""
+Group of tests for checking SingleFlight deduplication of the concurrent calls.
+"""
+import asyncio
+
+import pytest
+
+from src.services.single_flight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_run_once():
+    single_flight = SingleFlight()
+    calls = 0
+
+    async def call():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    results = await asyncio.gather(*(single_flight.do('key', call) for _ in range(5)))
+
+    assert results == [1] * 5
+    assert calls == 1
+    assert single_flight.calls == {}
+
+
+@pytest.mark.asyncio
+async def test_different_keys_run_separately():
+    single_flight = SingleFlight()
+
+    async def call(value):
+        await asyncio.sleep(0.01)
+        return value
+
+    results = await asyncio.gather(single_flight.do('a', lambda: call('a')), single_flight.do('b', lambda: call('b')))
+
+    assert results == ['a', 'b']
+
+
+@pytest.mark.asyncio
+async def test_exception_is_raised_in_all_callers():
+    single_flight = SingleFlight()
+
+    async def call():
+        await asyncio.sleep(0.01)
+        raise ValueError('boom')
+
+    results = await asyncio.gather(*(single_flight.do('key', call) for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(result, ValueError) for result in results)
+    assert single_flight.calls == {}
+
+
+@pytest.mark.asyncio
+async def test_waiting_caller_runs_call_after_leader_is_cancelled():
+    single_flight = SingleFlight()
+    calls = 0
+
+    async def call():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return calls
+
+    leader = asyncio.create_task(single_flight.do('key', call))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(single_flight.do('key', call))
+    await asyncio.sleep(0.01)
+    leader.cancel()
+
+    assert await follower == 2
+    assert leader.cancelled()